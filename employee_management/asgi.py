@@ -3,6 +3,11 @@ ASGI config for employee_management project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The Server-Sent Events stream (/api/live-events/, employees/live_events.py)
+keeps connections open and needs an ASGI server, e.g.:
+
+    uvicorn employee_management.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -197,3 +197,91 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
 }
+
+# =============================================================================
+# НАСТРОЙКИ ПРИЕМА СОБЫТИЙ СКУД
+# =============================================================================
+
+# Режим приема событий
+SKUD_INGEST_SETTINGS = {
+    'MODE': 'sync',              # sync - обработка в запросе, queue - через очередь
+    'BACKEND': 'database',       # Очередь: database (таблица БД) или redis
+    'REDIS_URL': 'redis://localhost:6379/0',  # Адрес Redis для BACKEND = redis
+    'REDIS_KEY': 'skud_ingest_queue',         # Ключ списка в Redis
+    'BATCH_SIZE': 500,           # Количество событий, забираемых из очереди за раз
+    'MAX_ATTEMPTS': 5,           # Попыток обработки до перевода события в ошибочные
+    'RETRY_DELAY': 30,           # Задержка (сек) перед повтором события с ошибкой, удваивается с каждой попыткой
+}
+
+# Учёт рабочего времени
+WORK_TIME_SETTINGS = {
+    # range - у сессии хранятся события входа и выхода (события восстанавливаются по времени),
+    # m2m - дополнительно заполняется таблица связей WorkSession.source_events
+    'SESSION_EVENT_LINKAGE': 'range',
+}
+
+# Кэш Django. Снимки дашборда собираются Celery задачей refresh_dashboard_snapshots
+# и читаются веб-процессами, версии справочников (VersionedLocalCache) сверяются
+# между процессами - поэтому в production кэш должен быть общим (Redis):
+#     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#     'LOCATION': 'redis://localhost:6379/1',
+# Кэш в памяти процесса подходит только для разработки с одним процессом,
+# фоновая пересборка снимков с ним пропускается.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Снимки дашборда (employees/dashboard_snapshot.py)
+DASHBOARD_SNAPSHOT_SETTINGS = {
+    'FRESH_SECONDS': 30,            # Снимок с текущей версией моложе - актуален
+    'MAX_STALE_SECONDS': 300,       # Снимок старше собирается при запросе
+    'SCOPE_TTL': 300,               # Кэш области доступа пользователя
+    'ACTIVE_SCOPE_SECONDS': 15 * 60,  # Фоном пересобираются области с обращениями за этот период
+}
+
+# Рассылка событий СКУД браузерам (Server-Sent Events, employees/live_events.py)
+LIVE_EVENTS_SETTINGS = {
+    'BACKEND': 'local',          # local - в памяти процесса, redis - канал Redis (несколько процессов)
+    'REDIS_URL': 'redis://localhost:6379/0',  # Адрес Redis для BACKEND = redis
+    'REDIS_CHANNEL': 'skud_live_events',      # Канал Redis
+    'KEEPALIVE_SECONDS': 15,     # Интервал комментария keepalive в потоке
+    'SUBSCRIBER_QUEUE_SIZE': 1000,  # Сообщений в очереди соединения до сброса на resync
+}
+
+# Фоновое формирование отчётов (employees/report_jobs.py), файлы - в MEDIA_ROOT/reports
+REPORT_JOB_SETTINGS = {
+    'EXECUTOR': 'celery',        # celery - задача run_report_jobs по расписанию, local - пул потоков процесса
+    'LOCAL_WORKERS': 2,          # Потоков локального исполнителя
+    'BATCH_SIZE': 5,             # Заданий за один запуск задачи run_report_jobs
+    'STALE_RUNNING_SECONDS': 3600,  # Задание в работе дольше - прервано, возвращается в очередь
+    'KEEP_DAYS': 30,             # Срок хранения заданий и файлов отчётов
+}
+
+# Celery (обработка очереди событий СКУД)
+CELERY_BROKER_URL = 'redis://localhost:6379/0'
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'drain-skud-ingest-queue': {
+        'task': 'employees.tasks.drain_skud_ingest_queue',
+        'schedule': 5.0,         # Каждые 5 секунд
+    },
+    'drain-dirty-work-days': {
+        'task': 'employees.tasks.drain_dirty_work_days',
+        'schedule': 30.0,        # Каждые 30 секунд
+    },
+    'refresh-dashboard-snapshots': {
+        'task': 'employees.tasks.refresh_dashboard_snapshots',
+        'schedule': 15.0,        # Каждые 15 секунд
+    },
+    'run-report-jobs': {
+        'task': 'employees.tasks.run_report_jobs',
+        'schedule': 5.0,         # Каждые 5 секунд
+    },
+    'cleanup-report-jobs': {
+        'task': 'employees.tasks.cleanup_report_jobs',
+        'schedule': 24 * 60 * 60.0,  # Раз в сутки
+    },
+}
@@ -0,0 +1,182 @@
+"""
+Календарь отсутствий сотрудников (отпуска и командировки)
+
+Интервалы отпусков и командировок в статусах EXCUSED_STATUSES загружаются
+только для запрошенных сотрудников и дат: для проверки одной даты -
+окно WINDOW_DAYS дней вокруг неё, которое хранится в памяти процесса
+(для каждого сотрудника - отсортированные непересекающиеся интервалы,
+поиск даты выполняется бинарным поиском).
+
+Версия календаря берётся из БД (количество записей и max(updated_at)
+отпусков и командировок) и сверяется не чаще раза в CHECK_INTERVAL секунд,
+поэтому изменения, сделанные в других процессах, видны без общего кэша.
+Сигналы сохранения/удаления Vacation и BusinessTrip (см. signals.py)
+сбрасывают календарь процесса сразу после фиксации транзакции.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from django.db.models import Count, Max
+
+from .models import BusinessTrip, Vacation
+
+logger = logging.getLogger(__name__)
+
+
+def build_intervals(rows: Iterable[Tuple]) -> Dict:
+    """
+    Построение индекса интервалов
+
+    Args:
+        rows: Тройки (id сотрудника, дата начала, дата окончания)
+
+    Returns:
+        Dict: id сотрудника -> (даты начала, даты окончания) объединённых интервалов
+    """
+    by_employee = {}
+    for employee_id, start_date, end_date in rows:
+        by_employee.setdefault(employee_id, []).append((start_date, end_date))
+
+    intervals = {}
+    for employee_id, items in by_employee.items():
+        items.sort()
+        starts, ends = [], []
+        for start_date, end_date in items:
+            if ends and start_date.toordinal() <= ends[-1].toordinal() + 1:
+                # Пересекающиеся и смежные интервалы объединяются
+                ends[-1] = max(ends[-1], end_date)
+            else:
+                starts.append(start_date)
+                ends.append(end_date)
+        intervals[employee_id] = (starts, ends)
+    return intervals
+
+
+class AbsenceCalendar:
+    """Интервалы отсутствия: id сотрудника -> отсортированные интервалы дат"""
+
+    # Как часто (в секундах) процесс сверяет версию календаря с БД
+    CHECK_INTERVAL = 5
+
+    # Окно (в днях до и после даты), загружаемое для сотрудника при проверке даты
+    WINDOW_DAYS = 31
+
+    # Количество сотрудников в памяти, после которого окна загружаются заново
+    MAX_EMPLOYEES = 20000
+
+    def __init__(self):
+        self.logger = logger
+        self._windows = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load_intervals(self, employee_ids: Iterable, from_date: date, to_date: date) -> Dict:
+        """Загрузка отпусков и командировок сотрудников, пересекающих период (по запросу на модель)"""
+        employee_ids = list(employee_ids)
+        rows = []
+        for model in (Vacation, BusinessTrip):
+            rows.extend(model.objects.filter(
+                employee_id__in=employee_ids,
+                status__in=model.EXCUSED_STATUSES,
+                start_date__lte=to_date,
+                end_date__gte=from_date,
+            ).values_list('employee_id', 'start_date', 'end_date'))
+        return build_intervals(rows)
+
+    def _load_version(self) -> Tuple:
+        """Версия данных отпусков и командировок в БД"""
+        version = []
+        for model in (Vacation, BusinessTrip):
+            aggregate = model.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+            version.extend((aggregate['count'], aggregate['updated_at']))
+        return tuple(version)
+
+    def sync(self, force: bool = False) -> None:
+        """
+        Сверка версии календаря с БД (не чаще раза в CHECK_INTERVAL секунд)
+
+        Args:
+            force: Сверить сразу, например перед пересчётом отмеченных дней
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.CHECK_INTERVAL:
+            return
+
+        version = self._load_version()
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self.logger.info("Календарь отсутствий изменился, окна сотрудников сброшены")
+                self._windows = {}
+                self._version = version
+            self._checked_at = now
+
+    def _get_windows(self, employee_ids: Iterable, day: date) -> Dict:
+        """Окна сотрудников, покрывающие дату (недостающие загружаются одним запросом на модель)"""
+        self.sync()
+
+        windows = {}
+        with self._lock:
+            for employee_id in employee_ids:
+                window = self._windows.get(employee_id)
+                if window is not None and window[0] <= day <= window[1]:
+                    windows[employee_id] = window
+        missing = set(employee_ids) - set(windows)
+        if not missing:
+            return windows
+
+        from_date = day - timedelta(days=self.WINDOW_DAYS)
+        to_date = day + timedelta(days=self.WINDOW_DAYS)
+        intervals = self._load_intervals(missing, from_date, to_date)
+
+        with self._lock:
+            if len(self._windows) + len(missing) > self.MAX_EMPLOYEES:
+                self._windows = {}
+            for employee_id in missing:
+                starts, ends = intervals.get(employee_id, ((), ()))
+                windows[employee_id] = self._windows[employee_id] = (from_date, to_date, starts, ends)
+        return windows
+
+    def is_excused(self, employee_id, day: date) -> bool:
+        """Отпуск или командировка у сотрудника на дату"""
+        return bool(self.get_excused_ids([employee_id], day))
+
+    def get_excused_ids(self, employee_ids: Iterable, day: date) -> set:
+        """Сотрудники из списка, отсутствующие на дату"""
+        employee_ids = list(employee_ids)
+        windows = self._get_windows(employee_ids, day)
+
+        excused = set()
+        for employee_id in employee_ids:
+            _, _, starts, ends = windows[employee_id]
+            index = bisect_right(starts, day) - 1
+            if index >= 0 and ends[index] >= day:
+                excused.add(employee_id)
+        return excused
+
+    def get_intervals(self, employee_ids: Iterable, from_date: date, to_date: date) -> Dict[object, List[Tuple[date, date]]]:
+        """
+        Объединённые интервалы отсутствия сотрудников, пересекающие период
+
+        Загружаются из БД при каждом вызове (для пересчёта больших периодов).
+        """
+        return {
+            employee_id: list(zip(starts, ends))
+            for employee_id, (starts, ends) in self._load_intervals(employee_ids, from_date, to_date).items()
+        }
+
+    def invalidate(self) -> None:
+        """Сброс календаря процесса (другие процессы увидят изменение по версии в БД)"""
+        with self._lock:
+            self._windows = {}
+            self._checked_at = 0.0
+
+
+# Глобальный экземпляр календаря
+absence_calendar = AbsenceCalendar()
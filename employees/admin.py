@@ -10,7 +10,8 @@ import logging
 logger = logging.getLogger(__name__)
 from .models import (
     Organization, Department, Division, Employee, Vacation, BusinessTrip, 
-    WorkTimeRecord, SKUDDevice, SKUDEvent, WorkSession, WorkDaySummary, WorkTimeAuditLog,
+    WorkTimeRecord, SKUDDevice, SKUDCard, SKUDEvent, SKUDIngestItem, WorkDayDirtyMark, WorkSession, WorkDaySummary,
+    EmployeeMonthSummary, WorkTimeAuditLog, ReportJob,
     Role, Permission, RolePermission, UserRole, AccessLog, TemporaryPermission
 )
 
@@ -64,6 +65,12 @@ class WorkTimeRecordInline(admin.TabularInline):
     fields = ['date', 'arrival_time', 'departure_time', 'total_hours', 'is_present']
 
 
+class SKUDCardInline(admin.TabularInline):
+    model = SKUDCard
+    extra = 0
+    fields = ['card_number', 'is_active', 'description']
+
+
 class SKUDEventInline(admin.TabularInline):
     model = SKUDEvent
     extra = 0
@@ -137,7 +144,7 @@ class EmployeeAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
-    inlines = [VacationInline, BusinessTripInline, WorkTimeRecordInline, WorkSessionInline, WorkDaySummaryInline]
+    inlines = [SKUDCardInline, VacationInline, BusinessTripInline, WorkTimeRecordInline, WorkSessionInline, WorkDaySummaryInline]
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('organization', 'department', 'division')
@@ -299,6 +306,18 @@ class SKUDDeviceAdmin(admin.ModelAdmin):
     sync_time.short_description = "Синхронизировать время выбранных устройств"
 
 
+@admin.register(SKUDCard)
+class SKUDCardAdmin(admin.ModelAdmin):
+    list_display = ['card_number', 'employee', 'is_active', 'created_at']
+    list_filter = ['is_active', 'created_at']
+    search_fields = ['card_number', 'employee__last_name', 'employee__first_name', 'employee__employee_id']
+    readonly_fields = ['id', 'created_at', 'updated_at']
+    raw_id_fields = ['employee']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('employee')
+
+
 @admin.register(SKUDEvent)
 class SKUDEventAdmin(admin.ModelAdmin):
     list_display = ['event_time', 'device_name', 'employee_name', 'event_type', 'card_number', 'is_processed']
@@ -361,6 +380,22 @@ class SKUDEventAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('device', 'employee')
 
 
+@admin.register(SKUDIngestItem)
+class SKUDIngestItemAdmin(admin.ModelAdmin):
+    list_display = ['id', 'device_ip', 'received_at', 'attempts', 'next_attempt_at', 'is_failed']
+    list_filter = ['is_failed', 'received_at']
+    search_fields = ['device_ip', 'last_error']
+    readonly_fields = ['device_ip', 'payload', 'received_at', 'attempts', 'next_attempt_at', 'last_error']
+
+
+@admin.register(WorkDayDirtyMark)
+class WorkDayDirtyMarkAdmin(admin.ModelAdmin):
+    list_display = ['employee', 'date', 'reason', 'marked_at', 'attempts', 'is_failed']
+    list_filter = ['is_failed', 'reason', 'date']
+    search_fields = ['employee__last_name', 'employee__employee_id', 'last_error']
+    readonly_fields = ['employee', 'date', 'reason', 'marked_at', 'attempts', 'last_error']
+
+
 @admin.register(WorkSession)
 class WorkSessionAdmin(admin.ModelAdmin):
     """Админка для рабочих сессий"""
@@ -386,6 +421,10 @@ class WorkSessionAdmin(admin.ModelAdmin):
             'fields': ('duration_seconds', 'duration_hours_display'),
             'classes': ('collapse',)
         }),
+        ('События СКУД', {
+            'fields': ('start_event', 'end_event', 'event_count'),
+            'classes': ('collapse',)
+        }),
         ('Ручные корректировки', {
             'fields': ('manual_reason', 'corrected_by'),
             'classes': ('collapse',)
@@ -397,7 +436,8 @@ class WorkSessionAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = [
-        'id', 'created_at', 'updated_at', 'duration_seconds', 'duration_hours_display'
+        'id', 'created_at', 'updated_at', 'duration_seconds', 'duration_hours_display',
+        'start_event', 'end_event', 'event_count'
     ]
     
     actions = ['close_open_sessions', 'mark_as_manual', 'reprocess_sessions']
@@ -655,6 +695,39 @@ class WorkDaySummaryAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('employee')
 
 
+@admin.register(EmployeeMonthSummary)
+class EmployeeMonthSummaryAdmin(admin.ModelAdmin):
+    """Сводки за месяц только для просмотра: пересчитываются из дневных сводок"""
+    list_display = [
+        'employee', 'month', 'total_hours', 'expected_hours',
+        'days_count', 'present_days', 'absent_days', 'late_days', 'updated_at'
+    ]
+    list_filter = ['month', 'employee__department']
+    search_fields = ['employee__last_name', 'employee__employee_id']
+    date_hierarchy = 'month'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """Задания на отчёты только для просмотра: создаются через API"""
+    list_display = ['report_type', 'status', 'progress', 'filename', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['report_type', 'status']
+    search_fields = ['filename', 'created_by__username']
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(WorkTimeAuditLog)
 class WorkTimeAuditLogAdmin(admin.ModelAdmin):
     """Админка для аудита изменений в системе учёта рабочего времени"""
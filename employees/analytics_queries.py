@@ -0,0 +1,151 @@
+"""
+Запросы для графиков аналитики (frontend_views.analytics_data)
+
+Каждый график считается группирующими агрегатами в базе данных, поэтому
+число запросов зависит от типа графика, а не от количества сотрудников.
+"""
+
+import logging
+from datetime import date
+from typing import Dict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q, Sum
+
+from .dashboard_snapshot import rank_problematic_employees
+from .models import Employee, WorkSession
+
+logger = logging.getLogger(__name__)
+
+# Норма часов сотрудника для метрики эффективности отдела
+EFFICIENCY_HOURS_NORM = 40
+
+
+def _full_name(last_name: str, first_name: str, middle_name: str) -> str:
+    """ФИО как Employee.full_name"""
+    return f"{last_name} {first_name} {middle_name}".strip()
+
+
+def top_employees_chart(start_date: date, limit: int) -> Dict:
+    """Топ сотрудников по отработанным часам с даты start_date (один запрос)"""
+    top_employees = WorkSession.objects.filter(
+        date__gte=start_date,
+        employee__is_active=True
+    ).values(
+        'employee_id', 'employee__last_name', 'employee__first_name',
+        'employee__middle_name', 'employee__department__name'
+    ).annotate(
+        total_seconds=Sum('duration_seconds'),
+        sessions_count=Count('id')
+    ).order_by('-total_seconds', 'employee__last_name', 'employee__first_name')[:limit]
+
+    table_data = [
+        {
+            'name': _full_name(row['employee__last_name'], row['employee__first_name'], row['employee__middle_name']),
+            'department': row['employee__department__name'] or 'Не указан',
+            'hours': round((row['total_seconds'] or 0) / 3600, 2),
+            'sessions': row['sessions_count']
+        } for row in top_employees
+    ]
+
+    return {
+        'labels': [row['name'] for row in table_data],
+        'data': [row['hours'] for row in table_data],
+        'table_data': table_data
+    }
+
+
+def departments_chart(start_date: date, today: date, period: int, limit: int, metric: str) -> Dict:
+    """
+    Показатели крупнейших отделов (два запроса)
+
+    Args:
+        metric: efficiency - часы к норме EFFICIENCY_HOURS_NORM на сотрудника,
+            attendance - сессии к числу дней периода на сотрудника, иначе - часы
+    """
+    departments = Employee.objects.filter(is_active=True).values('department__name').annotate(
+        total_employees=Count('id')
+    ).order_by('-total_employees', 'department__name')[:limit]
+
+    sessions_by_department = {
+        row['employee__department__name']: row
+        for row in WorkSession.objects.filter(
+            date__gte=start_date,
+            employee__is_active=True
+        ).values('employee__department__name').annotate(
+            total_seconds=Sum('duration_seconds'),
+            sessions_count=Count('id'),
+            present_today=Count('employee', filter=Q(date=today), distinct=True)
+        ).order_by()
+    }
+
+    departments_stats = []
+    for dept in departments:
+        dept_name = dept['department__name']
+        total_emp = dept['total_employees']
+        sessions = sessions_by_department.get(dept_name, {})
+        total_hours = (sessions.get('total_seconds') or 0) / 3600
+
+        if metric == 'efficiency':
+            value = (total_hours / (total_emp * EFFICIENCY_HOURS_NORM)) * 100 if total_emp > 0 else 0
+        elif metric == 'attendance':
+            total_days = total_emp * period
+            value = (sessions.get('sessions_count', 0) / total_days) * 100 if total_days > 0 else 0
+        else:  # hours
+            value = total_hours
+
+        departments_stats.append({
+            'name': dept_name,
+            'total_employees': total_emp,
+            'present_today': sessions.get('present_today', 0),
+            'value': round(value, 1)
+        })
+
+    return {
+        'labels': [dept['name'] for dept in departments_stats],
+        'data': [dept['value'] for dept in departments_stats],
+        'table_data': departments_stats
+    }
+
+
+def problematic_employees_chart(start_date: date, today: date, department: str, limit: int,
+                                filter_type: str) -> Dict:
+    """
+    Проблемные сотрудники за период (один запрос, рейтинг как на дашборде)
+
+    Args:
+        department: id отдела или 'all'
+        filter_type: problematic - рейтинг выше 3, best - не выше 3, иначе все
+    """
+    employees = Employee.objects.filter(is_active=True).select_related('department')
+    if department != 'all':
+        try:
+            employees = employees.filter(department_id=department)
+        except ValidationError:
+            logger.warning(f"Некорректный id отдела в фильтре аналитики: {department}")
+
+    rating_filter = None
+    if filter_type == 'problematic':
+        rating_filter = Q(rating__gt=3)
+    elif filter_type == 'best':
+        rating_filter = Q(rating__lte=3)
+
+    problematic_data = [
+        {
+            'full_name': item['employee'].full_name,
+            'department': item['employee'].department.name if item['employee'].department else 'Не указан',
+            'late_count': item['late_count'],
+            'missed_hours': item['missed_hours'],
+            'rating': item['rating'],
+            'status': item['status']
+        }
+        for item in rank_problematic_employees(
+            employees, start_date, today, limit=limit, rating_filter=rating_filter
+        )
+    ]
+
+    return {
+        'labels': [emp['full_name'] for emp in problematic_data[:10]],
+        'data': [emp['rating'] for emp in problematic_data[:10]],
+        'table_data': problematic_data
+    }
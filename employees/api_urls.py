@@ -8,7 +8,8 @@ from rest_framework.routers import DefaultRouter
 from .api_views import (
     WorkSessionViewSet, WorkDaySummaryViewSet, EmployeeViewSet,
     WorkTimeProcessorViewSet, WorkTimeAuditLogViewSet,
-    SKUDEventViewSet, SKUDDeviceViewSet, BirthdayViewSet, PINFLSyncViewSet
+    SKUDEventViewSet, SKUDDeviceViewSet, BirthdayViewSet, PINFLSyncViewSet,
+    ReportJobViewSet
 )
 
 # Создаём роутер для ViewSets
@@ -22,6 +23,7 @@ router.register(r'skud-events', SKUDEventViewSet, basename='skudevent')
 router.register(r'skud-devices', SKUDDeviceViewSet, basename='skuddevice')
 router.register(r'birthdays', BirthdayViewSet, basename='birthday')
 router.register(r'pinfl-sync', PINFLSyncViewSet, basename='pinflsync')
+router.register(r'report-jobs', ReportJobViewSet, basename='reportjob')
 
 urlpatterns = [
     # API маршруты через роутер
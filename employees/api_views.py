@@ -8,6 +8,7 @@ from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.http import FileResponse
 from django.db.models import Q, Sum, Count, Avg
 from django.utils import timezone
 from datetime import datetime, date, timedelta
@@ -15,15 +16,20 @@ from decimal import Decimal
 
 from .models import (
     Employee, WorkSession, WorkDaySummary, WorkTimeAuditLog,
-    SKUDEvent, SKUDDevice
+    SKUDEvent, SKUDDevice, ReportJob
 )
 from .serializers import (
     EmployeeSerializer, WorkSessionSerializer, WorkDaySummarySerializer,
     WorkTimeAuditLogSerializer, SKUDEventSerializer, SKUDDeviceSerializer,
     WorkSessionCreateSerializer, EmployeeWorkTimeStatsSerializer,
     DepartmentWorkTimeStatsSerializer, ReprocessWorkTimeSerializer,
-    BirthdayEmployeeSerializer, PINFLSyncSerializer, PINFLSyncResponseSerializer
+    BirthdayEmployeeSerializer, PINFLSyncSerializer, PINFLSyncResponseSerializer,
+    ReportJobSerializer, ReportJobCreateSerializer
 )
+from .birthdays import todays_birthdays, upcoming_birthdays
+from .month_rollup import empty_totals, get_period_totals
+from .permissions import PermissionChecker
+from .report_jobs import submit_job
 from .work_time_processor import WorkTimeProcessor
 from .pinfl_api import pinfl_client
 
@@ -263,24 +269,20 @@ class EmployeeViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Получаем сводки за период
-        summaries = WorkDaySummary.objects.filter(
-            employee=employee,
-            date__gte=from_date_obj,
-            date__lte=to_date_obj
-        )
+        # Итоги за период из сводок за месяц
+        totals = get_period_totals([employee.id], from_date_obj, to_date_obj).get(employee.id) or empty_totals()
         
         # Рассчитываем статистику
         total_days = (to_date_obj - from_date_obj).days + 1
-        present_days = summaries.filter(status='present').count()
-        absent_days = summaries.filter(status='absent').count()
-        excused_days = summaries.filter(status='excused').count()
-        problem_days = summaries.filter(status='problem').count()
+        present_days = totals['present_days']
+        absent_days = totals['absent_days']
+        excused_days = totals['excused_days']
+        problem_days = totals['problem_days']
         
-        total_hours_worked = sum(s.total_hours for s in summaries)
-        total_hours_expected = sum(s.expected_hours for s in summaries)
-        total_overtime_hours = sum(s.overtime_hours for s in summaries)
-        total_underwork_hours = sum(s.underwork_hours for s in summaries)
+        total_hours_worked = round(totals['total_seconds_in_office'] / 3600, 2)
+        total_hours_expected = round(totals['expected_seconds'] / 3600, 2)
+        total_overtime_hours = round(totals['overtime_seconds'] / 3600, 2)
+        total_underwork_hours = round(totals['underwork_seconds'] / 3600, 2)
         
         average_hours_per_day = total_hours_worked / total_days if total_days > 0 else 0
         work_efficiency_percent = (total_hours_worked / total_hours_expected * 100) if total_hours_expected > 0 else 0
@@ -465,57 +467,32 @@ class BirthdayViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def today_birthdays(self, request):
         """Получить именинников на сегодня"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         # Получаем сотрудников с днем рождения сегодня
-        birthday_employees = Employee.objects.filter(
-            is_active=True,
-            birth_date__month=today.month,
-            birth_date__day=today.day
+        birthday_employees = todays_birthdays(
+            Employee.objects.filter(is_active=True), today
         ).select_related('department', 'division')
         
         serializer = BirthdayEmployeeSerializer(birthday_employees, many=True)
         
         return Response({
             'today_birthdays': serializer.data,
-            'count': birthday_employees.count(),
+            'count': len(serializer.data),
             'date': today
         })
     
     @action(detail=False, methods=['get'])
     def upcoming_birthdays(self, request):
         """Получить ближайшие дни рождения (максимум 2 сотрудника)"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         limit = int(request.query_params.get('limit', 2))
         
-        # Получаем всех активных сотрудников
-        employees = Employee.objects.filter(is_active=True).select_related('department', 'division')
-        
-        # Создаем список с информацией о днях рождения
-        birthday_info = []
-        for employee in employees:
-            this_year_birthday = employee.birth_date.replace(year=today.year)
-            
-            # Если день рождения уже прошел в этом году, считаем до следующего года
-            if this_year_birthday < today:
-                next_year_birthday = employee.birth_date.replace(year=today.year + 1)
-                days_until = (next_year_birthday - today).days
-                birthday_date = next_year_birthday
-            else:
-                days_until = (this_year_birthday - today).days
-                birthday_date = this_year_birthday
-            
-            birthday_info.append({
-                'employee': employee,
-                'days_until': days_until,
-                'birthday_date': birthday_date
-            })
-        
-        # Сортируем по количеству дней до дня рождения
-        birthday_info.sort(key=lambda x: x['days_until'])
-        
-        # Берем только ближайшие
-        upcoming = birthday_info[:limit]
+        # Ближайшие дни рождения читаются по индексу birth_month_day
+        upcoming = upcoming_birthdays(
+            Employee.objects.filter(is_active=True).select_related('department', 'division'),
+            today, limit=limit
+        )
         
         # Сериализуем данные
         serializer = BirthdayEmployeeSerializer([item['employee'] for item in upcoming], many=True)
@@ -537,56 +514,26 @@ class BirthdayViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def birthday_widget_data(self, request):
         """Получить данные для виджета дня рождения"""
-        today = timezone.now().date()
-        
-        # Именинники сегодня фильтруем только по правам доступа
-        today_birthdays = Employee.objects.filter(
-            is_active=True,
-            birth_date__month=today.month,
-            birth_date__day=today.day
-        ).select_related('department', 'division')
-        
-        # Ближайшие дни рождения (максимум 2)
+        today = timezone.localdate()
         employees = Employee.objects.filter(is_active=True).select_related('department', 'division')
         
-        birthday_info = []
-        for employee in employees:
-            this_year_birthday = employee.birth_date.replace(year=today.year)
-            
-            if this_year_birthday < today:
-                next_year_birthday = employee.birth_date.replace(year=today.year + 1)
-                days_until = (next_year_birthday - today).days
-                birthday_date = next_year_birthday
-            else:
-                days_until = (this_year_birthday - today).days
-                birthday_date = this_year_birthday
-            
-            # Пропускаем тех, у кого день рождения сегодня (они уже в today_birthdays)
-            if days_until > 0:
-                birthday_info.append({
-                    'employee': employee,
-                    'days_until': days_until,
-                    'birthday_date': birthday_date
-                })
-        
-        # Сортируем и берем ближайшие
-        birthday_info.sort(key=lambda x: x['days_until'])
-        upcoming_birthdays = birthday_info[:2]
+        # Именинники сегодня фильтруем только по правам доступа
+        today_serializer = BirthdayEmployeeSerializer(todays_birthdays(employees, today), many=True)
         
-        # Сериализуем данные
-        today_serializer = BirthdayEmployeeSerializer(today_birthdays, many=True)
-        upcoming_serializer = BirthdayEmployeeSerializer([item['employee'] for item in upcoming_birthdays], many=True)
+        # Ближайшие дни рождения (максимум 2), без сегодняшних именинников
+        upcoming = upcoming_birthdays(employees, today, limit=2, include_today=False)
+        upcoming_serializer = BirthdayEmployeeSerializer([item['employee'] for item in upcoming], many=True)
         
         # Формируем результат
         result = {
-            'has_today_birthdays': today_birthdays.exists(),
+            'has_today_birthdays': bool(today_serializer.data),
             'today_birthdays': today_serializer.data,
             'upcoming_birthdays': [],
             'today': today
         }
         
         # Добавляем информацию о ближайших днях рождения
-        for i, item in enumerate(upcoming_birthdays):
+        for i, item in enumerate(upcoming):
             data = upcoming_serializer.data[i]
             data['days_until_birthday'] = item['days_until']
             data['birthday_date'] = item['birthday_date']
@@ -600,7 +547,7 @@ class BirthdayViewSet(viewsets.ViewSet):
         from django.db.models import Count
         from collections import defaultdict
         
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         # Основные метрики
         total_employees = Employee.objects.filter(is_active=True).count()
@@ -617,31 +564,10 @@ class BirthdayViewSet(viewsets.ViewSet):
         ages = [emp.age for emp in employees]
         avg_age = sum(ages) / len(ages) if ages else 0
         
-        # Именинники сегодня
-        today_birthdays = Employee.objects.filter(
-            is_active=True,
-            birth_date__month=today.month,
-            birth_date__day=today.day
-        ).select_related('department', 'division')
-        
-        # Ближайшие дни рождения
-        upcoming_birthdays = []
-        for emp in Employee.objects.filter(is_active=True).select_related('department', 'division'):
-            this_year_birthday = emp.birth_date.replace(year=today.year)
-            if this_year_birthday < today:
-                next_year_birthday = emp.birth_date.replace(year=today.year + 1)
-                days_until = (next_year_birthday - today).days
-            else:
-                days_until = (this_year_birthday - today).days
-            
-            if 0 < days_until <= 7:
-                upcoming_birthdays.append({
-                    'employee': emp,
-                    'days_until': days_until
-                })
-        
-        upcoming_birthdays.sort(key=lambda x: x['days_until'])
-        upcoming_birthdays = upcoming_birthdays[:3]  # Топ 3 ближайших
+        # Именинники сегодня и ближайшие дни рождения на неделю (топ 3)
+        birthday_employees = Employee.objects.filter(is_active=True).select_related('department', 'division')
+        today_birthdays = todays_birthdays(birthday_employees, today)
+        upcoming = upcoming_birthdays(birthday_employees, today, limit=3, days=7, include_today=False)
         
         # Текучесть за последние 6 месяцев
         six_months_ago = today - timedelta(days=180)
@@ -667,7 +593,7 @@ class BirthdayViewSet(viewsets.ViewSet):
                 {
                     'employee': BirthdayEmployeeSerializer(item['employee']).data,
                     'days_until': item['days_until']
-                } for item in upcoming_birthdays
+                } for item in upcoming
             ],
             'turnover_rate': round(turnover_rate, 1),
             'new_employees': new_employees,
@@ -850,3 +776,86 @@ class PINFLSyncViewSet(viewsets.ViewSet):
             'employees': serializer.data,
             'count': employees.count()
         })
+
+
+class ReportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet для фонового формирования отчётов
+    
+    POST создаёт задание, GET по id возвращает статус и прогресс,
+    download - готовый файл.
+    """
+    
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['report_type', 'status']
+    ordering = ['-created_at']
+    
+    def get_queryset(self):
+        """Пользователь видит только свои задания (суперпользователь - все)"""
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+    
+    def create(self, request):
+        """Создание задания на отчёт"""
+        if not PermissionChecker.can_export_data(request.user):
+            return Response(
+                {'error': 'У вас нет прав для экспорта данных'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = ReportJobCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        params = serializer.get_report_params()
+        if not self._can_order_report(request.user, params):
+            return Response(
+                {'error': 'Нет доступа к данным сотрудников отчёта'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        job = submit_job(request.user, serializer.validated_data['report_type'], params)
+        return Response(ReportJobSerializer(job).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Загрузка готового файла отчёта"""
+        job = self.get_object()
+        if job.status != 'done' or not job.file:
+            return Response(
+                {'error': 'Отчёт ещё не сформирован', 'status': job.status, 'progress': job.progress},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        try:
+            report_file = job.file.open('rb')
+        except FileNotFoundError:
+            return Response({'error': 'Файл отчёта не найден'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(report_file, as_attachment=True, filename=job.filename)
+    
+    def _can_order_report(self, user, params):
+        """
+        Отчёт только по доступным сотрудникам (по всей организации - суперпользователь)
+        
+        Отчёт по департаменту включает всех его сотрудников, поэтому нужен
+        доступ к каждому активному сотруднику департамента (руководителю
+        отдела доступа к части департамента недостаточно).
+        """
+        if user.is_superuser:
+            return True
+        
+        accessible_employees = PermissionChecker.get_accessible_employees(user)
+        if params.get('employee_id'):
+            return accessible_employees.filter(id=params['employee_id']).exists()
+        if params.get('department_id'):
+            department_employees = Employee.objects.filter(is_active=True, department_id=params['department_id'])
+            return (
+                department_employees.exists()
+                and not department_employees.exclude(id__in=accessible_employees.values('id')).exists()
+            )
+        return False
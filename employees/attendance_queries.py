@@ -0,0 +1,200 @@
+"""
+Запросы страницы контроля прибытия и отбытия (attendance_control)
+
+Дневной и месячный виды строятся одним аннотированным QuerySet сотрудников:
+время прихода и ухода, часы и количество входов - подзапросы к WorkSession,
+статусы - выражения по сводкам дней и сводкам за месяц. Фильтр по статусу,
+сортировка и пагинация выполняются в базе данных, поэтому страница из
+per_page строк не зависит от числа доступных сотрудников.
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+
+from django.db.models import Case, CharField, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from .models import Employee, WorkDaySummary, WorkSession
+from .month_rollup import annotate_period_totals, employee_aggregate
+from .permissions import PermissionChecker
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых сотрудник считается присутствовавшим (заголовок страницы)
+PRESENT_STATUSES = ['present', 'partial', 'excellent', 'good']
+
+# Названия статусов для выгрузки
+STATUS_LABELS = {
+    'present': 'Присутствовал',
+    'partial': 'Частично присутствовал',
+    'absent': 'Отсутствовал',
+    'no_data': 'Нет данных',
+    'excellent': 'Отлично',
+    'good': 'Хорошо',
+    'average': 'Удовлетворительно',
+    'poor': 'Плохо',
+}
+
+# Поля итогов за период для месячного вида
+MONTHLY_FIELDS = ['total_seconds_in_office', 'expected_seconds', 'days_with_sessions', 'present_days', 'days_count']
+
+
+def parse_attendance_period(params, today: Optional[date] = None) -> Tuple[date, date]:
+    """Период из параметров date_from/date_to (по умолчанию - сегодня)"""
+    today = today or timezone.localdate()
+
+    period = []
+    for name in ('date_from', 'date_to'):
+        try:
+            period.append(datetime.strptime(params.get(name, ''), '%Y-%m-%d').date())
+        except ValueError:
+            period.append(today)
+
+    # Убеждаемся, что date_from не больше date_to
+    date_from, date_to = sorted(period)
+    return date_from, date_to
+
+
+def attendance_employees(user, search_query: str = '', department_id: str = ''):
+    """Доступные пользователю сотрудники с фильтрами по имени и отделу"""
+    if user.is_superuser:
+        employees = Employee.objects.filter(is_active=True)
+    else:
+        # Получаем доступных сотрудников через систему ролей
+        employees = PermissionChecker.get_accessible_employees(user)
+    employees = employees.select_related('department', 'division')
+
+    # Поиск по имени
+    if search_query:
+        employees = employees.filter(
+            Q(first_name__icontains=search_query) |
+            Q(last_name__icontains=search_query) |
+            Q(middle_name__icontains=search_query)
+        )
+
+    # Фильтр по отделу
+    if department_id:
+        employees = employees.filter(department_id=department_id)
+
+    return employees
+
+
+def _employee_rows(queryset):
+    """Строки сотрудника из внешнего запроса"""
+    return queryset.filter(employee_id=OuterRef('pk')).order_by()
+
+
+def annotate_daily_attendance(employees, date_from: date, date_to: date):
+    """
+    Дневной вид: приход, уход, часы и статус сотрудника за период
+
+    Аннотации: arrival_at (начало первой сессии), departure_at (окончание
+    последней сессии, None - сессия открыта), entry_count, total_seconds,
+    summaries_count, present_summaries, status.
+    """
+    sessions = WorkSession.objects.filter(date__range=[date_from, date_to])
+    summaries = WorkDaySummary.objects.filter(date__range=[date_from, date_to])
+
+    return employees.annotate(
+        arrival_at=Subquery(_employee_rows(sessions).order_by('date', 'start_time').values('start_time')[:1]),
+        departure_at=Subquery(_employee_rows(sessions).order_by('-date', '-start_time').values('end_time')[:1]),
+        entry_count=employee_aggregate(sessions, Count('id')),
+        total_seconds=employee_aggregate(sessions, Sum('duration_seconds')),
+        summaries_count=employee_aggregate(summaries, Count('id')),
+        present_summaries=employee_aggregate(summaries, Count('id', filter=Q(status='present'))),
+    ).annotate(
+        # Статус по сводкам за период, без сводок - по наличию сессий
+        status=Case(
+            When(summaries_count=0, entry_count__gt=0, then=Value('present')),
+            When(summaries_count=0, then=Value('absent')),
+            When(present_summaries=F('summaries_count'), then=Value('present')),
+            When(present_summaries__gt=0, then=Value('partial')),
+            default=Value('absent'),
+            output_field=CharField(),
+        )
+    )
+
+
+def annotate_monthly_attendance(employees, date_from: date, date_to: date):
+    """
+    Месячный вид: итоги за период из сводок за месяц и статус посещаемости
+
+    Аннотации: period_<поле> для MONTHLY_FIELDS и status (excellent - все
+    дни присутствия, good - от 80%, average - от 60%, poor, no_data).
+    """
+    return annotate_period_totals(employees, date_from, date_to, MONTHLY_FIELDS).annotate(
+        status=Case(
+            When(period_days_count=0, then=Value('no_data')),
+            When(period_present_days=F('period_days_count'), then=Value('excellent')),
+            When(Q(period_present_days__gte=F('period_days_count') * 0.8), then=Value('good')),
+            When(Q(period_present_days__gte=F('period_days_count') * 0.6), then=Value('average')),
+            default=Value('poor'),
+            output_field=CharField(),
+        )
+    )
+
+
+def attendance_queryset(employees, view_type: str, date_from: date, date_to: date,
+                        status_filter: str = '', sort_by: str = 'name', sort_order: str = 'asc'):
+    """
+    Отфильтрованный и отсортированный QuerySet строк страницы
+
+    Args:
+        view_type: daily или monthly
+        sort_by: name, hours или entries
+    """
+    if view_type == 'daily':
+        queryset = annotate_daily_attendance(employees, date_from, date_to)
+        hours_field, entries_field = 'total_seconds', 'entry_count'
+    else:
+        queryset = annotate_monthly_attendance(employees, date_from, date_to)
+        hours_field, entries_field = 'period_total_seconds_in_office', 'period_days_with_sessions'
+
+    # Применяем фильтр по статусу
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    prefix = '-' if sort_order == 'desc' else ''
+    if sort_by == 'hours':
+        ordering = [f'{prefix}{hours_field}']
+    elif sort_by == 'entries':
+        ordering = [f'{prefix}{entries_field}']
+    else:
+        ordering = []
+    ordering += [f'{prefix}last_name', f'{prefix}first_name', f'{prefix}middle_name', 'id']
+    return queryset.order_by(*ordering)
+
+
+def attendance_counts(queryset) -> Dict[str, int]:
+    """Всего строк и присутствовавших (для заголовка страницы) одним запросом"""
+    return queryset.order_by().aggregate(
+        total=Count('id'),
+        present=Count('id', filter=Q(status__in=PRESENT_STATUSES)),
+    )
+
+
+def daily_row(employee) -> Dict:
+    """Строка дневного вида для шаблона"""
+    return {
+        'employee': employee,
+        'arrival_time': timezone.localtime(employee.arrival_at).time() if employee.arrival_at else None,
+        'departure_time': timezone.localtime(employee.departure_at).time() if employee.departure_at else None,
+        'total_hours': round(employee.total_seconds / 3600, 2),
+        'entry_count': employee.entry_count,
+        'status': employee.status,
+    }
+
+
+def monthly_row(employee) -> Dict:
+    """Строка месячного вида для шаблона"""
+    return {
+        'employee': employee,
+        'total_work_hours': employee.period_total_seconds_in_office / 3600,
+        'total_expected_hours': employee.period_expected_seconds / 3600,
+        # Количество дней с сессиями (а не количество входов)
+        'total_entry_count': employee.period_days_with_sessions,
+        'present_days': employee.period_present_days,
+        'total_work_days': employee.period_days_count,
+        'status': employee.status,
+    }
@@ -0,0 +1,118 @@
+"""
+Поиск ближайших дней рождения сотрудников
+
+Дни рождения ищутся по индексированному полю Employee.birth_month_day
+(месяц * 100 + день), поэтому виджеты читают из базы только нужные строки,
+а не всех сотрудников.
+
+Ключи упорядочены так же, как дни года, поэтому ближайшие дни рождения -
+это ключи от сегодняшнего до конца года, затем с начала года до
+сегодняшнего. День рождения 29 февраля в невисокосный год отмечается
+28 февраля.
+"""
+
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+# Ключ дня рождения 29 февраля
+LEAP_DAY_KEY = 229
+
+
+def birth_month_day(day: date) -> int:
+    """Ключ дня года: месяц * 100 + день"""
+    return day.month * 100 + day.day
+
+
+def next_birthday(birth_date: date, since: date) -> date:
+    """Ближайший день рождения не раньше даты since"""
+    for year in (since.year, since.year + 1):
+        if birth_date.month == 2 and birth_date.day == 29 and not calendar.isleap(year):
+            birthday = date(year, 2, 28)
+        else:
+            birthday = birth_date.replace(year=year)
+        if birthday >= since:
+            return birthday
+    # Недостижимо: день рождения в следующем году всегда позже since
+    raise ValueError(f"Не найден день рождения для {birth_date}")
+
+
+def days_until_birthday(birth_date: date, today: Optional[date] = None) -> int:
+    """Количество дней до ближайшего дня рождения (0 - сегодня)"""
+    today = today or timezone.localdate()
+    return (next_birthday(birth_date, today) - today).days
+
+
+def _day_keys(day: date) -> List[int]:
+    """Ключи дней рождения, которые отмечаются в день day"""
+    keys = [birth_month_day(day)]
+    if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+        keys.append(LEAP_DAY_KEY)
+    return keys
+
+
+def todays_birthdays(employees, today: Optional[date] = None):
+    """Сотрудники, у которых день рождения сегодня (QuerySet)"""
+    today = today or timezone.localdate()
+    return employees.filter(birth_month_day__in=_day_keys(today))
+
+
+def upcoming_birthdays(employees, today: Optional[date] = None, limit: Optional[int] = None,
+                       days: Optional[int] = None, include_today: bool = True) -> List[Dict]:
+    """
+    Ближайшие дни рождения сотрудников
+
+    Args:
+        employees: QuerySet сотрудников
+        today: Дата отсчёта (по умолчанию - сегодня)
+        limit: Максимальное количество сотрудников
+        days: Только дни рождения не позже чем через days дней
+        include_today: Включать сегодняшних именинников
+
+    Returns:
+        List[Dict]: 'employee', 'birthday_date', 'days_until', 'is_today'
+        в порядке приближения дня рождения
+    """
+    today = today or timezone.localdate()
+    start = today if include_today else today + timedelta(days=1)
+    start_key = birth_month_day(start)
+
+    # Диапазоны ключей от start до конца окна (не больше года)
+    if days is None:
+        ranges = [(start_key, 1231), (101, start_key - 1)]
+    else:
+        end = today + timedelta(days=days)
+        if end < start:
+            return []
+        end_key = max(_day_keys(end))
+        if end.year == start.year:
+            ranges = [(start_key, end_key)]
+        else:
+            ranges = [(start_key, 1231), (101, min(end_key, start_key - 1))]
+
+    result = []
+    for range_from, range_to in ranges:
+        if range_from > range_to:
+            continue
+        queryset = employees.filter(
+            birth_month_day__range=[range_from, range_to]
+        ).order_by('birth_month_day', 'last_name', 'first_name')
+        if limit is not None:
+            queryset = queryset[:limit - len(result)]
+
+        for employee in queryset:
+            birthday_date = next_birthday(employee.birth_date, start)
+            days_until = (birthday_date - today).days
+            result.append({
+                'employee': employee,
+                'birthday_date': birthday_date,
+                'days_until': days_until,
+                'is_today': days_until == 0,
+            })
+
+        if limit is not None and len(result) >= limit:
+            break
+
+    return result
@@ -2,11 +2,16 @@
 Утилиты для кэширования данных
 """
 
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 from django.utils import timezone
 from datetime import timedelta
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 import logging
+import threading
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -129,6 +134,69 @@ class SKUDCache:
         logger.info("Event cache cleared")
 
 
+def is_shared_cache(alias: str = 'default') -> bool:
+    """Django cache общий для процессов (веб-процессы и воркеры Celery видят одни данные)"""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+class VersionedLocalCache:
+    """
+    Кэш в памяти процесса, согласованный между воркерами через Django cache
+    
+    В Django cache хранится номер версии и сами данные. Каждый процесс держит
+    локальную копию и не чаще чем раз в check_interval секунд сверяет версию.
+    invalidate() меняет версию, после чего все процессы перезагружают данные.
+    """
+    
+    def __init__(self, name: str, loader: Callable[[], Any], check_interval: float = 5):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self.version_key = f'{name}_version'
+        self.data_key = f'{name}_data'
+        self._data = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    def get(self) -> Any:
+        """Получение данных (из памяти, из Django cache или через loader)"""
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < self.check_interval:
+            return self._data
+        
+        with self._lock:
+            version = cache.get(self.version_key)
+            if version is None:
+                cache.add(self.version_key, uuid.uuid4().hex, None)
+                version = cache.get(self.version_key)
+            
+            if self._data is None or version != self._version:
+                cached = cache.get(self.data_key)
+                if cached is not None and cached[0] == version:
+                    data = cached[1]
+                else:
+                    data = self.loader()
+                    cache.set(self.data_key, (version, data), None)
+                    logger.info(f"{self.name} reloaded")
+                self._data = data
+                self._version = version
+            
+            self._checked_at = now
+            return self._data
+    
+    @property
+    def version(self) -> Optional[str]:
+        """Версия данных, загруженных в память процесса"""
+        return self._version
+    
+    def invalidate(self) -> None:
+        """Сброс данных во всех процессах"""
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        self._data = None
+        logger.info(f"{self.name} invalidated")
+
+
 def cache_dashboard_data():
     """Функция для кэширования данных дашборда"""
     from .models import SKUDDevice, SKUDEvent
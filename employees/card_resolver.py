@@ -0,0 +1,134 @@
+"""
+Определение сотрудника по номеру карты СКУД
+
+Номер карты ищется в таблице SKUDCard, а для совместимости также
+в табельных номерах (Employee.employee_id). Соответствие карта -> сотрудник
+хранится в памяти процесса, неизвестные карты (гости, посетители)
+запоминаются на NEGATIVE_TTL секунд, чтобы не искать их в БД при каждом проходе.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from .cache_utils import VersionedLocalCache
+from .models import Employee, SKUDCard
+
+logger = logging.getLogger(__name__)
+
+
+class CardResolver:
+    """Индекс номер карты -> активный сотрудник"""
+    
+    # Как часто (в секундах) процесс сверяет версию индекса с Django cache
+    CHECK_INTERVAL = 5
+    
+    # Время жизни записи о неизвестной карте (в секундах)
+    NEGATIVE_TTL = 60
+    
+    # Размер негативного кэша, после которого удаляются устаревшие записи
+    NEGATIVE_CACHE_MAX_SIZE = 10000
+    
+    def __init__(self):
+        self.logger = logger
+        self._cache = VersionedLocalCache('skud_card_registry', self._load_cards, self.CHECK_INTERVAL)
+        self._negative = {}
+        self._negative_version = None
+        self._lock = threading.Lock()
+    
+    def _load_cards(self) -> Dict[str, Employee]:
+        """Загрузка всех карт активных сотрудников"""
+        cards = {
+            employee.employee_id: employee
+            for employee in Employee.objects.filter(is_active=True)
+        }
+        
+        # Выданные карты имеют приоритет над табельными номерами
+        for card in SKUDCard.objects.filter(
+            is_active=True, employee__is_active=True
+        ).select_related('employee'):
+            cards[card.card_number] = card.employee
+        
+        self.logger.info(f"Индекс карт СКУД загружен: {len(cards)} карт")
+        return cards
+    
+    def _query_cards(self, card_numbers: Iterable[str]) -> Dict[str, Employee]:
+        """Поиск карт в БД (для карт, выданных после загрузки индекса)"""
+        card_numbers = set(card_numbers)
+        
+        found = {
+            employee.employee_id: employee
+            for employee in Employee.objects.filter(employee_id__in=card_numbers, is_active=True)
+        }
+        for card in SKUDCard.objects.filter(
+            card_number__in=card_numbers, is_active=True, employee__is_active=True
+        ).select_related('employee'):
+            found[card.card_number] = card.employee
+        
+        return found
+    
+    def resolve(self, card_number: str) -> Optional[Employee]:
+        """Поиск сотрудника по номеру карты"""
+        if not card_number:
+            return None
+        return self.resolve_many([card_number]).get(card_number)
+    
+    def resolve_many(self, card_numbers: Iterable[str]) -> Dict[str, Employee]:
+        """
+        Поиск сотрудников по списку номеров карт
+        
+        Карты, которых нет в индексе и в негативном кэше, ищутся одним запросом.
+        """
+        cards = self._cache.get()
+        now = time.monotonic()
+        
+        result = {}
+        missing = set()
+        
+        with self._lock:
+            if self._negative_version != self._cache.version:
+                self._negative.clear()
+                self._negative_version = self._cache.version
+            
+            for card_number in card_numbers:
+                if not card_number or card_number in result:
+                    continue
+                employee = cards.get(card_number)
+                if employee is not None:
+                    result[card_number] = employee
+                elif self._negative.get(card_number, 0) <= now:
+                    missing.add(card_number)
+        
+        if not missing:
+            return result
+        
+        found = self._query_cards(missing)
+        
+        with self._lock:
+            for card_number in missing:
+                employee = found.get(card_number)
+                if employee is not None:
+                    cards[card_number] = employee
+                    result[card_number] = employee
+                else:
+                    self._negative[card_number] = now + self.NEGATIVE_TTL
+            
+            if len(self._negative) > self.NEGATIVE_CACHE_MAX_SIZE:
+                self._negative = {
+                    card_number: expires_at
+                    for card_number, expires_at in self._negative.items()
+                    if expires_at > now
+                }
+        
+        return result
+    
+    def invalidate(self) -> None:
+        """Сброс индекса карт во всех процессах"""
+        self._cache.invalidate()
+        with self._lock:
+            self._negative.clear()
+
+
+# Глобальный экземпляр индекса карт
+card_resolver = CardResolver()
@@ -0,0 +1,493 @@
+"""
+Колоночный пересчёт рабочих сессий для исторических данных (NumPy)
+
+События за период загружаются одним запросом в массивы (сотрудник, время
+в микросекундах, направление), а разбиение на сессии, отбрасывание коротких
+сессий и итоги по дням считаются векторными операциями NumPy. Бизнес-правила
+совпадают с WorkTimeProcessor:
+
+- выход закрывает сессию, только если предыдущее событие того же дня - вход;
+- сессии короче MIN_SESSION_DURATION_SECONDS отбрасываются;
+- последний вход дня без выхода даёт открытую сессию.
+
+Дни с ручными сессиями пересчитываются WorkTimeProcessor.process_day_batch.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, TextField, Value, When
+from django.utils import timezone
+
+from .absence_calendar import absence_calendar
+from .dashboard_snapshot import dashboard_snapshots
+from .models import Employee, SKUDEvent, WorkDaySummary, WorkSession
+from .month_rollup import refresh_month_summaries
+from .work_time_processor import WorkTimeProcessor
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+MICROSECONDS_IN_SECOND = 1000000
+
+# Коды направления события
+ENTRY = 1
+EXIT = 2
+
+
+class ColumnarWorkTimeEngine:
+    """Пересчёт сессий и сводок за период векторными операциями"""
+
+    # Типы событий, направление которых определяется без raw_data
+    DIRECT_EVENT_TYPES = {
+        'entry': ENTRY, 'in': ENTRY, 'вход': ENTRY,
+        'exit': EXIT, 'out': EXIT, 'выход': EXIT,
+    }
+
+    # Количество дней, обрабатываемых в одной транзакции
+    CHUNK_DAYS = 7
+
+    def __init__(self, processor: Optional[WorkTimeProcessor] = None):
+        self.logger = logger
+        self.processor = processor or WorkTimeProcessor()
+
+    def rebuild(self, from_date: date, to_date: date, employees=None,
+                pairs: Optional[Set[Tuple]] = None, skip_existing: bool = False,
+                create_empty_summaries: bool = False) -> Dict[str, int]:
+        """
+        Пересчёт сессий и сводок за период
+
+        Args:
+            from_date: Начальная дата
+            to_date: Конечная дата
+            employees: QuerySet сотрудников (по умолчанию - все активные)
+            pairs: Обрабатывать только эти пары (id сотрудника, дата)
+            skip_existing: Пропускать дни, для которых уже есть сессии или сводка
+            create_empty_summaries: Создавать пустые сводки для дней без событий
+
+        Returns:
+            Dict: Статистика пересчёта
+        """
+        if employees is None:
+            employees = Employee.objects.filter(is_active=True)
+
+        employees_by_id = {
+            employee.id: employee
+            for employee in employees.only(
+                'id', 'last_name', 'first_name', 'middle_name', 'daily_hours', 'work_fraction',
+                'work_start_time', 'work_end_time'
+            )
+        }
+
+        stats = {
+            'days': 0, 'events': 0, 'sessions': 0,
+            'summaries_created': 0, 'summaries_updated': 0, 'skipped': 0,
+        }
+        if not employees_by_id:
+            return stats
+
+        chunk_start = from_date
+        while chunk_start <= to_date:
+            chunk_end = min(chunk_start + timedelta(days=self.CHUNK_DAYS - 1), to_date)
+            chunk_stats = self._rebuild_chunk(
+                chunk_start, chunk_end, employees_by_id, pairs, skip_existing, create_empty_summaries
+            )
+            for key, value in chunk_stats.items():
+                stats[key] += value
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.logger.info(
+            f"Колоночный пересчёт {from_date} - {to_date}: {stats['events']} событий, "
+            f"{stats['sessions']} сессий, {stats['summaries_created']} новых сводок"
+        )
+        return stats
+
+    def _rebuild_chunk(self, from_date: date, to_date: date, employees_by_id: Dict,
+                       pairs: Optional[Set[Tuple]], skip_existing: bool,
+                       create_empty_summaries: bool) -> Dict[str, int]:
+        employee_ids = list(employees_by_id)
+        employee_index = {employee_id: index for index, employee_id in enumerate(employee_ids)}
+        days = [from_date + timedelta(days=n) for n in range((to_date - from_date).days + 1)]
+        n_days = len(days)
+
+        # Начала дней в текущем часовом поясе (последний элемент - начало следующего дня)
+        day_starts = np.array([
+            self._to_microseconds(timezone.make_aware(datetime.combine(day, time.min)))
+            for day in days + [to_date + timedelta(days=1)]
+        ], dtype=np.int64)
+
+        event_ids, event_times, emp_idx, times_us, direction = self._load_events(
+            employee_ids, employee_index, days[0], days[-1]
+        )
+
+        day_idx = np.searchsorted(day_starts, times_us, side='right') - 1
+        group = emp_idx * n_days + day_idx
+
+        # Ограничиваем обработку выбранными днями
+        allowed = None
+        if pairs is not None:
+            allowed = {
+                employee_index[employee_id] * n_days + (day - from_date).days
+                for employee_id, day in pairs
+                if employee_id in employee_index and from_date <= day <= to_date
+            }
+        skipped = set()
+        if skip_existing:
+            skipped = self._get_existing_groups(employee_ids, employee_index, from_date, to_date, n_days)
+
+        # Дни с ручными сессиями пересчитывает WorkTimeProcessor: ручная сессия
+        # заменяет автоматические в своём интервале
+        manual_groups = self._get_manual_groups(employee_ids, employee_index, from_date, to_date, n_days) - skipped
+        if allowed is not None:
+            manual_groups &= allowed
+        excluded = skipped | manual_groups
+
+        if allowed is not None or excluded:
+            mask = np.ones(len(group), dtype=bool)
+            if allowed is not None:
+                mask &= np.isin(group, np.fromiter(allowed, dtype=np.int64, count=len(allowed)))
+            if excluded:
+                mask &= ~np.isin(group, np.fromiter(excluded, dtype=np.int64, count=len(excluded)))
+            keep = np.nonzero(mask)[0]
+            event_ids = [event_ids[i] for i in keep]
+            event_times = [event_times[i] for i in keep]
+            times_us, direction, group = times_us[keep], direction[keep], group[keep]
+
+        sessions = self._build_session_columns(times_us, direction, group)
+        groups, group_values = self._aggregate_groups(group, sessions)
+
+        excused = self._get_excused_matrix(employee_ids, employee_index, from_date, to_date, n_days)
+        base_seconds = np.array(
+            [employee.get_base_daily_seconds() for employee in employees_by_id.values()], dtype=np.int64
+        )
+
+        group_emp = groups // n_days
+        group_day = groups % n_days
+        group_excused = excused[group_emp, group_day]
+        group_expected = np.where(group_excused, 0, base_seconds[group_emp])
+        group_status = self._determine_statuses(group_values, group_expected, group_excused)
+
+        with transaction.atomic():
+            # Пересоздаём автоматические сессии только для обрабатываемых дней
+            employees_by_day = {}
+            for emp, day in zip(group_emp.tolist(), group_day.tolist()):
+                employees_by_day.setdefault(day, []).append(employee_ids[emp])
+            for day, day_employee_ids in employees_by_day.items():
+                WorkSession.objects.filter(
+                    employee_id__in=day_employee_ids,
+                    date=days[day],
+                    status__in=WorkTimeProcessor.AUTO_SESSION_STATUSES
+                ).delete()
+
+            new_sessions = []
+            session_links = []
+            SessionEvents = WorkSession.source_events.through
+
+            for start, end, session_group, duration in zip(
+                sessions['start'].tolist(), sessions['end'].tolist(),
+                sessions['group'].tolist(), sessions['duration'].tolist()
+            ):
+                is_closed = end >= 0
+                session = WorkSession(
+                    employee=employees_by_id[employee_ids[session_group // n_days]],
+                    date=days[session_group % n_days],
+                    start_time=event_times[start],
+                    end_time=event_times[end] if is_closed else None,
+                    status='auto' if is_closed else 'open',
+                    duration_seconds=duration,
+                    start_event_id=event_ids[start],
+                    end_event_id=event_ids[end] if is_closed else None,
+                    event_count=2 if is_closed else 1
+                )
+                new_sessions.append(session)
+                if self.processor.link_source_events:
+                    session_links.append(SessionEvents(worksession_id=session.id, skudevent_id=event_ids[start]))
+                    if is_closed:
+                        session_links.append(SessionEvents(worksession_id=session.id, skudevent_id=event_ids[end]))
+
+            WorkSession.objects.bulk_create(new_sessions, batch_size=1000)
+            if session_links:
+                SessionEvents.objects.bulk_create(session_links, batch_size=1000)
+
+            created, updated = self._save_summaries(
+                employees_by_id, employee_ids, days, groups, group_values, group_expected,
+                group_status, event_times, excused, base_seconds, excluded, create_empty_summaries
+            )
+
+            manual_sessions_count = self._rebuild_manual_days(employee_ids, days, manual_groups)
+
+        return {
+            'days': n_days,
+            'events': len(event_ids),
+            'sessions': len(new_sessions) + manual_sessions_count,
+            'summaries_created': created,
+            'summaries_updated': updated + len(manual_groups),
+            'skipped': len(skipped),
+        }
+
+    def _get_manual_groups(self, employee_ids, employee_index, from_date, to_date, n_days) -> Set[int]:
+        """Дни сотрудников, для которых есть ручные или закрытые вручную сессии"""
+        return {
+            employee_index[employee_id] * n_days + (day - from_date).days
+            for employee_id, day in WorkSession.objects.filter(
+                employee_id__in=employee_ids,
+                date__gte=from_date,
+                date__lte=to_date
+            ).exclude(
+                status__in=WorkTimeProcessor.AUTO_SESSION_STATUSES
+            ).values_list('employee_id', 'date').distinct()
+        }
+
+    def _rebuild_manual_days(self, employee_ids, days, manual_groups: Set[int]) -> int:
+        """Пересчёт дней с ручными сессиями через WorkTimeProcessor, возвращает число новых сессий"""
+        n_days = len(days)
+        employees_by_day = {}
+        for group_key in manual_groups:
+            employees_by_day.setdefault(group_key % n_days, []).append(employee_ids[group_key // n_days])
+
+        sessions_count = 0
+        for day_index, day_employee_ids in sorted(employees_by_day.items()):
+            result = self.processor.process_day_batch(
+                days[day_index], employees=Employee.objects.filter(id__in=day_employee_ids), refresh_empty=True
+            )
+            if result['errors']:
+                raise RuntimeError(f"Не удалось пересчитать дни с ручными сессиями за {days[day_index]}")
+            sessions_count += result['sessions']
+        return sessions_count
+
+    def _load_events(self, employee_ids, employee_index, from_date, to_date):
+        """Загрузка событий периода в массивы"""
+        start_datetime = timezone.make_aware(datetime.combine(from_date, time.min))
+        end_datetime = timezone.make_aware(datetime.combine(to_date, time.max))
+
+        # raw_data нужен только для событий без явного направления
+        rows = SKUDEvent.objects.filter(
+            employee_id__in=employee_ids,
+            event_time__gte=start_datetime,
+            event_time__lte=end_datetime
+        ).annotate(
+            direction_data=Case(
+                When(event_type__in=list(self.DIRECT_EVENT_TYPES), then=Value('')),
+                default=F('raw_data'),
+                output_field=TextField()
+            )
+        ).order_by('employee_id', 'event_time', 'id').values_list(
+            'id', 'employee_id', 'event_type', 'event_time', 'direction_data'
+        )
+
+        event_ids = []
+        event_times = []
+        emp_idx = []
+        times_us = []
+        direction = []
+
+        for event_id, employee_id, event_type, event_time, raw_data in rows.iterator(chunk_size=10000):
+            code = self.DIRECT_EVENT_TYPES.get(event_type.lower()) if event_type else None
+            if code is None:
+                code = ENTRY if self.processor._determine_direction(event_type, raw_data) == 'entry' else EXIT
+
+            event_ids.append(event_id)
+            event_times.append(event_time)
+            emp_idx.append(employee_index[employee_id])
+            times_us.append(self._to_microseconds(event_time))
+            direction.append(code)
+
+        return (
+            event_ids,
+            event_times,
+            np.array(emp_idx, dtype=np.int64),
+            np.array(times_us, dtype=np.int64),
+            np.array(direction, dtype=np.int8),
+        )
+
+    def _build_session_columns(self, times_us: np.ndarray, direction: np.ndarray,
+                               group: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Разбиение событий на сессии
+
+        Returns:
+            Dict с массивами: индекс события начала, индекс события конца (-1 для
+            открытых), группа (сотрудник * дни + день), длительность в секундах
+        """
+        n = len(group)
+        is_entry = direction == ENTRY
+
+        same_group_as_prev = np.zeros(n, dtype=bool)
+        same_group_as_prev[1:] = group[1:] == group[:-1]
+        prev_is_entry = np.zeros(n, dtype=bool)
+        prev_is_entry[1:] = is_entry[:-1]
+
+        # Закрытые сессии: выход сразу после входа того же дня, не короче минимума
+        exit_idx = np.nonzero((direction == EXIT) & same_group_as_prev & prev_is_entry)[0]
+        entry_idx = exit_idx - 1
+        closed_us = times_us[exit_idx] - times_us[entry_idx]
+        valid = closed_us >= WorkTimeProcessor.MIN_SESSION_DURATION_SECONDS * MICROSECONDS_IN_SECOND
+        exit_idx, entry_idx, closed_us = exit_idx[valid], entry_idx[valid], closed_us[valid]
+
+        # Открытые сессии: последний вход дня
+        is_last_in_group = np.ones(n, dtype=bool)
+        is_last_in_group[:-1] = group[:-1] != group[1:]
+        open_idx = np.nonzero(is_last_in_group & is_entry)[0]
+
+        # Для открытых сессий длительность считается до текущего времени, как в WorkSession.save();
+        # вход позже текущего времени (часы устройства спешат) даёт нулевую длительность
+        open_us = np.maximum(self._to_microseconds(timezone.now()) - times_us[open_idx], 0)
+
+        start = np.concatenate([entry_idx, open_idx])
+        end = np.concatenate([exit_idx, np.full(len(open_idx), -1, dtype=np.int64)])
+        duration_us = np.concatenate([closed_us, open_us])
+
+        order = np.argsort(start, kind='stable')
+        start, end, duration_us = start[order], end[order], duration_us[order]
+
+        return {
+            'start': start,
+            'end': end,
+            'group': group[start] if len(start) else np.empty(0, dtype=np.int64),
+            # int(timedelta.total_seconds()) - отбрасывание дробной части (длительности неотрицательны)
+            'duration': (duration_us // MICROSECONDS_IN_SECOND).astype(np.int64),
+        }
+
+    def _aggregate_groups(self, group: np.ndarray, sessions: Dict[str, np.ndarray]):
+        """Итоги по дням сотрудников (группам)"""
+        groups = np.unique(group)
+        n_groups = len(groups)
+        session_pos = np.searchsorted(groups, sessions['group'])
+        is_open = sessions['end'] < 0
+
+        total = np.zeros(n_groups, dtype=np.int64)
+        np.add.at(total, session_pos, sessions['duration'])
+
+        count = np.bincount(session_pos, minlength=n_groups)
+        open_count = np.bincount(session_pos[is_open], minlength=n_groups)
+
+        # Первый вход: минимальный индекс события начала (внутри группы события идут по времени)
+        first_start = np.full(n_groups, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(first_start, session_pos, sessions['start'])
+        first_start[count == 0] = -1
+
+        # Последний выход: максимальный индекс события выхода (события отсортированы по времени)
+        last_end = np.full(n_groups, -1, dtype=np.int64)
+        np.maximum.at(last_end, session_pos, sessions['end'])
+
+        # Последнее событие группы (группы идут подряд, но не по возрастанию ключа)
+        last_event = np.full(n_groups, -1, dtype=np.int64)
+        np.maximum.at(last_event, np.searchsorted(groups, group), np.arange(len(group)))
+
+        return groups, {
+            'total': total,
+            'count': count,
+            'has_open': open_count > 0,
+            'first_start': first_start,
+            'last_end': last_end,
+            'last_event': last_event,
+        }
+
+    def _determine_statuses(self, values: Dict[str, np.ndarray], expected: np.ndarray,
+                            excused: np.ndarray) -> np.ndarray:
+        """Статус дня, как WorkTimeProcessor._determine_day_status (дни с ручными сессиями сюда не попадают)"""
+        return np.select(
+            [
+                excused,
+                values['count'] == 0,
+                values['has_open'],
+                (expected > 0) & (values['total'] < expected * 0.5),
+            ],
+            ['excused', 'absent', 'problem', 'partial'],
+            default='present'
+        )
+
+    def _get_excused_matrix(self, employee_ids, employee_index, from_date, to_date, n_days) -> np.ndarray:
+        """Матрица (сотрудник, день): отпуск или командировка"""
+        excused = np.zeros((len(employee_ids), n_days), dtype=bool)
+
+        for employee_id, intervals in absence_calendar.get_intervals(employee_ids, from_date, to_date).items():
+            for start_date, end_date in intervals:
+                first = max((start_date - from_date).days, 0)
+                last = min((end_date - from_date).days, n_days - 1)
+                excused[employee_index[employee_id], first:last + 1] = True
+
+        return excused
+
+    def _get_existing_groups(self, employee_ids, employee_index, from_date, to_date, n_days) -> Set[int]:
+        """Дни сотрудников, для которых уже есть сессии или сводка"""
+        existing = set()
+        for model in (WorkSession, WorkDaySummary):
+            for employee_id, day in model.objects.filter(
+                employee_id__in=employee_ids,
+                date__gte=from_date,
+                date__lte=to_date
+            ).values_list('employee_id', 'date').distinct():
+                existing.add(employee_index[employee_id] * n_days + (day - from_date).days)
+        return existing
+
+    def _save_summaries(self, employees_by_id, employee_ids, days, groups, values, expected,
+                        statuses, event_times, excused, base_seconds, skipped,
+                        create_empty_summaries) -> Tuple[int, int]:
+        """Создание и обновление сводок дней"""
+        n_days = len(days)
+        existing = {
+            (summary.employee_id, summary.date): summary
+            for summary in WorkDaySummary.objects.filter(
+                employee_id__in=employee_ids, date__gte=days[0], date__lte=days[-1]
+            )
+        }
+
+        new_summaries = []
+        changed_summaries = []
+        now = timezone.now()
+
+        for position, group_key in enumerate(groups.tolist()):
+            employee_id = employee_ids[group_key // n_days]
+            day = days[group_key % n_days]
+            summary = existing.get((employee_id, day))
+            if summary is None:
+                summary = WorkDaySummary(employee=employees_by_id[employee_id], date=day)
+                new_summaries.append(summary)
+            else:
+                summary.updated_at = now
+                changed_summaries.append(summary)
+
+            first_start = values['first_start'][position]
+            last_end = values['last_end'][position]
+            summary.first_entry = event_times[first_start] if first_start >= 0 else None
+            summary.last_exit = event_times[last_end] if last_end >= 0 else None
+            summary.total_seconds_in_office = int(values['total'][position])
+            summary.expected_seconds = int(expected[position])
+            summary.sessions_count = int(values['count'][position])
+            summary.status = str(statuses[position])
+            summary.has_missing_exit = bool(values['has_open'][position])
+            summary.has_manual_corrections = False
+            summary.last_event_time = event_times[values['last_event'][position]]
+            summary.calculate_balance()
+            self.processor._fill_schedule_metrics(summary, employees_by_id[employee_id])
+
+        if create_empty_summaries:
+            processed = set(groups.tolist()) | skipped
+            for emp, employee_id in enumerate(employee_ids):
+                for day_index, day in enumerate(days):
+                    if emp * n_days + day_index in processed or (employee_id, day) in existing:
+                        continue
+                    expected_seconds = 0 if excused[emp, day_index] else int(base_seconds[emp])
+                    new_summaries.append(self.processor._build_empty_summary(
+                        employees_by_id[employee_id], day, expected_seconds
+                    ))
+
+        WorkDaySummary.objects.bulk_create(new_summaries, batch_size=1000)
+        WorkDaySummary.objects.bulk_update(
+            changed_summaries, WorkTimeProcessor.SUMMARY_FIELDS, batch_size=1000
+        )
+        # bulk_create/bulk_update не вызывают сигналы - сводки за месяц пересчитываем явно
+        refresh_month_summaries(
+            (summary.employee_id, summary.date) for summary in new_summaries + changed_summaries
+        )
+        transaction.on_commit(dashboard_snapshots.invalidate)
+        return len(new_summaries), len(changed_summaries)
+
+    @staticmethod
+    def _to_microseconds(value: datetime) -> int:
+        return (value - EPOCH) // MICROSECOND
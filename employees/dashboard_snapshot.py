@@ -0,0 +1,482 @@
+"""
+Снимки данных главной страницы (дашборда)
+
+Данные дашборда собираются целиком для области доступа пользователя
+(все сотрудники или доступные ему по ролям) и хранятся в Django cache.
+Загрузка страницы - чтение готового снимка:
+
+- снимок моложе FRESH_SECONDS и с текущей версией считается актуальным;
+- устаревший снимок показывается с отметкой времени сборки, а пересобирается
+  в фоне Celery задачей employees.tasks.refresh_dashboard_snapshots;
+- снимок старше MAX_STALE_SECONDS или за другой день собирается при запросе.
+
+Версия снимков меняется при поступлении событий СКУД и изменении сводок
+рабочих дней (invalidate()), после чего фоновая задача пересобирает снимки
+областей, к которым недавно обращались.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Least
+from django.utils import timezone
+
+from .birthdays import upcoming_birthdays
+from .cache_utils import is_shared_cache
+from .models import Employee, SKUDEvent, WorkSession
+from .permissions import PermissionChecker
+
+logger = logging.getLogger(__name__)
+
+# Настройки по умолчанию (переопределяются DASHBOARD_SNAPSHOT_SETTINGS)
+DEFAULT_SNAPSHOT_SETTINGS = {
+    'FRESH_SECONDS': 30,
+    'MAX_STALE_SECONDS': 300,
+    'SCOPE_TTL': 300,
+    'ACTIVE_SCOPE_SECONDS': 15 * 60,
+}
+
+# Область доступа "все активные сотрудники"
+ALL_SCOPE = 'all'
+
+# Минимальное количество ближайших дней рождения в снимке
+DASHBOARD_BIRTHDAYS_LIMIT = 20
+
+
+def rank_problematic_employees(employees, date_from, date_to, limit=None, rating_filter: Optional[Q] = None):
+    """
+    Рейтинг проблемности сотрудников за период одним запросом по сводкам дней
+
+    Опоздания и недобор времени считаются WorkTimeProcessor по графику
+    сотрудника. Рейтинг (0-10): опоздания * 3 + часы недобора / 4.
+
+    Args:
+        rating_filter: Условие на рейтинг (например, Q(rating__gt=3))
+    """
+    period = Q(work_day_summaries__date__range=[date_from, date_to])
+    ranking = employees.annotate(
+        late_count=Count('work_day_summaries', filter=period & Q(work_day_summaries__late_minutes__gt=0)),
+        missed_seconds=Coalesce(Sum('work_day_summaries__shortfall_seconds', filter=period), 0),
+    ).annotate(
+        rating=Least(
+            Value(10.0),
+            Cast(F('late_count'), FloatField()) * 3.0 + Cast(F('missed_seconds'), FloatField()) / (4 * 3600.0),
+        )
+    ).order_by('-rating', 'last_name', 'first_name')
+
+    if rating_filter is not None:
+        ranking = ranking.filter(rating_filter)
+    if limit is not None:
+        ranking = ranking[:limit]
+
+    problematic_employees = []
+    for employee in ranking:
+        # Определяем статус
+        if employee.rating <= 1:
+            status = 'Отлично'
+        elif employee.rating <= 3:
+            status = 'Хорошо'
+        elif employee.rating <= 6:
+            status = 'Удовлетворительно'
+        else:
+            status = 'Плохо'
+
+        problematic_employees.append({
+            'employee': employee,
+            'late_count': employee.late_count,
+            'missed_hours': round(employee.missed_seconds / 3600, 1),
+            'rating': round(employee.rating, 1),
+            'status': status
+        })
+
+    return problematic_employees
+
+
+def build_dashboard_payload(employees, today) -> Dict:
+    """
+    Сбор данных дашборда по сотрудникам области доступа
+
+    Args:
+        employees: QuerySet активных сотрудников области
+        today: Дата, за которую собираются данные
+
+    Returns:
+        Dict: Контекст шаблона dashboard.html (без параметров сортировки)
+    """
+    # Основные метрики
+    total_employees = employees.count()
+
+    # Сотрудники в отпуске сегодня
+    on_vacation = employees.filter(
+        vacations__start_date__lte=today,
+        vacations__end_date__gte=today,
+        vacations__status__in=['approved', 'taken']
+    ).distinct().count()
+
+    # Сотрудники в командировке сегодня
+    on_business_trip = employees.filter(
+        business_trips__start_date__lte=today,
+        business_trips__end_date__gte=today,
+        business_trips__status__in=['approved', 'in_progress']
+    ).distinct().count()
+
+    # Сотрудники по полу
+    gender_stats = employees.values('gender').annotate(count=Count('id')).order_by()
+    male_count = next((item['count'] for item in gender_stats if item['gender'] == 'M'), 0)
+    female_count = next((item['count'] for item in gender_stats if item['gender'] == 'F'), 0)
+
+    # Список сотрудников с временем прихода за сегодня (по первой сессии)
+    today_attendance = []
+    sessions_today = WorkSession.objects.filter(date=today, employee__in=employees)
+    present_employee_ids = set()
+
+    for session in sessions_today.select_related('employee', 'employee__department').order_by('start_time'):
+        if session.employee_id in present_employee_ids:
+            continue
+        present_employee_ids.add(session.employee_id)
+
+        arrival_time = timezone.localtime(session.start_time).time()
+        is_late = arrival_time > datetime.strptime('09:00', '%H:%M').time()
+
+        status = 'on_time' if not is_late else 'late'
+        if arrival_time.hour >= 12:  # Если пришел после 12, считаем не пришел
+            status = 'absent'
+
+        today_attendance.append({
+            'employee': session.employee,
+            'arrival_time': arrival_time,
+            'status': status,
+            'is_present': True
+        })
+
+    # Сотрудники, которые не пришли сегодня
+    absent_employees = employees.exclude(
+        id__in=sessions_today.values('employee_id')
+    ).select_related('department')
+
+    for emp in absent_employees:
+        today_attendance.append({
+            'employee': emp,
+            'arrival_time': None,
+            'status': 'absent',
+            'is_present': False
+        })
+
+    # События за сегодня всех сотрудников области одним запросом (новые первыми)
+    day_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+    events_by_employee = {}
+    for event in SKUDEvent.objects.filter(
+        employee__in=employees,
+        event_time__gte=day_start,
+        event_time__lt=day_start + timedelta(days=1)
+    ).select_related('device').only(
+        'employee_id', 'event_type', 'event_time', 'device__name'
+    ).order_by('-event_time', '-id'):
+        events_by_employee.setdefault(event.employee_id, []).append(event)
+
+    for attendance in today_attendance:
+        day_events = events_by_employee.get(attendance['employee'].id, [])
+
+        # Последнее событие за сегодня
+        if day_events:
+            last_event = day_events[0]
+            attendance['last_event'] = {
+                'time': timezone.localtime(last_event.event_time).strftime('%H:%M'),
+                'type': last_event.event_type,
+                'type_display': 'Вход' if last_event.event_type == 'entry' else 'Выход'
+            }
+            # Определяем статус: если последнее событие "вход" - на работе, если "выход" - не на работе
+            attendance['work_status'] = 'На работе' if last_event.event_type == 'entry' else 'Не на работе'
+        else:
+            attendance['last_event'] = None
+            attendance['work_status'] = 'Отсутствует'
+
+        # Все события за день для детального просмотра
+        attendance['day_events'] = [
+            {
+                'time': timezone.localtime(event.event_time).strftime('%H:%M'),
+                'type': event.event_type,
+                'type_display': 'Вход' if event.event_type == 'entry' else 'Выход',
+                'device': event.device.name if event.device else 'Неизвестно'
+            } for event in day_events
+        ]
+
+    # Ближайшие дни рождения: все на неделю вперёд (фильтры виджета "Сегодня",
+    # "Завтра", "Неделя"), но не меньше DASHBOARD_BIRTHDAYS_LIMIT для фильтра "Все"
+    birthday_employees = employees.only(
+        'id', 'last_name', 'first_name', 'middle_name', 'photo', 'birth_date', 'birth_month_day'
+    )
+    all_birthdays = upcoming_birthdays(birthday_employees, today, days=7)
+    if len(all_birthdays) < DASHBOARD_BIRTHDAYS_LIMIT:
+        all_birthdays = upcoming_birthdays(birthday_employees, today, limit=DASHBOARD_BIRTHDAYS_LIMIT)
+
+    # Проблемные сотрудники за последние 30 дней (топ 10 по рейтингу)
+    problematic_employees = rank_problematic_employees(
+        employees.select_related('department'), today - timedelta(days=30), today, limit=10
+    )
+
+    # Bar chart - проблемные сотрудники
+    problematic_chart = {
+        'labels': [emp['employee'].full_name for emp in problematic_employees],
+        'data': [emp['rating'] for emp in problematic_employees]
+    }
+
+    # Данные для JavaScript
+    attendance_data_for_js = [
+        {
+            'employee': {
+                'id': str(att['employee'].id),
+                'full_name': att['employee'].full_name,
+                'department_id': str(att['employee'].department_id) if att['employee'].department_id else None
+            },
+            'day_events': att['day_events']
+        }
+        for att in today_attendance
+    ]
+
+    return {
+        'total_employees': total_employees,
+        'active_employees': total_employees,
+        'on_vacation': on_vacation,
+        'on_business_trip': on_business_trip,
+        'on_sick_leave': 0,  # TODO: добавить модель больничных
+        'male_count': male_count,
+        'female_count': female_count,
+        'today_attendance': today_attendance,
+        'birthdays': all_birthdays,
+        'today': today,
+
+        # Аналитические данные
+        'problematic_employees': problematic_employees,
+        'problematic_chart': json.dumps(problematic_chart),
+
+        # Данные для JavaScript
+        'today_attendance_json': json.dumps(attendance_data_for_js),
+        'birthdays_json': json.dumps([{
+            'employee': {
+                'full_name': b['employee'].full_name,
+                'photo': b['employee'].photo.url if b['employee'].photo else None
+            },
+            'birthday_date': b['birthday_date'].strftime('%Y-%m-%d'),
+            'days_until': b['days_until'],
+            'is_today': b['is_today']
+        } for b in all_birthdays], ensure_ascii=False),
+
+        # Данные для фильтров
+        'departments': list(
+            employees.filter(department__isnull=False)
+            .values_list('department__id', 'department__name').distinct().order_by('department__name')
+        ),
+    }
+
+
+class DashboardSnapshotService:
+    """Снимки дашборда по областям доступа в Django cache"""
+
+    VERSION_KEY = 'dashboard_snapshot_version'
+    SCOPES_KEY = 'dashboard_snapshot_scopes'
+
+    def __init__(self):
+        self.logger = logger
+
+    @property
+    def settings(self) -> Dict:
+        return {**DEFAULT_SNAPSHOT_SETTINGS, **getattr(settings, 'DASHBOARD_SNAPSHOT_SETTINGS', {})}
+
+    # ------------------------------------------------------------------
+    # Области доступа
+    # ------------------------------------------------------------------
+
+    def get_scope(self, user) -> str:
+        """Область доступа пользователя (кэшируется на SCOPE_TTL секунд)"""
+        if user.is_superuser:
+            return ALL_SCOPE
+
+        scope_key = f'dashboard_scope_user_{user.pk}'
+        scope = cache.get(scope_key)
+        if scope is None:
+            scope, _ = self._store_scope(user)
+            cache.set(scope_key, scope, self.settings['SCOPE_TTL'])
+        return scope
+
+    def get_scope_employees(self, scope: str, user=None):
+        """
+        Активные сотрудники области доступа
+
+        Состав области хранится в cache и может быть вытеснен: тогда он
+        вычисляется заново по правам пользователя.
+
+        Args:
+            user: Пользователь области (без него состав вытесненной области неизвестен)
+
+        Returns:
+            QuerySet сотрудников или None, если состав области неизвестен
+        """
+        employees = Employee.objects.filter(is_active=True)
+        if scope == ALL_SCOPE:
+            return employees
+
+        employee_ids = cache.get(self._scope_ids_key(scope))
+        if employee_ids is None:
+            if user is None:
+                return None
+            self.logger.info(f"Состав области дашборда '{scope}' вытеснен из cache, вычисляется заново")
+            _, employee_ids = self._store_scope(user)
+        return employees.filter(id__in=employee_ids)
+
+    # ------------------------------------------------------------------
+    # Снимки
+    # ------------------------------------------------------------------
+
+    def get(self, user) -> Dict:
+        """
+        Снимок дашборда для пользователя
+
+        Returns:
+            Dict: Данные дашборда, 'snapshot_built_at' - время сборки,
+            'snapshot_is_stale' - снимок ожидает фоновой пересборки
+        """
+        scope = self.get_scope(user)
+        self._touch_scope(scope)
+
+        snapshot = cache.get(self._snapshot_key(scope))
+        version = self._current_version()
+        now = timezone.now()
+
+        if (snapshot is None or snapshot['today'] != timezone.localdate()
+                or (now - snapshot['built_at']).total_seconds() > self.settings['MAX_STALE_SECONDS']):
+            snapshot = self.build(scope, version, user=user)
+
+        payload = dict(snapshot['payload'])
+        payload['snapshot_built_at'] = snapshot['built_at']
+        payload['snapshot_is_stale'] = not self._is_fresh(snapshot, version, now)
+        return payload
+
+    def build(self, scope: str, version: Optional[str] = None, user=None) -> Optional[Dict]:
+        """
+        Сборка и сохранение снимка области
+
+        Returns:
+            Optional[Dict]: Снимок или None, если состав области неизвестен
+            (вытеснен из cache, а пользователь не передан)
+        """
+        if version is None:
+            version = self._current_version()
+
+        employees = self.get_scope_employees(scope, user)
+        if employees is None:
+            self.logger.info(f"Снимок дашборда '{scope}' не собран: состав области вытеснен из cache")
+            return None
+
+        started = time.monotonic()
+        today = timezone.localdate()
+        snapshot = {
+            'version': version,
+            'built_at': timezone.now(),
+            'today': today,
+            'payload': build_dashboard_payload(employees, today),
+        }
+        cache.set(self._snapshot_key(scope), snapshot, None)
+
+        self.logger.info(f"Снимок дашборда '{scope}' собран за {time.monotonic() - started:.2f} с")
+        return snapshot
+
+    def refresh_stale(self) -> int:
+        """
+        Пересборка устаревших снимков областей, к которым недавно обращались
+
+        Имеет смысл только с общим для процессов cache (Redis, см. CACHES
+        в settings.py): с кэшем в памяти процесса воркер Celery пересобирал бы
+        снимки, которые веб-процессы не видят, поэтому пересборка пропускается.
+
+        Returns:
+            int: Количество пересобранных снимков
+        """
+        if not is_shared_cache():
+            self.logger.warning(
+                "Фоновая пересборка снимков дашборда пропущена: cache не общий для процессов (настройте CACHES)"
+            )
+            return 0
+
+        scopes = cache.get(self.SCOPES_KEY) or {}
+        active_since = time.time() - self.settings['ACTIVE_SCOPE_SECONDS']
+        version = self._current_version()
+        now = timezone.now()
+
+        refreshed = 0
+        for scope, accessed_at in scopes.items():
+            if accessed_at < active_since:
+                continue
+            snapshot = cache.get(self._snapshot_key(scope))
+            if snapshot is None or not self._is_fresh(snapshot, version, now):
+                # Области с вытесненным составом соберутся при следующем запросе пользователя
+                if self.build(scope, version) is not None:
+                    refreshed += 1
+        return refreshed
+
+    def invalidate(self) -> None:
+        """Новые события или сводки: снимки всех областей устарели"""
+        cache.set(self.VERSION_KEY, uuid.uuid4().hex, None)
+
+    # ------------------------------------------------------------------
+    # Вспомогательные методы
+    # ------------------------------------------------------------------
+
+    def _store_scope(self, user):
+        """Вычисление области доступа пользователя и сохранение её состава в cache"""
+        employee_ids = sorted(
+            str(pk) for pk in PermissionChecker.get_accessible_employees(user).values_list('id', flat=True)
+        )
+        if len(employee_ids) == Employee.objects.filter(is_active=True).count():
+            return ALL_SCOPE, employee_ids
+
+        scope = 'ids_' + hashlib.sha1(','.join(employee_ids).encode()).hexdigest()[:16]
+        cache.set(self._scope_ids_key(scope), employee_ids, None)
+        return scope, employee_ids
+
+    def _is_fresh(self, snapshot: Dict, version: str, now) -> bool:
+        return (
+            snapshot['version'] == version
+            and snapshot['today'] == timezone.localdate()
+            and (now - snapshot['built_at']).total_seconds() <= self.settings['FRESH_SECONDS']
+        )
+
+    def _current_version(self) -> str:
+        version = cache.get(self.VERSION_KEY)
+        if version is None:
+            cache.add(self.VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(self.VERSION_KEY)
+        return version
+
+    def _touch_scope(self, scope: str) -> None:
+        """Отметка обращения к области (для фоновой пересборки)"""
+        scopes = cache.get(self.SCOPES_KEY) or {}
+        now = time.time()
+        # Отметку обновляем не чаще раза в минуту, чтобы не писать в cache при каждом запросе
+        if now - scopes.get(scope, 0) < 60:
+            return
+
+        active_since = now - self.settings['ACTIVE_SCOPE_SECONDS']
+        scopes = {key: value for key, value in scopes.items() if value >= active_since}
+        scopes[scope] = now
+        cache.set(self.SCOPES_KEY, scopes, None)
+
+    @staticmethod
+    def _snapshot_key(scope: str) -> str:
+        return f'dashboard_snapshot_{scope}'
+
+    @staticmethod
+    def _scope_ids_key(scope: str) -> str:
+        return f'dashboard_scope_ids_{scope}'
+
+
+# Глобальный экземпляр сервиса
+dashboard_snapshots = DashboardSnapshotService()
@@ -0,0 +1,91 @@
+"""
+Реестр СКУД устройств в памяти процесса
+
+Устройства меняются редко, поэтому при приеме событий устройство ищется
+по IP в локальном словаре, а не запросом к БД. Реестр сбрасывается
+сигналами сохранения/удаления SKUDDevice (см. signals.py). Устройство,
+которого нет в реестре (добавлено в другом процессе после загрузки реестра),
+ищется в БД, неизвестные IP запоминаются на NEGATIVE_TTL секунд.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from .cache_utils import VersionedLocalCache
+from .models import SKUDDevice
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceRegistry:
+    """Реестр устройств: IP адрес -> SKUDDevice"""
+    
+    # Как часто (в секундах) процесс сверяет версию реестра с Django cache
+    CHECK_INTERVAL = 5
+    
+    # Время жизни записи о неизвестном IP адресе (в секундах)
+    NEGATIVE_TTL = 10
+    
+    # Размер негативного кэша, после которого удаляются устаревшие записи
+    NEGATIVE_CACHE_MAX_SIZE = 1000
+    
+    def __init__(self):
+        self.logger = logger
+        self._cache = VersionedLocalCache(
+            'skud_device_registry', self._load_devices, self.CHECK_INTERVAL
+        )
+        self._negative = {}
+        self._negative_version = None
+        self._lock = threading.Lock()
+    
+    def _load_devices(self) -> Dict[str, SKUDDevice]:
+        """Загрузка всех устройств одним запросом"""
+        devices = {device.ip_address: device for device in SKUDDevice.objects.all()}
+        self.logger.info(f"Реестр устройств СКУД загружен: {len(devices)} устройств")
+        return devices
+    
+    def get_by_ip(self, ip_address: str) -> Optional[SKUDDevice]:
+        """
+        Поиск устройства по IP адресу
+        
+        Возвращаемый объект общий для всех запросов процесса, его нельзя изменять.
+        """
+        devices = self._cache.get()
+        device = devices.get(ip_address)
+        if device is not None:
+            return device
+        
+        now = time.monotonic()
+        with self._lock:
+            if self._negative_version != self._cache.version:
+                self._negative.clear()
+                self._negative_version = self._cache.version
+            if self._negative.get(ip_address, 0) > now:
+                return None
+        
+        device = SKUDDevice.objects.filter(ip_address=ip_address).first()
+        
+        with self._lock:
+            if device is not None:
+                devices[ip_address] = device
+                self._negative.pop(ip_address, None)
+            else:
+                self._negative[ip_address] = now + self.NEGATIVE_TTL
+                if len(self._negative) > self.NEGATIVE_CACHE_MAX_SIZE:
+                    self._negative = {
+                        key: expires_at for key, expires_at in self._negative.items() if expires_at > now
+                    }
+        
+        return device
+    
+    def invalidate(self) -> None:
+        """Сброс реестра во всех процессах"""
+        self._cache.invalidate()
+        with self._lock:
+            self._negative.clear()
+
+
+# Глобальный экземпляр реестра
+device_registry = DeviceRegistry()
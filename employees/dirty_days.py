@@ -0,0 +1,159 @@
+"""
+Учёт дней сотрудников, требующих пересчёта
+
+День (сотрудник, дата) отмечается при приеме события СКУД, которое нельзя
+применить к концу дня (см. WorkTimeProcessor.process_new_events), ручной
+корректировке сессии, изменении отпуска/командировки или ставки сотрудника.
+Воркер (Celery задача employees.tasks.drain_dirty_work_days или команда
+drain_dirty_days) пересчитывает только отмеченные дни пакетами, поэтому
+стоимость пересчёта зависит от объёма изменений, а не от объёма истории.
+"""
+
+import logging
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .absence_calendar import absence_calendar
+from .models import Employee, WorkDayDirtyMark
+
+logger = logging.getLogger(__name__)
+
+# Размер пакета по умолчанию
+DEFAULT_BATCH_SIZE = 1000
+
+# Попыток пересчёта до перевода отметки в ошибочные
+MAX_ATTEMPTS = 5
+
+
+def mark_days_dirty(days: Iterable[Tuple], reason: str) -> None:
+    """
+    Отметка дней для пересчёта
+
+    Args:
+        days: Пары (id сотрудника, дата)
+        reason: Причина (WorkDayDirtyMark.REASON_CHOICES)
+    """
+    today = timezone.localdate()
+
+    # Будущие дни не пересчитываются: сводки создаются по факту
+    marks = [
+        WorkDayDirtyMark(employee_id=employee_id, date=day, reason=reason)
+        for employee_id, day in set(days)
+        if employee_id is not None and day <= today
+    ]
+    if not marks:
+        return
+
+    # Уже отмеченный день остаётся с первой причиной
+    WorkDayDirtyMark.objects.bulk_create(marks, ignore_conflicts=True)
+
+    # Новое изменение дня даёт ошибочной отметке ещё MAX_ATTEMPTS попыток
+    dates_by_employee = {}
+    for mark in marks:
+        dates_by_employee.setdefault(mark.employee_id, []).append(mark.date)
+    failed = Q()
+    for employee_id, dates in dates_by_employee.items():
+        failed |= Q(employee_id=employee_id, date__in=dates)
+    WorkDayDirtyMark.objects.filter(failed, is_failed=True).update(is_failed=False, attempts=0)
+
+
+def mark_range_dirty(employee_id, start_date: date, end_date: date, reason: str) -> None:
+    """Отметка всех дней периода (по сегодняшний день включительно)"""
+    end_date = min(end_date, timezone.localdate())
+    mark_days_dirty(
+        ((employee_id, start_date + timedelta(days=n)) for n in range((end_date - start_date).days + 1)),
+        reason
+    )
+
+
+def drain_dirty_days(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Пересчёт одного пакета отмеченных дней
+
+    Отметки удаляются в той же транзакции, что и пересчёт: если день
+    отмечен повторно во время пересчёта, новая отметка попадёт в следующий пакет.
+    Если день сотрудника не удалось пересчитать, у отметки увеличивается
+    счётчик попыток, и она уходит в конец очереди; после MAX_ATTEMPTS попыток
+    отметка считается ошибочной и больше не выбирается.
+
+    Returns:
+        Dict: {'processed': пересчитано дней, 'failed': с ошибкой}
+    """
+    from .work_time_processor import WorkTimeProcessor
+
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    processor = WorkTimeProcessor()
+    # Отметки дней отпуска фиксируются вместе с отпуском: календарь должен их учитывать
+    absence_calendar.sync(force=True)
+    processed_ids = []
+    failed_marks = []
+
+    with transaction.atomic():
+        # skip_locked позволяет нескольким воркерам разбирать отметки параллельно
+        marks = list(
+            WorkDayDirtyMark.objects.select_for_update(skip_locked=True)
+            .filter(is_failed=False)
+            .order_by('attempts', 'date', 'id')[:batch_size]
+        )
+
+        by_date = OrderedDict()
+        for mark in marks:
+            by_date.setdefault(mark.date, []).append(mark)
+
+        for day, day_marks in by_date.items():
+            employee_ids = [mark.employee_id for mark in day_marks]
+            try:
+                # Ошибка отдельного сотрудника не откатывает день остальных (см. process_day_batch)
+                with transaction.atomic():
+                    result = processor.process_day_batch(
+                        day, employees=Employee.objects.filter(id__in=employee_ids), refresh_empty=True
+                    )
+                errors = result['failed_employees']
+            except Exception as e:
+                logger.error(f"Ошибка пересчёта отмеченных дней за {day}: {e}")
+                errors = {employee_id: str(e) for employee_id in employee_ids}
+
+            for mark in day_marks:
+                if mark.employee_id in errors:
+                    mark.attempts += 1
+                    mark.last_error = errors[mark.employee_id]
+                    mark.is_failed = mark.attempts >= MAX_ATTEMPTS
+                    failed_marks.append(mark)
+                else:
+                    processed_ids.append(mark.id)
+
+        if failed_marks:
+            WorkDayDirtyMark.objects.bulk_update(failed_marks, ['attempts', 'last_error', 'is_failed'])
+        WorkDayDirtyMark.objects.filter(id__in=processed_ids).delete()
+
+    return {'processed': len(processed_ids), 'failed': len(failed_marks)}
+
+
+def drain_all_dirty_days(batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Пересчёт отмеченных дней, пока есть дни, которые удаётся пересчитать"""
+    totals = {'processed': 0, 'failed': 0, 'batches': 0}
+
+    while max_batches is None or totals['batches'] < max_batches:
+        result = drain_dirty_days(batch_size)
+        if not result['processed'] and not result['failed']:
+            break
+
+        totals['processed'] += result['processed']
+        totals['failed'] += result['failed']
+        totals['batches'] += 1
+
+        # Пакет целиком из ошибок - повторим при следующем запуске
+        if not result['processed']:
+            break
+
+    return totals
+
+
+def pending_dirty_days() -> int:
+    """Количество дней, ожидающих пересчёта"""
+    return WorkDayDirtyMark.objects.filter(is_failed=False).count()
@@ -3,7 +3,7 @@
 """
 
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
@@ -12,6 +12,7 @@ from django.utils import timezone
 from django.core.paginator import Paginator
 from datetime import datetime, timedelta, date
 from django.db.models import Q, Count
+from asgiref.sync import sync_to_async
 import json
 import logging
 
@@ -19,8 +20,16 @@ import logging
 logger = logging.getLogger(__name__)
 
 from .models import SKUDDevice, SKUDEvent, Employee, WorkDaySummary, WorkSession, Organization, Department, Division
+from .analytics_queries import departments_chart, problematic_employees_chart, top_employees_chart
+from .attendance_queries import (
+    STATUS_LABELS, attendance_counts, attendance_employees, attendance_queryset, daily_row, monthly_row,
+    parse_attendance_period
+)
+from .dashboard_snapshot import ALL_SCOPE, dashboard_snapshots
+from .live_events import get_event_broker, get_live_events_settings, live_events_available
 from .skud_device_communication import SKUDDeviceCommunicator, SKUDEventProcessor
 from .reports import WorkTimeReportGenerator
+from .tabular_export import StreamingXlsxWriter
 from .decorators import (
     require_login, can_view_employee, can_edit_employee, can_manage_skud_devices,
     can_view_reports, can_export_data, can_approve_vacation, can_manage_roles,
@@ -44,334 +53,26 @@ def admin_test_pinfl_api(request):
 
 @require_login
 def dashboard(request):
-    """Главная страница с обзором системы"""
-    from django.db.models import Count, Q, Sum, Avg
-    from datetime import datetime, timedelta
-    
-    today = timezone.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    # Основные метрики
-    total_employees = Employee.objects.filter(is_active=True).count()
-    active_employees = Employee.objects.filter(is_active=True).count()  # Все активные сотрудники
-    
-    # Сотрудники в отпуске сегодня
-    on_vacation = Employee.objects.filter(
-        is_active=True,
-        vacations__start_date__lte=today,
-        vacations__end_date__gte=today,
-        vacations__status__in=['approved', 'taken']
-    ).distinct().count()
-    
-    # Сотрудники в командировке сегодня
-    on_business_trip = Employee.objects.filter(
-        is_active=True,
-        business_trips__start_date__lte=today,
-        business_trips__end_date__gte=today,
-        business_trips__status__in=['approved', 'in_progress']
-    ).distinct().count()
+    """Главная страница с обзором системы (данные из снимка дашборда)"""
+    context = dashboard_snapshots.get(request.user)
     
-    # Сотрудники на больничном сегодня (пока заглушка, так как нет модели больничных)
-    on_sick_leave = 0  # TODO: добавить модель больничных
-    
-    # Сотрудники по полу
-    gender_stats = Employee.objects.filter(is_active=True).values('gender').annotate(count=Count('id'))
-    male_count = next((item['count'] for item in gender_stats if item['gender'] == 'M'), 0)
-    female_count = next((item['count'] for item in gender_stats if item['gender'] == 'F'), 0)
-    
-    # Получаем параметры фильтрации
+    # Получаем параметры сортировки
     sort_by = request.GET.get('sort', 'time')  # time, name, status
     sort_order = request.GET.get('order', 'asc')  # asc, desc
     
-    # Список сотрудников с временем прихода за сегодня
-    today_attendance = []
-    work_sessions_today = WorkSession.objects.filter(
-        date=today,
-        employee__is_active=True
-    ).select_related('employee').order_by('start_time')
-    
-    for session in work_sessions_today:
-        arrival_time = session.start_time.time()
-        is_late = arrival_time > datetime.strptime('09:00', '%H:%M').time()
-        
-        status = 'on_time' if not is_late else 'late'
-        if arrival_time.hour >= 12:  # Если пришел после 12, считаем не пришел
-            status = 'absent'
-        
-        today_attendance.append({
-            'employee': session.employee,
-            'arrival_time': arrival_time,
-            'status': status,
-            'is_present': True
-        })
-    
-    # Сотрудники, которые не пришли сегодня
-    present_employee_ids = [att['employee'].id for att in today_attendance]
-    absent_employees = Employee.objects.filter(
-        is_active=True
-    ).exclude(id__in=present_employee_ids)
-    
-    for emp in absent_employees:
-        today_attendance.append({
-            'employee': emp,
-            'arrival_time': None,
-            'status': 'absent',
-            'is_present': False
-        })
-    
-    # Получаем последние события турникета для каждого сотрудника
-    for attendance in today_attendance:
-        employee = attendance['employee']
-        
-        # Получаем последнее событие за сегодня
-        last_event = SKUDEvent.objects.filter(
-            employee=employee,
-            event_time__date=today
-        ).order_by('-event_time').first()
-        
-        if last_event:
-            attendance['last_event'] = {
-                'time': last_event.event_time.time().strftime('%H:%M'),  # Конвертируем время в строку
-                'type': last_event.event_type,
-                'type_display': 'Вход' if last_event.event_type == 'entry' else 'Выход'
-            }
-            # Определяем статус: если последнее событие "вход" - на работе, если "выход" - не на работе
-            attendance['work_status'] = 'На работе' if last_event.event_type == 'entry' else 'Не на работе'
-        else:
-            attendance['last_event'] = None
-            attendance['work_status'] = 'Отсутствует'
-        
-        # Получаем все события за день для детального просмотра
-        day_events = SKUDEvent.objects.filter(
-            employee=employee,
-            event_time__date=today
-        ).order_by('-event_time')
-        
-        attendance['day_events'] = [
-            {
-                'time': event.event_time.time().strftime('%H:%M'),  # Конвертируем время в строку
-                'type': event.event_type,
-                'type_display': 'Вход' if event.event_type == 'entry' else 'Выход',
-                'device': event.device.name if event.device else 'Неизвестно'
-            } for event in day_events
-        ]
-    
-    # Сортируем по выбранному параметру
+    today_attendance = context['today_attendance']
     if sort_by == 'name':
         today_attendance.sort(key=lambda x: x['employee'].full_name, reverse=(sort_order == 'desc'))
-    elif sort_by == 'status':
-        # Сортировка по статусу работы (На работе/Не на работе/Отсутствует)
-        status_order = {'На работе': 0, 'Не на работе': 1, 'Отсутствует': 2}
-        today_attendance.sort(key=lambda x: status_order.get(x['work_status'], 3), reverse=(sort_order == 'desc'))
-    elif sort_by == 'work_status':
+    elif sort_by in ('status', 'work_status'):
         # Сортировка по статусу работы (На работе/Не на работе/Отсутствует)
         status_order = {'На работе': 0, 'Не на работе': 1, 'Отсутствует': 2}
         today_attendance.sort(key=lambda x: status_order.get(x['work_status'], 3), reverse=(sort_order == 'desc'))
     else:  # sort_by == 'time'
         today_attendance.sort(key=lambda x: x['arrival_time'] or datetime.max.time(), reverse=(sort_order == 'desc'))
     
-    # Все именинники (сегодня и все остальные)
-    all_birthdays = []
-    
-    # Получаем всех активных сотрудников
-    all_employees = Employee.objects.filter(is_active=True).select_related('department', 'division')
-    
-    print(f"=== ОТЛАДКА ДНЕЙ РОЖДЕНИЯ ===")
-    print(f"Всего активных сотрудников: {all_employees.count()}")
-    
-    for emp in all_employees:
-        print(f"Сотрудник: {emp.full_name}, Дата рождения: {emp.birth_date}")
-        
-        if not emp.birth_date:
-            print(f"  - Нет даты рождения, пропускаем")
-            continue
-            
-        this_year_birthday = emp.birth_date.replace(year=today.year)
-        
-        # Если день рождения уже прошел в этом году, берем следующий год
-        if this_year_birthday < today:
-            next_year_birthday = emp.birth_date.replace(year=today.year + 1)
-            days_until = (next_year_birthday - today).days
-            birthday_date = next_year_birthday
-            is_today = False
-        else:
-            days_until = (this_year_birthday - today).days
-            birthday_date = this_year_birthday
-            is_today = (days_until == 0)
-        
-        print(f"  - День рождения в этом году: {this_year_birthday}")
-        print(f"  - Дней до дня рождения: {days_until}")
-        print(f"  - Сегодня: {is_today}")
-        
-        all_birthdays.append({
-            'employee': emp,
-            'days_until': days_until,
-            'birthday_date': birthday_date,
-            'is_today': is_today
-        })
-    
-    # Сортируем по количеству дней до дня рождения
-    all_birthdays.sort(key=lambda x: x['days_until'])
-    
-    print(f"Итого дней рождения найдено: {len(all_birthdays)}")
-    for b in all_birthdays:
-        print(f"  - {b['employee'].full_name}: {b['birthday_date']} (через {b['days_until']} дней, сегодня: {b['is_today']})")
-    
-    # =============================================================================
-    # АНАЛИТИЧЕСКИЕ ДАННЫЕ
-    # =============================================================================
-    
-    
-    
-    
-    # Проблемные сотрудники
-    problematic_employees = []
-    all_employees = Employee.objects.filter(is_active=True)
-    
-    for employee in all_employees:
-        # Считаем опоздания за последние 30 дней
-        late_count = 0
-        missed_hours = 0
-        
-        # Получаем события за последние 30 дней
-        thirty_days_ago = today - timedelta(days=30)
-        events = SKUDEvent.objects.filter(
-            employee=employee,
-            event_time__date__gte=thirty_days_ago
-        ).order_by('event_time')
-        
-        # Анализируем события по дням
-        current_date = None
-        first_entry = None
-        last_exit = None
-        
-        for event in events:
-            event_date = event.event_time.date()
-            
-            if current_date != event_date:
-                # Новый день - анализируем предыдущий
-                if current_date and first_entry:
-                    # Проверяем опоздание (после 9:00)
-                    if first_entry.time() > datetime.strptime('09:00', '%H:%M').time():
-                        late_count += 1
-                    
-                    # Считаем пропущенные часы (если нет выхода)
-                    if not last_exit:
-                        missed_hours += 8  # Полный рабочий день
-                    else:
-                        # Считаем недобор часов
-                        work_duration = last_exit - first_entry
-                        if work_duration.total_seconds() / 3600 < 8:
-                            missed_hours += 8 - (work_duration.total_seconds() / 3600)
-                
-                # Начинаем новый день
-                current_date = event_date
-                first_entry = None
-                last_exit = None
-            
-            # Записываем первое вхождение и последний выход
-            if event.event_type == 'entry' and not first_entry:
-                first_entry = event.event_time
-            elif event.event_type == 'exit':
-                last_exit = event.event_time
-        
-        # Анализируем последний день
-        if current_date and first_entry:
-            if first_entry.time() > datetime.strptime('09:00', '%H:%M').time():
-                late_count += 1
-            if not last_exit:
-                missed_hours += 8
-        
-        # Рассчитываем рейтинг проблемности (0-10)
-        # Более строгая система: опоздания * 3 + пропущенные часы / 4
-        rating = min(10, (late_count * 3) + (missed_hours / 4))
-        
-        # Определяем статус
-        if rating <= 1:
-            status = 'Отлично'
-        elif rating <= 3:
-            status = 'Хорошо'
-        elif rating <= 6:
-            status = 'Удовлетворительно'
-        else:
-            status = 'Плохо'
-        
-        problematic_employees.append({
-            'employee': employee,
-            'late_count': late_count,
-            'missed_hours': round(missed_hours, 1),
-            'rating': round(rating, 1),
-            'status': status
-        })
-    
-    # Сортируем по рейтингу проблемности (по убыванию)
-    problematic_employees.sort(key=lambda x: x['rating'], reverse=True)
-    
-    # Данные для графиков
-    import json
-    
-    # Bar chart - проблемные сотрудники
-    problematic_chart = {
-        'labels': [emp['employee'].full_name for emp in problematic_employees[:10]],
-        'data': [emp['rating'] for emp in problematic_employees[:10]]
-    }
-    
-    # Подготавливаем данные для JavaScript
-    attendance_data_for_js = []
-    for att in today_attendance:
-        attendance_data_for_js.append({
-            'employee': {
-                'id': str(att['employee'].id),  # Конвертируем UUID в строку
-                'full_name': att['employee'].full_name,
-                'department_id': str(att['employee'].department.id) if att['employee'].department else None
-            },
-            'day_events': att['day_events']
-        })
-    
-    context = {
-        'total_employees': total_employees,
-        'active_employees': active_employees,
-        'on_vacation': on_vacation,
-        'on_business_trip': on_business_trip,
-        'on_sick_leave': on_sick_leave,
-        'male_count': male_count,
-        'female_count': female_count,
-        'today_attendance': today_attendance,
-        'birthdays': all_birthdays,
-        'today': today,
-        'sort_by': sort_by,
-        'sort_order': sort_order,
-        
-        # Аналитические данные
-        'problematic_employees': problematic_employees[:10],  # Топ 10 проблемных
-        
-        # Данные для графиков (JSON сериализованные)
-        'problematic_chart': json.dumps(problematic_chart),
-        
-        # Данные для HTML шаблона
-        'today_attendance': today_attendance,
-        
-        # Данные для JavaScript
-        'today_attendance_json': json.dumps(attendance_data_for_js),
-        
-        # Подготавливаем данные о днях рождения для JavaScript
-        'birthdays_json': json.dumps([{
-            'employee': {
-                'full_name': b['employee'].full_name,
-                'photo': b['employee'].photo.url if b['employee'].photo else None
-            },
-            'birthday_date': b['birthday_date'].strftime('%Y-%m-%d'),
-            'days_until': b['days_until'],
-            'is_today': b['is_today']
-        } for b in all_birthdays], ensure_ascii=False),
-        
-        # Данные для фильтров
-        'departments': Employee.objects.filter(
-            is_active=True,
-            department__isnull=False
-        ).values_list('department__id', 'department__name').distinct().order_by('department__name'),
-    }
+    context['sort_by'] = sort_by
+    context['sort_order'] = sort_order
+    context['live_events_enabled'] = live_events_available(request)
     
     return render(request, 'employees/dashboard.html', context)
 
@@ -379,11 +80,6 @@ def dashboard(request):
 @require_login
 def analytics_data(request):
     """AJAX endpoint для получения данных аналитики с фильтрами"""
-    from django.http import JsonResponse
-    from django.db.models import Count, Q, Sum, Avg
-    from datetime import datetime, timedelta
-    import json
-    
     # Получаем параметры фильтрации
     chart_type = request.GET.get('chart_type')
     period = int(request.GET.get('period', 7))
@@ -392,147 +88,22 @@ def analytics_data(request):
     metric = request.GET.get('metric', 'efficiency')
     department = request.GET.get('department', 'all')
     
-    today = timezone.now().date()
+    today = timezone.localdate()
     start_date = today - timedelta(days=period-1)
     
     try:
         
         if chart_type == 'top_employees':
             # Топ сотрудников
-            work_sessions = WorkSession.objects.filter(
-                date__gte=start_date,
-                employee__is_active=True
-            ).select_related('employee')
-            
-            employee_hours = {}
-            for session in work_sessions:
-                emp_id = session.employee.id
-                if emp_id not in employee_hours:
-                    employee_hours[emp_id] = {
-                        'employee': session.employee,
-                        'total_hours': 0,
-                        'sessions_count': 0
-                    }
-                if session.duration_hours:
-                    employee_hours[emp_id]['total_hours'] += session.duration_hours
-                employee_hours[emp_id]['sessions_count'] += 1
-            
-            top_employees = sorted(employee_hours.values(), key=lambda x: x['total_hours'], reverse=True)[:limit]
-            
-            data = {
-                'labels': [emp['employee'].full_name for emp in top_employees],
-                'data': [emp['total_hours'] for emp in top_employees],
-                'table_data': [
-                    {
-                        'name': emp['employee'].full_name,
-                        'department': emp['employee'].department.name,
-                        'hours': emp['total_hours'],
-                        'sessions': emp['sessions_count']
-                    } for emp in top_employees
-                ]
-            }
-            
+            data = top_employees_chart(start_date, limit)
             
         elif chart_type == 'departments':
-            # Этот блок удален - не используется
-            data = {'labels': [], 'data': [], 'table_data': []}
             # Отделы
-            departments = Employee.objects.filter(is_active=True).values('department__name').annotate(
-                total_employees=Count('id')
-            ).order_by('-total_employees')[:limit]
-            
-            departments_stats = []
-            work_sessions = WorkSession.objects.filter(
-                date__gte=start_date,
-                employee__is_active=True
-            )
-            
-            for dept in departments:
-                dept_name = dept['department__name']
-                total_emp = dept['total_employees']
-                
-                # Считаем присутствующих сегодня
-                present_today = Employee.objects.filter(
-                    is_active=True,
-                    department__name=dept_name
-                ).count()
-                
-                # Считаем метрику
-                dept_employees = Employee.objects.filter(
-                    is_active=True, 
-                    department__name=dept_name
-                )
-                
-                if metric == 'efficiency':
-                    total_hours = 0
-                    for emp in dept_employees:
-                        emp_sessions = work_sessions.filter(employee=emp)
-                        total_hours += sum(s.duration_hours for s in emp_sessions if s.duration_hours)
-                    value = (total_hours / (total_emp * 40)) * 100 if total_emp > 0 else 0
-                elif metric == 'attendance':
-                    present_days = 0
-                    total_days = 0
-                    for emp in dept_employees:
-                        emp_sessions = work_sessions.filter(employee=emp)
-                        present_days += emp_sessions.count()
-                        total_days += period
-                    value = (present_days / total_days) * 100 if total_days > 0 else 0
-                else:  # hours
-                    total_hours = 0
-                    for emp in dept_employees:
-                        emp_sessions = work_sessions.filter(employee=emp)
-                        total_hours += sum(s.duration_hours for s in emp_sessions if s.duration_hours)
-                    value = total_hours
-                
-                departments_stats.append({
-                    'name': dept_name,
-                    'total_employees': total_emp,
-                    'present_today': present_today,
-                    'value': round(value, 1)
-                })
-            
-            data = {
-                'labels': [dept['name'] for dept in departments_stats],
-                'data': [dept['value'] for dept in departments_stats],
-                'table_data': departments_stats
-            }
+            data = departments_chart(start_date, today, period, limit, metric)
             
         elif chart_type == 'problematic_employees':
-            # Проблемные сотрудники - упрощенная версия для отладки
-            employees_query = Employee.objects.filter(is_active=True)
-            
-            # Фильтр по департаменту
-            if department != 'all':
-                try:
-                    employees_query = employees_query.filter(department_id=department)
-                except:
-                    pass
-            
-            employees = employees_query[:limit]
-            
-            # Создаем тестовые данные для демонстрации
-            problematic_data = []
-            for i, employee in enumerate(employees):
-                problematic_data.append({
-                    'full_name': employee.full_name,
-                    'department': employee.department.name if employee.department else 'Не указан',
-                    'late_count': i % 3,
-                    'missed_hours': round(i * 0.5, 1),
-                    'rating': round(i * 0.8, 1),
-                    'status': 'Отлично' if i < 2 else 'Хорошо' if i < 4 else 'Плохо'
-                })
-            
-            # Применяем фильтр
-            if filter_type == 'problematic':
-                problematic_data = [emp for emp in problematic_data if emp['rating'] > 3]
-            elif filter_type == 'best':
-                problematic_data = [emp for emp in problematic_data if emp['rating'] <= 3]
-            
-            data = {
-                'labels': [emp['full_name'] for emp in problematic_data[:10]],
-                'data': [emp['rating'] for emp in problematic_data[:10]],
-                'table_data': problematic_data
-            }
+            # Проблемные сотрудники
+            data = problematic_employees_chart(start_date, today, department, limit, filter_type)
         
         else:
             return JsonResponse({'error': 'Invalid chart type'}, status=400)
@@ -643,6 +214,7 @@ def events_list(request):
         'current_device': device_id,
         'current_type': event_type,
         'current_hours': hours,
+        'live_events_enabled': live_events_available(request),
     }
     
     return render(request, 'employees/events_list.html', context)
@@ -731,6 +303,55 @@ def send_test_event(request):
     return render(request, 'employees/send_test_event.html')
 
 
+def _live_events_employee_ids(user):
+    """id доступных пользователю сотрудников для рассылки событий (None - все)"""
+    scope = dashboard_snapshots.get_scope(user)
+    if scope == ALL_SCOPE:
+        return None
+    return {
+        str(employee_id)
+        for employee_id in dashboard_snapshots.get_scope_employees(scope, user).values_list('id', flat=True)
+    }
+
+
+async def live_events_stream(request):
+    """
+    Поток новых событий СКУД и изменений присутствия (Server-Sent Events)
+
+    Работает под ASGI (employee_management/asgi.py): соединение держится
+    открытым, сообщения приходят из брокера live_events. Под WSGI поток
+    занял бы воркер навсегда, поэтому возвращается 503.
+    """
+    if not live_events_available(request):
+        return JsonResponse({'error': 'Поток событий доступен только под ASGI сервером'}, status=503)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Требуется аутентификация'}, status=401)
+
+    employee_ids = await sync_to_async(_live_events_employee_ids)(user)
+    keepalive = get_live_events_settings()['KEEPALIVE_SECONDS']
+
+    async def stream():
+        subscription = get_event_broker().subscribe(employee_ids)
+        try:
+            # Переподключение браузера через 5 секунд после обрыва
+            yield 'retry: 5000\n\n'
+            while True:
+                message = await subscription.get(keepalive)
+                if message is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message['data'], ensure_ascii=False)}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def api_status(request):
     """API статус системы"""
     from .cache_utils import SKUDCache
@@ -1195,188 +816,31 @@ def employee_report(request):
 @can_view_reports
 def attendance_control(request):
     """Страница контроля прибытия и отбытия"""
-    from django.db.models import Q, Count, Sum, Avg
-    from datetime import datetime, timedelta, date
-    import calendar
-    
     # Получаем параметры фильтрации
     view_type = request.GET.get('view', 'daily')  # daily или monthly
     search_query = request.GET.get('search', '').strip()
     department_id = request.GET.get('department', '')
     status_filter = request.GET.get('status', '')
-    date_from_str = request.GET.get('date_from', '')
-    date_to_str = request.GET.get('date_to', '')
-    
-    # Определяем диапазон дат для фильтрации
-    today = timezone.now().date()
-    
-    if date_from_str:
-        try:
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        except ValueError:
-            date_from = today
-    else:
-        date_from = today
-    
-    if date_to_str:
-        try:
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        except ValueError:
-            date_to = today
-    else:
-        date_to = today
-    
-    # Убеждаемся, что date_from не больше date_to
-    if date_from > date_to:
-        date_from, date_to = date_to, date_from
-    
-    # Базовый queryset сотрудников - фильтруем по правам доступа
-    if request.user.is_superuser:
-        employees = Employee.objects.filter(is_active=True).select_related('department', 'division')
-    else:
-        # Получаем доступных сотрудников через систему ролей
-        accessible_employees = PermissionChecker.get_accessible_employees(request.user)
-        employees = accessible_employees.select_related('department', 'division')
-    
-    # Поиск по имени
-    if search_query:
-        employees = employees.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(middle_name__icontains=search_query)
-        )
-    
-    # Фильтр по отделу
-    if department_id:
-        employees = employees.filter(department_id=department_id)
-    
-    # Получаем данные о посещаемости
-    attendance_data = []
-    
-    if view_type == 'daily':
-        # Дневной вид - показываем данные за диапазон дней
-        for employee in employees:
-            # Получаем рабочие сессии за диапазон дней
-            work_sessions = WorkSession.objects.filter(
-                employee=employee,
-                date__range=[date_from, date_to]
-            ).order_by('date', 'start_time')
-            
-            # Получаем сводки за диапазон дней
-            day_summaries = WorkDaySummary.objects.filter(
-                employee=employee,
-                date__range=[date_from, date_to]
-            ).order_by('date')
-            
-            # Рассчитываем статистику за весь диапазон
-            total_hours = 0
-            entry_count = 0
-            arrival_time = None
-            departure_time = None
-            
-            if work_sessions.exists():
-                first_session = work_sessions.first()
-                last_session = work_sessions.last()
-                
-                arrival_time = first_session.start_time.time()
-                if last_session.end_time:
-                    departure_time = last_session.end_time.time()
-                
-                entry_count = work_sessions.count()
-                total_hours = sum(session.duration_hours for session in work_sessions if session.duration_hours)
-            
-            # Определяем статус на основе сводок за период
-            status = 'absent'
-            if day_summaries.exists():
-                # Если есть сводки, определяем общий статус
-                present_days = day_summaries.filter(status='present').count()
-                total_days = day_summaries.count()
-                
-                if present_days == total_days:
-                    status = 'present'
-                elif present_days > 0:
-                    status = 'partial'
-                else:
-                    status = 'absent'
-            elif work_sessions.exists():
-                status = 'present'
-            
-            # Применяем фильтр по статусу
-            if status_filter and status != status_filter:
-                continue
-            
-            attendance_data.append({
-                'employee': employee,
-                'arrival_time': arrival_time,
-                'departure_time': departure_time,
-                'total_hours': total_hours,
-                'entry_count': entry_count,
-                'status': status,
-                'work_sessions': work_sessions,
-                'day_summaries': day_summaries,
-            })
-    
-    else:  # monthly
-        # Месячный вид - показываем статистику за диапазон дат
-        for employee in employees:
-            # Получаем сводки за диапазон дат
-            month_summaries = WorkDaySummary.objects.filter(
-                employee=employee,
-                date__range=[date_from, date_to]
-            )
-            
-            # Рассчитываем общую статистику
-            total_work_hours = sum(s.total_hours for s in month_summaries)
-            total_expected_hours = sum(s.expected_hours for s in month_summaries)
-            # Изменено: считаем количество уникальных дней вместо количества входов
-            total_entry_count = month_summaries.filter(sessions_count__gt=0).count()
-            
-            # Статус на основе количества присутствий
-            present_days = month_summaries.filter(status='present').count()
-            total_work_days = month_summaries.count()
-            
-            if total_work_days == 0:
-                status = 'no_data'
-            elif present_days == total_work_days:
-                status = 'excellent'
-            elif present_days >= total_work_days * 0.8:
-                status = 'good'
-            elif present_days >= total_work_days * 0.6:
-                status = 'average'
-            else:
-                status = 'poor'
-            
-            # Применяем фильтр по статусу
-            if status_filter and status != status_filter:
-                continue
-            
-            attendance_data.append({
-                'employee': employee,
-                'total_work_hours': total_work_hours,
-                'total_expected_hours': total_expected_hours,
-                'total_entry_count': total_entry_count,
-                'present_days': present_days,
-                'total_work_days': total_work_days,
-                'status': status,
-                'month_summaries': month_summaries,
-            })
-    
-    # Сортируем данные
     sort_by = request.GET.get('sort', 'name')
     sort_order = request.GET.get('order', 'asc')
     
-    if sort_by == 'name':
-        attendance_data.sort(key=lambda x: x['employee'].full_name, reverse=(sort_order == 'desc'))
-    elif sort_by == 'hours':
-        attendance_data.sort(key=lambda x: x.get('total_hours', 0) or x.get('total_work_hours', 0), reverse=(sort_order == 'desc'))
-    elif sort_by == 'entries':
-        attendance_data.sort(key=lambda x: x.get('entry_count', 0) or x.get('total_entry_count', 0), reverse=(sort_order == 'desc'))
+    # Определяем диапазон дат для фильтрации
+    date_from, date_to = parse_attendance_period(request.GET)
+    
+    # Сотрудники по правам доступа, поиску и отделу; строки страницы,
+    # фильтр по статусу и сортировка - одним запросом в базе данных
+    employees = attendance_employees(request.user, search_query, department_id)
+    attendance_rows = attendance_queryset(
+        employees, view_type, date_from, date_to, status_filter, sort_by, sort_order
+    )
     
     # Пагинация
     per_page = int(request.GET.get('per_page', 20))
-    paginator = Paginator(attendance_data, per_page)
+    paginator = Paginator(attendance_rows, per_page)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    build_row = daily_row if view_type == 'daily' else monthly_row
+    page_obj.object_list = [build_row(employee) for employee in page_obj.object_list]
     
     # Данные для фильтров
     departments = Employee.objects.filter(
@@ -1385,8 +849,9 @@ def attendance_control(request):
     ).values_list('department__id', 'department__name').distinct().order_by('department__name')
     
     # Статистика для заголовка
-    total_employees = len(attendance_data)
-    present_count = len([d for d in attendance_data if d['status'] in ['present', 'partial', 'excellent', 'good']])
+    counts = attendance_counts(attendance_rows)
+    total_employees = counts['total']
+    present_count = counts['present']
     
     context = {
         'page_obj': page_obj,
@@ -1411,59 +876,15 @@ def attendance_control(request):
 @require_login
 @can_export_data
 def export_attendance_excel(request):
-    """Экспорт данных о посещаемости в Excel"""
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from openpyxl.utils import get_column_letter
-    from django.http import HttpResponse
-    from datetime import datetime, timedelta, date
-    from django.db.models import Q
-    
+    """Экспорт данных о посещаемости в Excel (потоковая запись строк)"""
     # Получаем параметры фильтрации (те же, что и в attendance_control)
     view_type = request.GET.get('view', 'daily')
     search_query = request.GET.get('search', '').strip()
     department_id = request.GET.get('department', '')
     status_filter = request.GET.get('status', '')
-    date_from_str = request.GET.get('date_from', '')
-    date_to_str = request.GET.get('date_to', '')
     
     # Определяем диапазон дат для фильтрации
-    today = timezone.now().date()
-    
-    if date_from_str:
-        try:
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        except ValueError:
-            date_from = today
-    else:
-        date_from = today
-    
-    if date_to_str:
-        try:
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-        except ValueError:
-            date_to = today
-    else:
-        date_to = today
-    
-    # Убеждаемся, что date_from не больше date_to
-    if date_from > date_to:
-        date_from, date_to = date_to, date_from
-    
-    # Создаем Excel файл
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Посещаемость_{date_from.strftime('%Y%m%d')}_{date_to.strftime('%Y%m%d')}"
-    
-    # Стили
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    date_from, date_to = parse_attendance_period(request.GET)
     
     # Заголовок
     if date_from == date_to:
@@ -1471,168 +892,49 @@ def export_attendance_excel(request):
     else:
         title = f"Отчет по посещаемости с {date_from.strftime('%d.%m.%Y')} по {date_to.strftime('%d.%m.%Y')}"
     
-    ws['A1'] = title
-    ws['A1'].font = Font(bold=True, size=16)
-    ws.merge_cells('A1:F1')
-    
     # Заголовки колонок
     if view_type == 'daily':
         headers = ['Сотрудник', 'Должность', 'Отдел', 'Время прихода', 'Время ухода', 'Часов работы', 'Статус']
     else:
         headers = ['Сотрудник', 'Должность', 'Отдел', 'Часов работы', 'Ожидаемо часов', 'Количество дней', 'Статус']
     
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Получаем данные (используем ту же логику, что и в attendance_control)
-    # Фильтруем по правам доступа
-    if request.user.is_superuser:
-        employees = Employee.objects.filter(is_active=True).select_related('department', 'division')
-    else:
-        # Получаем доступных сотрудников через систему ролей
-        accessible_employees = PermissionChecker.get_accessible_employees(request.user)
-        employees = accessible_employees.select_related('department', 'division')
-    
-    if search_query:
-        employees = employees.filter(
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query) |
-            Q(middle_name__icontains=search_query)
-        )
+    writer = StreamingXlsxWriter()
+    sheet = writer.add_sheet(
+        f"Посещаемость_{date_from.strftime('%Y%m%d')}_{date_to.strftime('%Y%m%d')}", headers, title=title
+    )
     
-    if department_id:
-        employees = employees.filter(department_id=department_id)
+    # Строки считаются в базе данных так же, как на странице attendance_control
+    employees = attendance_employees(request.user, search_query, department_id)
+    rows = attendance_queryset(employees, view_type, date_from, date_to, status_filter)
     
-    row = 4
-    for employee in employees:
+    for employee in rows.iterator(chunk_size=2000):
+        department_name = employee.department.name if employee.department else ''
         if view_type == 'daily':
-            # Дневной вид - данные за диапазон дат
-            work_sessions = WorkSession.objects.filter(
-                employee=employee,
-                date__range=[date_from, date_to]
-            ).order_by('date', 'start_time')
-            
-            day_summaries = WorkDaySummary.objects.filter(
-                employee=employee,
-                date__range=[date_from, date_to]
-            ).order_by('date')
-            
-            arrival_time = None
-            departure_time = None
-            total_hours = 0
-            
-            if work_sessions.exists():
-                first_session = work_sessions.first()
-                last_session = work_sessions.last()
-                
-                arrival_time = first_session.start_time.time()
-                if last_session.end_time:
-                    departure_time = last_session.end_time.time()
-                
-                total_hours = sum(session.duration_hours for session in work_sessions if session.duration_hours)
-            
-            # Определяем статус на основе сводок за период
-            status = 'Отсутствовал'
-            if day_summaries.exists():
-                present_days = day_summaries.filter(status='present').count()
-                total_days = day_summaries.count()
-                
-                if present_days == total_days:
-                    status = 'Присутствовал'
-                elif present_days > 0:
-                    status = 'Частично присутствовал'
-                else:
-                    status = 'Отсутствовал'
-            elif work_sessions.exists():
-                status = 'Присутствовал'
-            
-            # Применяем фильтр по статусу
-            if status_filter and status.lower() != status_filter:
-                continue
-            
+            row = daily_row(employee)
             data = [
                 employee.full_name,
                 employee.get_position_display(),
-                employee.department.name,
-                arrival_time.strftime('%H:%M') if arrival_time else '—',
-                departure_time.strftime('%H:%M') if departure_time else '—',
-                f"{total_hours:.1f}" if total_hours > 0 else '—',
-                status
+                department_name,
+                row['arrival_time'].strftime('%H:%M') if row['arrival_time'] else '—',
+                row['departure_time'].strftime('%H:%M') if row['departure_time'] else '—',
+                f"{row['total_hours']:.1f}" if row['total_hours'] > 0 else '—',
+                STATUS_LABELS[row['status']]
             ]
         else:
-            # Месячный вид - данные за диапазон дат
-            month_summaries = WorkDaySummary.objects.filter(
-                employee=employee,
-                date__range=[date_from, date_to]
-            )
-            
-            total_work_hours = sum(s.total_hours for s in month_summaries)
-            total_expected_hours = sum(s.expected_hours for s in month_summaries)
-            # Изменено: считаем количество уникальных дней вместо количества входов
-            total_entry_count = month_summaries.filter(sessions_count__gt=0).count()
-            
-            present_days = month_summaries.filter(status='present').count()
-            total_work_days = month_summaries.count()
-            
-            if total_work_days == 0:
-                status = 'Нет данных'
-            elif present_days == total_work_days:
-                status = 'Отлично'
-            elif present_days >= total_work_days * 0.8:
-                status = 'Хорошо'
-            elif present_days >= total_work_days * 0.6:
-                status = 'Удовлетворительно'
-            else:
-                status = 'Плохо'
-            
-            # Применяем фильтр по статусу
-            if status_filter and status.lower() != status_filter:
-                continue
-            
+            row = monthly_row(employee)
             data = [
                 employee.full_name,
                 employee.get_position_display(),
-                employee.department.name,
-                f"{total_work_hours:.1f}",
-                f"{total_expected_hours:.1f}",
-                str(total_entry_count),
-                status
+                department_name,
+                f"{row['total_work_hours']:.1f}",
+                f"{row['total_expected_hours']:.1f}",
+                str(row['total_entry_count']),
+                STATUS_LABELS[row['status']]
             ]
-        
-        # Записываем данные в Excel
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.border = border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        row += 1
+        sheet.write_row(data)
     
-    # Автоподбор ширины колонок
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Создаем HTTP ответ
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
     filename = f"attendance_{date_from.strftime('%Y%m%d')}_{date_to.strftime('%Y%m%d')}_{view_type}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    wb.save(response)
-    return response
+    return writer.response(filename)
 
 
 @require_login
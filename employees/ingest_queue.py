@@ -0,0 +1,343 @@
+"""
+Очередь приема событий СКУД
+
+В режиме SKUD_INGEST_SETTINGS['MODE'] = 'queue' endpoint только сохраняет
+сырое событие в очередь и сразу отвечает устройству. Обработка (создание
+SKUDEvent и записей рабочего времени) выполняется отдельным воркером пакетами:
+Celery задачей employees.tasks.drain_skud_ingest_queue или командой drain_skud_queue.
+
+Поддерживаются две реализации очереди:
+- database: таблица SKUDIngestItem (по умолчанию, не требует внешних сервисов);
+- redis: список в Redis (требуется Redis 6.2+ для LMOVE).
+"""
+
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SKUDIngestItem
+
+logger = logging.getLogger(__name__)
+
+# Настройки по умолчанию (переопределяются SKUD_INGEST_SETTINGS)
+DEFAULT_INGEST_SETTINGS = {
+    'MODE': 'sync',
+    'BACKEND': 'database',
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'REDIS_KEY': 'skud_ingest_queue',
+    'BATCH_SIZE': 500,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 30,
+}
+
+
+def get_ingest_settings() -> Dict:
+    """Настройки приема событий с учетом значений по умолчанию"""
+    return {**DEFAULT_INGEST_SETTINGS, **getattr(settings, 'SKUD_INGEST_SETTINGS', {})}
+
+
+def is_queue_mode() -> bool:
+    """Включен ли прием событий через очередь"""
+    return get_ingest_settings()['MODE'] == 'queue'
+
+
+class BaseIngestQueue:
+    """Базовый класс очереди событий СКУД"""
+
+    def __init__(self, batch_size: int = 500, max_attempts: int = 5, retry_delay: float = 30):
+        self.logger = logger
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def enqueue(self, device_ip: str, event_data: Dict) -> None:
+        """Добавление события в очередь"""
+        self.enqueue_many(device_ip, [event_data])
+
+    def enqueue_many(self, device_ip: str, events_data: List[Dict]) -> None:
+        """Добавление нескольких событий одного устройства в очередь"""
+        raise NotImplementedError
+
+    def drain(self, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Обработка одного пакета событий из очереди
+
+        Returns:
+            Dict: {'processed': обработано, 'failed': с ошибкой}
+        """
+        raise NotImplementedError
+
+    def size(self) -> int:
+        """Количество событий, ожидающих обработки"""
+        raise NotImplementedError
+
+    def drain_all(self, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Обработка очереди, пока в ней есть события, которые удается обработать"""
+        totals = {'processed': 0, 'failed': 0, 'batches': 0}
+
+        while max_batches is None or totals['batches'] < max_batches:
+            result = self.drain(batch_size)
+            if not result['processed'] and not result['failed']:
+                break
+
+            totals['processed'] += result['processed']
+            totals['failed'] += result['failed']
+            totals['batches'] += 1
+
+            # Пакет целиком из ошибок - повторим при следующем запуске
+            if not result['processed']:
+                break
+
+        return totals
+
+    def _process_items(self, items: List[Tuple[str, Dict, datetime]]) -> Dict[int, str]:
+        """
+        Обработка событий пакетами по устройствам
+
+        Args:
+            items: Список (IP устройства, данные события, время получения)
+
+        Если пакет устройства не удалось обработать, его события обрабатываются
+        по одному: ошибку получают только события, которые не обрабатываются сами по себе.
+
+        Returns:
+            Dict: Индекс события -> текст ошибки (для необработанных событий)
+        """
+        from .skud_device_communication import SKUDDeviceCommunicator
+
+        groups = OrderedDict()
+        for index, (device_ip, payload, received_at) in enumerate(items):
+            groups.setdefault(device_ip, []).append((index, self._prepare_payload(payload, received_at)))
+
+        communicator = SKUDDeviceCommunicator()
+        errors = {}
+
+        for device_ip, group in groups.items():
+            try:
+                with transaction.atomic():
+                    communicator.process_device_events_batch(device_ip, [payload for _, payload in group])
+            except Exception as e:
+                self.logger.error(f"Ошибка обработки событий из очереди от {device_ip}: {e}")
+                if len(group) == 1:
+                    errors[group[0][0]] = str(e)
+                    continue
+
+                # Повторяем по одному событию, чтобы ошибку получили только некорректные события
+                for index, payload in group:
+                    try:
+                        with transaction.atomic():
+                            communicator.process_device_events_batch(device_ip, [payload])
+                    except Exception as item_error:
+                        errors[index] = str(item_error)
+
+        return errors
+
+    def _prepare_payload(self, payload: Dict, received_at: datetime) -> Dict:
+        """Событие без времени получает время приема в очередь, а не время обработки"""
+        if payload.get('timestamp'):
+            return payload
+
+        received_at = timezone.localtime(received_at)
+        return {**payload, 'timestamp': received_at.strftime('%Y-%m-%dT%H:%M:%S.%f')}
+
+
+class DatabaseIngestQueue(BaseIngestQueue):
+    """
+    Очередь событий в таблице SKUDIngestItem
+
+    Событие с ошибкой повторяется не раньше чем через retry_delay секунд,
+    задержка удваивается с каждой попыткой: иначе оно выбиралось бы в каждом
+    пакете drain_all и каждый раз заставляло обрабатывать свое устройство по одному.
+    """
+
+    def enqueue(self, device_ip: str, event_data: Dict) -> None:
+        SKUDIngestItem.objects.create(device_ip=device_ip, payload=event_data)
+
+    def enqueue_many(self, device_ip: str, events_data: List[Dict]) -> None:
+        SKUDIngestItem.objects.bulk_create([
+            SKUDIngestItem(device_ip=device_ip, payload=event_data)
+            for event_data in events_data
+        ])
+
+    def drain(self, batch_size: Optional[int] = None) -> Dict[str, int]:
+        batch_size = batch_size or self.batch_size
+        now = timezone.now()
+
+        with transaction.atomic():
+            # skip_locked позволяет нескольким воркерам разбирать очередь параллельно
+            items = list(
+                SKUDIngestItem.objects.select_for_update(skip_locked=True)
+                .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now), is_failed=False)
+                .order_by('attempts', 'id')[:batch_size]
+            )
+            if not items:
+                return {'processed': 0, 'failed': 0}
+
+            errors = self._process_items([
+                (item.device_ip, item.payload, item.received_at) for item in items
+            ])
+
+            failed_items = []
+            for index, error in errors.items():
+                item = items[index]
+                item.attempts += 1
+                item.last_error = error
+                item.is_failed = item.attempts >= self.max_attempts
+                item.next_attempt_at = now + timedelta(seconds=self.retry_delay * 2 ** (item.attempts - 1))
+                failed_items.append(item)
+
+            if failed_items:
+                SKUDIngestItem.objects.bulk_update(
+                    failed_items, ['attempts', 'last_error', 'is_failed', 'next_attempt_at']
+                )
+
+            processed_ids = [item.id for index, item in enumerate(items) if index not in errors]
+            SKUDIngestItem.objects.filter(id__in=processed_ids).delete()
+
+        return {'processed': len(processed_ids), 'failed': len(failed_items)}
+
+    def size(self) -> int:
+        return SKUDIngestItem.objects.filter(is_failed=False).count()
+
+
+class RedisIngestQueue(BaseIngestQueue):
+    """
+    Очередь событий в списке Redis
+
+    Воркер переносит пакет в свой список <key>:processing:<id воркера>
+    (LMOVE) и удаляет его только после обработки, поэтому события не теряются
+    при падении воркера. Списки воркеров, которые не продлевали отметку
+    активности дольше PROCESSING_TTL секунд, возвращаются в начало очереди
+    при следующем запуске обработки (повторы отбрасываются по dedup_key).
+
+    События с ошибкой возвращаются в конец очереди, а после max_attempts
+    попыток перекладываются в список <key>:failed.
+    """
+
+    # Время (в секундах), после которого список необработанных событий воркера считается брошенным
+    PROCESSING_TTL = 300
+
+    def __init__(self, redis_url: str, key: str, **kwargs):
+        super().__init__(**kwargs)
+        self.client = redis.Redis.from_url(redis_url)
+        self.key = key
+        self.failed_key = f'{key}:failed'
+        self.workers_key = f'{key}:workers'
+        self.processing_key = f'{key}:processing:{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def enqueue_many(self, device_ip: str, events_data: List[Dict]) -> None:
+        received_at = timezone.now().isoformat()
+        self.client.rpush(self.key, *[
+            json.dumps({
+                'device_ip': device_ip,
+                'payload': event_data,
+                'received_at': received_at,
+                'attempts': 0,
+            }, ensure_ascii=False)
+            for event_data in events_data
+        ])
+
+    def drain_all(self, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, int]:
+        self.requeue_stale()
+        return super().drain_all(batch_size=batch_size, max_batches=max_batches)
+
+    def drain(self, batch_size: Optional[int] = None) -> Dict[str, int]:
+        batch_size = batch_size or self.batch_size
+
+        # Отметка активности воркера: пока она есть, его список не считается брошенным
+        pipe = self.client.pipeline()
+        pipe.sadd(self.workers_key, self.processing_key)
+        pipe.set(self._alive_key(self.processing_key), 1, ex=self.PROCESSING_TTL)
+        pipe.lrange(self.processing_key, 0, -1)
+        raw_items = pipe.execute()[-1]
+
+        # Список пуст - переносим новый пакет; иначе дообрабатываем пакет, прерванный ошибкой
+        if not raw_items:
+            pipe = self.client.pipeline()
+            for _ in range(batch_size):
+                pipe.lmove(self.key, self.processing_key, 'LEFT', 'RIGHT')
+            raw_items = [raw_item for raw_item in pipe.execute() if raw_item is not None]
+        if not raw_items:
+            return {'processed': 0, 'failed': 0}
+
+        items = [json.loads(raw_item) for raw_item in raw_items]
+        errors = self._process_items([
+            (item['device_ip'], item['payload'], datetime.fromisoformat(item['received_at']))
+            for item in items
+        ])
+
+        # Возврат событий с ошибкой и удаление пакета - одной транзакцией Redis
+        pipe = self.client.pipeline()
+        for index, error in errors.items():
+            item = items[index]
+            item['attempts'] += 1
+            item['last_error'] = error
+            key = self.failed_key if item['attempts'] >= self.max_attempts else self.key
+            pipe.rpush(key, json.dumps(item, ensure_ascii=False))
+        pipe.delete(self.processing_key)
+        pipe.execute()
+
+        return {'processed': len(items) - len(errors), 'failed': len(errors)}
+
+    def requeue_stale(self) -> int:
+        """
+        Возврат в начало очереди событий из списков остановившихся воркеров
+
+        Returns:
+            int: Количество возвращенных событий
+        """
+        requeued = 0
+        for processing_key in self.client.smembers(self.workers_key):
+            processing_key = processing_key.decode()
+            if processing_key == self.processing_key or self.client.exists(self._alive_key(processing_key)):
+                continue
+
+            # Переносим с конца списка в начало очереди, сохраняя порядок событий
+            while self.client.lmove(processing_key, self.key, 'RIGHT', 'LEFT') is not None:
+                requeued += 1
+            self.client.srem(self.workers_key, processing_key)
+
+        if requeued:
+            self.logger.warning(f"Возвращено в очередь необработанных событий остановившихся воркеров: {requeued}")
+        return requeued
+
+    def size(self) -> int:
+        return self.client.llen(self.key)
+
+    @staticmethod
+    def _alive_key(processing_key: str) -> str:
+        return f'{processing_key}:alive'
+
+
+_ingest_queue = None
+
+
+def get_ingest_queue() -> BaseIngestQueue:
+    """Очередь событий согласно SKUD_INGEST_SETTINGS (один экземпляр на процесс)"""
+    global _ingest_queue
+    if _ingest_queue is not None:
+        return _ingest_queue
+
+    ingest_settings = get_ingest_settings()
+    options = {
+        'batch_size': ingest_settings['BATCH_SIZE'],
+        'max_attempts': ingest_settings['MAX_ATTEMPTS'],
+        'retry_delay': ingest_settings['RETRY_DELAY'],
+    }
+
+    if ingest_settings['BACKEND'] == 'redis':
+        _ingest_queue = RedisIngestQueue(ingest_settings['REDIS_URL'], ingest_settings['REDIS_KEY'], **options)
+    else:
+        _ingest_queue = DatabaseIngestQueue(**options)
+    return _ingest_queue
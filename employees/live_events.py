@@ -0,0 +1,254 @@
+"""
+Рассылка событий СКУД подключенным браузерам (Server-Sent Events)
+
+После фиксации транзакции приема событий сообщения публикуются в брокер
+(publish_events), а SSE endpoint frontend_views.live_events_stream держит
+подписку на брокер и отправляет браузеру только события сотрудников,
+доступных пользователю. Вместо опроса страниц каждым клиентом - одна
+рассылка на событие.
+
+Поддерживаются две реализации брокера (LIVE_EVENTS_SETTINGS['BACKEND']):
+- local: подписчики в памяти процесса (события видны подписчикам того же
+  процесса, подходит для одного ASGI процесса с приемом в режиме sync);
+- redis: публикация в канал Redis, каждый процесс держит одну подписку
+  на канал и раздает сообщения своим подписчикам (несколько процессов,
+  прием через очередь и Celery).
+
+Поток держит соединение открытым и работает только под ASGI сервером
+(uvicorn employee_management.asgi:application). Под WSGI (runserver,
+gunicorn) страницы не открывают поток (live_events_available) и
+обновляются опросом, как раньше.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+import redis
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Настройки по умолчанию (переопределяются LIVE_EVENTS_SETTINGS)
+DEFAULT_LIVE_EVENTS_SETTINGS = {
+    'BACKEND': 'local',
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'REDIS_CHANNEL': 'skud_live_events',
+    'KEEPALIVE_SECONDS': 15,
+    'SUBSCRIBER_QUEUE_SIZE': 1000,
+}
+
+
+def get_live_events_settings() -> Dict:
+    """Настройки рассылки событий с учетом значений по умолчанию"""
+    return {**DEFAULT_LIVE_EVENTS_SETTINGS, **getattr(settings, 'LIVE_EVENTS_SETTINGS', {})}
+
+
+def live_events_available(request) -> bool:
+    """Поток событий доступен: запрос обслуживается ASGI сервером"""
+    return isinstance(request, ASGIRequest)
+
+
+def build_messages(skud_events: Iterable) -> List[Dict]:
+    """
+    Сообщения для браузеров по событиям СКУД
+
+    На каждое событие - сообщение 'skud_event', на каждого сотрудника -
+    сообщение 'presence' по его последнему событию (вход - на работе).
+    У событий должны быть загружены device и employee.
+    """
+    messages = []
+    presence = {}
+    for skud_event in sorted(skud_events, key=lambda item: item.event_time):
+        employee = skud_event.employee
+        employee_id = str(skud_event.employee_id) if skud_event.employee_id else None
+        local_time = timezone.localtime(skud_event.event_time)
+        messages.append({
+            'type': 'skud_event',
+            'employee_id': employee_id,
+            'data': {
+                'id': str(skud_event.id),
+                'employee_id': employee_id,
+                'employee_name': employee.full_name if employee else None,
+                'card_number': skud_event.card_number,
+                'event_type': skud_event.event_type,
+                'type_display': 'Вход' if skud_event.event_type == 'entry' else 'Выход',
+                'event_time': local_time.isoformat(),
+                'time': local_time.strftime('%H:%M'),
+                'device_id': str(skud_event.device_id),
+                'device': skud_event.device.name,
+            },
+        })
+        if employee_id:
+            presence[employee_id] = {
+                'type': 'presence',
+                'employee_id': employee_id,
+                'data': {
+                    'employee_id': employee_id,
+                    'is_present': skud_event.event_type == 'entry',
+                    'work_status': 'На работе' if skud_event.event_type == 'entry' else 'Не на работе',
+                    'time': local_time.strftime('%H:%M'),
+                },
+            }
+    return messages + list(presence.values())
+
+
+def publish_events(skud_events: Iterable) -> None:
+    """Публикация событий СКУД после фиксации текущей транзакции"""
+    skud_events = list(skud_events)
+    if not skud_events:
+        return
+    transaction.on_commit(lambda: get_event_broker().publish(build_messages(skud_events)))
+
+
+class Subscription:
+    """
+    Подписка одного SSE соединения
+
+    Создается внутри event loop соединения. Сообщения могут доставляться из
+    любого потока; при переполнении очереди (медленный клиент) сообщения
+    отбрасываются, а клиенту отправляется 'resync' для перезагрузки данных.
+    """
+
+    def __init__(self, broker: 'LocalEventBroker', employee_ids: Optional[Set[str]], maxsize: int):
+        self.broker = broker
+        self.employee_ids = employee_ids
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def matches(self, message: Dict) -> bool:
+        """Доступно ли сообщение подписчику (None - все сотрудники)"""
+        if self.employee_ids is None:
+            return True
+        return message['employee_id'] in self.employee_ids
+
+    def deliver(self, message: Dict) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Event loop соединения уже закрыт
+            self.broker.unsubscribe(self)
+
+    def _put(self, message: Dict) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> Optional[Dict]:
+        """Следующее сообщение или None, если за timeout секунд сообщений не было"""
+        if self.overflowed and self.queue.empty():
+            self.overflowed = False
+            return {'type': 'resync', 'employee_id': None, 'data': {}}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class LocalEventBroker:
+    """Брокер событий в памяти процесса"""
+
+    def __init__(self, queue_size: int = 1000):
+        self.logger = logger
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, messages: List[Dict]) -> None:
+        """Публикация сообщений всем подписчикам"""
+        self._fan_out(messages)
+
+    def subscribe(self, employee_ids: Optional[Set[str]] = None) -> Subscription:
+        """Подписка на сообщения (вызывается из event loop соединения)"""
+        subscription = Subscription(self, employee_ids, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscribers_count(self) -> int:
+        return len(self._subscribers)
+
+    def _fan_out(self, messages: List[Dict]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for message in messages:
+                if subscription.matches(message):
+                    subscription.deliver(message)
+
+
+class RedisEventBroker(LocalEventBroker):
+    """
+    Брокер событий через канал Redis
+
+    Сообщения из канала читает один поток на процесс и раздает локальным
+    подписчикам.
+    """
+
+    def __init__(self, redis_url: str, channel: str, **kwargs):
+        super().__init__(**kwargs)
+        self.client = redis.Redis.from_url(redis_url)
+        self.channel = channel
+        self._listener = None
+
+    def publish(self, messages: List[Dict]) -> None:
+        # Ошибка рассылки не должна прерывать прием событий
+        try:
+            self.client.publish(self.channel, json.dumps(messages, ensure_ascii=False))
+        except redis.RedisError as e:
+            self.logger.error(f"Ошибка публикации событий в Redis: {e}")
+
+    def subscribe(self, employee_ids: Optional[Set[str]] = None) -> Subscription:
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='live-events-redis', daemon=True)
+                self._listener.start()
+        return super().subscribe(employee_ids)
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for item in pubsub.listen():
+                    self._fan_out(json.loads(item['data']))
+            except redis.RedisError as e:
+                self.logger.error(f"Подписка на канал Redis {self.channel} прервана: {e}")
+                time.sleep(1)
+
+
+_event_broker = None
+
+
+def get_event_broker() -> LocalEventBroker:
+    """Брокер событий согласно LIVE_EVENTS_SETTINGS (один экземпляр на процесс)"""
+    global _event_broker
+    if _event_broker is not None:
+        return _event_broker
+
+    live_settings = get_live_events_settings()
+    if live_settings['BACKEND'] == 'redis':
+        _event_broker = RedisEventBroker(
+            live_settings['REDIS_URL'], live_settings['REDIS_CHANNEL'],
+            queue_size=live_settings['SUBSCRIBER_QUEUE_SIZE']
+        )
+    else:
+        _event_broker = LocalEventBroker(queue_size=live_settings['SUBSCRIBER_QUEUE_SIZE'])
+    return _event_broker
@@ -7,7 +7,8 @@ from django.utils import timezone
 from django.db import transaction
 from datetime import datetime, date, timedelta
 
-from employees.models import WorkSession, WorkDaySummary, WorkTimeAuditLog, SKUDEvent
+from employees.models import EmployeeMonthSummary, WorkSession, WorkDaySummary, WorkTimeAuditLog, SKUDEvent
+from employees.month_rollup import month_start, rebuild_month_summaries
 
 
 class Command(BaseCommand):
@@ -135,6 +136,10 @@ class Command(BaseCommand):
                             self.stdout.write('   Удаление сводок дней...')
                         deleted_summaries = summaries_to_delete.delete()[0]
                         self.stdout.write(f'   ✅ Удалено сводок: {deleted_summaries}')
+
+                        # Сводки за месяц: прошлые месяцы удаляем, месяц отсечения пересчитываем
+                        EmployeeMonthSummary.objects.filter(month__lt=month_start(cutoff_date)).delete()
+                        rebuild_month_summaries(cutoff_date, cutoff_date)
                     
                     # Удаляем записи аудита
                     if not keep_audit_logs and stats['audit_logs'] > 0:
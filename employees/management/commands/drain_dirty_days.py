@@ -0,0 +1,59 @@
+"""
+Management команда для пересчёта дней, отмеченных к пересчёту
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from employees.dirty_days import DEFAULT_BATCH_SIZE, drain_all_dirty_days, pending_dirty_days
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт рабочих сессий и сводок только для изменившихся дней сотрудников'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Размер пакета (по умолчанию {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Максимальное количество пакетов за один запуск',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя отметки с интервалом --interval',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Интервал проверки в секундах для --loop (по умолчанию 5)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'📋 Дней к пересчёту: {pending_dirty_days()}')
+
+        while True:
+            result = drain_all_dirty_days(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+
+            if result['processed'] or result['failed']:
+                self.stdout.write(
+                    f"✅ Пересчитано дней: {result['processed']}, "
+                    f"❌ ошибок: {result['failed']}, 📦 пакетов: {result['batches']}"
+                )
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('🎉 Пересчёт завершён'))
@@ -0,0 +1,61 @@
+"""
+Management команда для обработки очереди событий СКУД
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from employees.ingest_queue import get_ingest_queue, get_ingest_settings
+
+
+class Command(BaseCommand):
+    help = 'Обработка очереди событий СКУД (режим приема через очередь)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Размер пакета (по умолчанию из SKUD_INGEST_SETTINGS)',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Максимальное количество пакетов за один запуск',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Работать постоянно, проверяя очередь с интервалом --interval',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Интервал проверки очереди в секундах для --loop (по умолчанию 1)',
+        )
+
+    def handle(self, *args, **options):
+        queue = get_ingest_queue()
+        backend = get_ingest_settings()['BACKEND']
+
+        self.stdout.write(f'📥 Очередь событий СКУД ({backend}): ожидает {queue.size()} событий')
+
+        while True:
+            result = queue.drain_all(
+                batch_size=options['batch_size'],
+                max_batches=options['max_batches'],
+            )
+
+            if result['processed'] or result['failed']:
+                self.stdout.write(
+                    f"✅ Обработано: {result['processed']}, "
+                    f"❌ ошибок: {result['failed']}, 📦 пакетов: {result['batches']}"
+                )
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('🎉 Обработка очереди завершена'))
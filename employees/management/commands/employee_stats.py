@@ -66,39 +66,42 @@ class Command(BaseCommand):
         # Получаем экземпляр интеграции с СКУД
         skud = get_skud_integration()
 
-        # Генерируем статистику
+        # Определяем сотрудников
         if options['employee_id']:
-            try:
-                employee = Employee.objects.get(employee_id=options['employee_id'])
-                stats = [skud.get_employee_statistics(employee, start_date, end_date)]
-            except Employee.DoesNotExist:
+            employees = Employee.objects.filter(employee_id=options['employee_id'])
+            if not employees.exists():
                 raise CommandError(f'Сотрудник с табельным номером {options["employee_id"]} не найден')
         else:
             # Статистика для всех активных сотрудников
-            active_employees = Employee.objects.filter(is_active=True)
-            stats = []
-            
-            for employee in active_employees:
-                try:
-                    employee_stats = skud.get_employee_statistics(employee, start_date, end_date)
-                    stats.append(employee_stats)
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f'Ошибка при получении статистики для {employee.full_name}: {str(e)}')
-                    )
+            employees = Employee.objects.filter(is_active=True)
+
+        # Генерируем статистику
+        stats = self.iter_stats(skud, employees, start_date, end_date)
 
         # Выводим результаты
-        self.output_results(stats, options['format'], options['output'])
+        if options['format'] == 'csv':
+            # CSV выводится по мере расчета, без накопления статистики в памяти
+            self.stream_csv(stats, options['output'])
+        else:
+            self.output_results(list(stats), options['format'], options['output'])
+
+    def iter_stats(self, skud, employees, start_date, end_date):
+        """Статистика сотрудников по одному (ошибки по сотруднику выводятся и пропускаются)"""
+        for employee in employees.iterator(chunk_size=500):
+            try:
+                yield skud.get_employee_statistics(employee, start_date, end_date)
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Ошибка при получении статистики для {employee.full_name}: {str(e)}')
+                )
 
     def output_results(self, stats, format_type, output_file):
-        """Вывод результатов в указанном формате"""
+        """Вывод результатов в указанном формате (кроме CSV, см. stream_csv)"""
         
         if format_type == 'table':
             self.output_table(stats)
         elif format_type == 'json':
             self.output_json(stats)
-        elif format_type == 'csv':
-            self.output_csv(stats)
 
         if output_file:
             self.save_to_file(stats, format_type, output_file)
@@ -145,19 +148,40 @@ class Command(BaseCommand):
         json_output = json.dumps(stats, ensure_ascii=False, indent=2)
         self.stdout.write(json_output)
 
-    def output_csv(self, stats):
-        """Вывод в формате CSV"""
+    def stream_csv(self, stats, output_file):
+        """Построчный вывод CSV в консоль и (если указан) в файл"""
         import csv
-        import io
-        
-        output = io.StringIO()
-        if stats:
-            fieldnames = stats[0].keys()
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(stats)
-        
-        self.stdout.write(output.getvalue())
+
+        file = None
+        if output_file:
+            try:
+                file = open(output_file, 'w', encoding='utf-8')
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Ошибка при сохранении файла: {str(e)}')
+                )
+
+        writers = []
+        try:
+            for stat in stats:
+                if not writers:
+                    # Колонки - по первой записи статистики
+                    fieldnames = stat.keys()
+                    writers = [csv.DictWriter(self.stdout, fieldnames=fieldnames)]
+                    if file:
+                        writers.append(csv.DictWriter(file, fieldnames=fieldnames))
+                    for writer in writers:
+                        writer.writeheader()
+                for writer in writers:
+                    writer.writerow(stat)
+        finally:
+            if file:
+                file.close()
+
+        if file:
+            self.stdout.write(
+                self.style.SUCCESS(f'Результаты сохранены в файл: {output_file}')
+            )
 
     def save_to_file(self, stats, format_type, filename):
         """Сохранение результатов в файл"""
@@ -166,13 +190,6 @@ class Command(BaseCommand):
                 if format_type == 'json':
                     import json
                     json.dump(stats, f, ensure_ascii=False, indent=2)
-                elif format_type == 'csv':
-                    import csv
-                    if stats:
-                        fieldnames = stats[0].keys()
-                        writer = csv.DictWriter(f, fieldnames=fieldnames)
-                        writer.writeheader()
-                        writer.writerows(stats)
                 else:  # table
                     f.write('Статистика сотрудников\n')
                     f.write('='*50 + '\n')
@@ -10,6 +10,7 @@ from collections import defaultdict
 
 from employees.models import Employee, SKUDEvent, WorkSession, WorkDaySummary
 from employees.work_time_processor import WorkTimeProcessor
+from employees.columnar_worktime import ColumnarWorkTimeEngine
 
 
 class Command(BaseCommand):
@@ -47,6 +48,16 @@ class Command(BaseCommand):
             action='store_true',
             help='Принудительная обработка уже обработанных событий',
         )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Применять новые события только к концу дня без пересоздания всех сессий',
+        )
+        parser.add_argument(
+            '--columnar',
+            action='store_true',
+            help='Колоночный пересчёт затронутых дней (NumPy), быстрее для больших объёмов',
+        )
         parser.add_argument(
             '--dry-run',
             action='store_true',
@@ -62,6 +73,7 @@ class Command(BaseCommand):
         self.verbosity = options['verbose']
         batch_size = options['batch_size']
         force_process = options['force_process']
+        incremental = options['incremental']
         dry_run = options['dry_run']
 
         # Парсим даты если указаны
@@ -121,6 +133,9 @@ class Command(BaseCommand):
 
         self.stdout.write(f'📊 Найдено событий для обработки: {total_events}')
 
+        if options['columnar'] and not dry_run:
+            return self._handle_columnar(events_query, total_events, batch_size)
+
         # Создаём процессор
         processor = WorkTimeProcessor()
 
@@ -145,7 +160,8 @@ class Command(BaseCommand):
                 self.stdout.write(f'⚠️  Событие {event.id} без сотрудника, пропускаем')
                 continue
                 
-            event_date = event.event_time.date()
+            # Инкрементальная обработка ведётся по местной дате, как и сессии
+            event_date = timezone.localdate(event.event_time) if incremental else event.event_time.date()
             key = (event.employee.id, event_date)
             events_by_employee_date[key].append(event)
 
@@ -170,7 +186,10 @@ class Command(BaseCommand):
                     # Обрабатываем события для этого сотрудника и даты
                     if not dry_run:
                         with transaction.atomic():
-                            success = processor.process_skud_events_for_employee(employee, event_date)
+                            if incremental:
+                                success = processor.process_new_events(employee, event_date, events)
+                            else:
+                                success = processor.process_skud_events_for_employee(employee, event_date)
                             
                             if success:
                                 # Помечаем события как обработанные
@@ -243,3 +262,44 @@ class Command(BaseCommand):
         
         if stats['errors'] > 0:
             self.stdout.write('\n💡 Совет: Проверьте логи ошибок для исправления проблемных данных')
+
+    def _handle_columnar(self, events_query, total_events, batch_size):
+        """Пересчёт затронутых дней колоночным движком"""
+        self.stdout.write('🧮 Колоночный режим обработки')
+
+        event_ids = []
+        pairs = set()
+        for event_id, employee_id, event_time in events_query.filter(
+            employee__isnull=False
+        ).values_list('id', 'employee_id', 'event_time').iterator(chunk_size=batch_size):
+            event_ids.append(event_id)
+            pairs.add((employee_id, timezone.localdate(event_time)))
+
+        skipped = total_events - len(event_ids)
+        if skipped:
+            self.stdout.write(f'⚠️  Событий без сотрудника: {skipped}, пропускаем')
+        if not pairs:
+            return
+
+        dates = [event_date for _, event_date in pairs]
+        employees = Employee.objects.filter(id__in={employee_id for employee_id, _ in pairs})
+        self.stdout.write(f'📊 Затронуто дней (сотрудник + дата): {len(pairs)}')
+
+        with transaction.atomic():
+            result = ColumnarWorkTimeEngine().rebuild(
+                min(dates), max(dates), employees=employees, pairs=pairs
+            )
+            for start in range(0, len(event_ids), batch_size):
+                SKUDEvent.objects.filter(
+                    id__in=event_ids[start:start + batch_size]
+                ).update(is_processed=True)
+
+        self.stdout.write('\n' + '='*60)
+        self.stdout.write(self.style.SUCCESS('📊 ИТОГОВАЯ СТАТИСТИКА'))
+        self.stdout.write('='*60)
+        self.stdout.write(f'📋 Обработано событий: {len(event_ids)}/{total_events}')
+        self.stdout.write(f'👥 Затронуто сотрудников: {len({employee_id for employee_id, _ in pairs})}')
+        self.stdout.write(f'📅 Затронуто дней: {len(pairs)}')
+        self.stdout.write(f'✅ Создано сессий: {result["sessions"]}')
+        self.stdout.write(f'✅ Создано сводок: {result["summaries_created"]}')
+        self.stdout.write(self.style.SUCCESS('\n🎉 Обработка завершена успешно!'))
@@ -0,0 +1,76 @@
+"""
+Management команда для приема событий СКУД по TCP/UDP
+"""
+
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from employees.skud_listener import SKUDFrameListener
+
+
+class Command(BaseCommand):
+    help = 'Прием событий от СКУД контроллеров по TCP/UDP (asyncio сервер)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='0.0.0.0',
+            help='Адрес для прослушивания (по умолчанию 0.0.0.0)',
+        )
+        parser.add_argument(
+            '--tcp-port',
+            type=int,
+            default=5000,
+            help='TCP порт (по умолчанию 5000, 0 - не слушать TCP)',
+        )
+        parser.add_argument(
+            '--udp-port',
+            type=int,
+            default=5000,
+            help='UDP порт (по умолчанию 5000, 0 - не слушать UDP)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество событий, после которого пакет сохраняется сразу (по умолчанию 500)',
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=float,
+            default=0.5,
+            help='Максимальное время накопления пакета в секундах (по умолчанию 0.5)',
+        )
+        parser.add_argument(
+            '--no-ack',
+            action='store_true',
+            help='Не отправлять ответы контроллерам по TCP',
+        )
+
+    def handle(self, *args, **options):
+        if not options['tcp_port'] and not options['udp_port']:
+            raise CommandError('Укажите хотя бы один порт: --tcp-port или --udp-port')
+
+        listener = SKUDFrameListener(
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            send_ack=not options['no_ack'],
+        )
+
+        self.stdout.write(f"🚀 Запуск СКУД listener на {options['host']}")
+        if options['tcp_port']:
+            self.stdout.write(f"📡 TCP порт: {options['tcp_port']}")
+        if options['udp_port']:
+            self.stdout.write(f"📡 UDP порт: {options['udp_port']}")
+
+        try:
+            asyncio.run(listener.serve(options['host'], options['tcp_port'], options['udp_port']))
+        except KeyboardInterrupt:
+            pass
+
+        stats = listener.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"🛑 Listener остановлен. Получено: {stats['received']}, "
+            f"сохранено: {stats['saved']}, ошибок: {stats['failed']}"
+        ))
@@ -4,17 +4,26 @@ Management команда для пересчёта исторических д
 
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, connections, transaction
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, date, timedelta
+import io
+import math
 import sys
 
+import django
+
 from employees.models import Employee, SKUDEvent, WorkSession, WorkDaySummary, WorkTimeAuditLog
 from employees.work_time_processor import WorkTimeProcessor
+from employees.columnar_worktime import ColumnarWorkTimeEngine
 
 
 class Command(BaseCommand):
     help = 'Пересчёт рабочих сессий и сводок для исторических данных'
 
+    # Частей на процесс: мелкие части выравнивают нагрузку между процессами
+    PARTITIONS_PER_WORKER = 4
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--from-date',
@@ -44,6 +53,17 @@ class Command(BaseCommand):
             action='store_true',
             help='Принудительное пересоздание существующих данных',
         )
+        parser.add_argument(
+            '--columnar',
+            action='store_true',
+            help='Колоночный пересчёт всего периода (NumPy), быстрее для больших периодов',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Количество процессов для параллельного пересчёта (по умолчанию 1)',
+        )
         parser.add_argument(
             '--dry-run',
             action='store_true',
@@ -103,128 +123,30 @@ class Command(BaseCommand):
 
         self.stdout.write(f'📊 Объём работы: {total_operations} операций ({total_days} дней × {total_employees} сотрудников)')
 
-        # Создаём процессор
-        processor = WorkTimeProcessor()
+        workers = self._get_workers(options['workers'])
+        columnar = options['columnar'] and not dry_run
 
         # Статистика
-        stats = {
-            'processed_employees': 0,
-            'processed_days': 0,
-            'created_sessions': 0,
-            'created_summaries': 0,
-            'updated_sessions': 0,
-            'updated_summaries': 0,
-            'deleted_sessions': 0,
-            'deleted_summaries': 0,
-            'errors': 0,
-            'skipped': 0
-        }
+        stats = self._new_stats()
 
         try:
-            # Обрабатываем каждого сотрудника
-            for i, employee in enumerate(employees, 1):
-                self.stdout.write(
-                    f'\n👤 [{i}/{total_employees}] Обработка: {employee.full_name} ({employee.employee_id})'
-                )
-                
-                # Обрабатываем каждый день
-                current_date = from_date
-                while current_date <= to_date:
-                    try:
-                        if self.verbosity:
-                            self.stdout.write(f'   📅 {current_date}', ending='')
-
-                        # Проверяем наличие данных для пересчёта
-                        existing_sessions = WorkSession.objects.filter(
-                            employee=employee, date=current_date
-                        ).count()
-                        
-                        existing_summaries = WorkDaySummary.objects.filter(
-                            employee=employee, date=current_date
-                        ).count()
-
-                        # Если данные существуют и не принудительный пересчёт
-                        if existing_sessions > 0 or existing_summaries > 0:
-                            if not force_rebuild:
-                                if self.verbosity:
-                                    self.stdout.write(f' - пропуск (данные существуют)', ending='')
-                                stats['skipped'] += 1
-                                current_date += timedelta(days=1)
-                                continue
-                            else:
-                                # Удаляем существующие данные
-                                if not dry_run:
-                                    deleted_sessions = WorkSession.objects.filter(
-                                        employee=employee, date=current_date
-                                    ).delete()[0]
-                                    
-                                    deleted_summaries = WorkDaySummary.objects.filter(
-                                        employee=employee, date=current_date
-                                    ).delete()[0]
-                                    
-                                    stats['deleted_sessions'] += deleted_sessions
-                                    stats['deleted_summaries'] += deleted_summaries
-
-                                if self.verbosity:
-                                    self.stdout.write(f' - пересоздание', ending='')
-
-                        # Проверяем наличие событий СКУД
-                        skud_events = SKUDEvent.objects.filter(
-                            employee=employee,
-                            event_time__date=current_date
-                        ).exists()
-
-                        if not skud_events:
-                            if self.verbosity:
-                                self.stdout.write(f' - нет событий', ending='')
-                            stats['skipped'] += 1
-                            current_date += timedelta(days=1)
-                            continue
-
-                        # Обрабатываем данные
-                        if not dry_run:
-                            with transaction.atomic():
-                                success = processor.process_skud_events_for_employee(
-                                    employee, current_date
-                                )
-                                
-                                if success:
-                                    # Подсчитываем созданные данные
-                                    new_sessions = WorkSession.objects.filter(
-                                        employee=employee, date=current_date
-                                    ).count()
-                                    
-                                    new_summaries = WorkDaySummary.objects.filter(
-                                        employee=employee, date=current_date
-                                    ).count()
-                                    
-                                    stats['created_sessions'] += new_sessions
-                                    stats['created_summaries'] += new_summaries
-                                    
-                                    if self.verbosity:
-                                        self.stdout.write(f' - ✅ создано {new_sessions} сессий, {new_summaries} сводок', ending='')
-                                else:
-                                    stats['errors'] += 1
-                                    if self.verbosity:
-                                        self.stdout.write(f' - ❌ ошибка', ending='')
-                        else:
-                            if self.verbosity:
-                                self.stdout.write(f' - будет обработан', ending='')
-
-                        stats['processed_days'] += 1
-
-                    except Exception as e:
-                        stats['errors'] += 1
-                        if self.verbosity:
-                            self.stdout.write(f' - ❌ ошибка: {str(e)}', ending='')
-                        else:
-                            self.stdout.write(f'   ❌ Ошибка {current_date}: {str(e)}')
-
-                    current_date += timedelta(days=1)
-                    if self.verbosity:
-                        self.stdout.write()  # Новая строка
-
-                stats['processed_employees'] += 1
+            if workers > 1:
+                self._rebuild_parallel(employees, from_date, to_date, force_rebuild, dry_run, columnar, workers, stats)
+            elif columnar:
+                self._merge_stats(stats, self._rebuild_columnar_with_fallback(
+                    employees, from_date, to_date, force_rebuild
+                ))
+            else:
+                # Создаём процессор
+                processor = WorkTimeProcessor()
+
+                # Обрабатываем каждого сотрудника
+                for i, employee in enumerate(employees, 1):
+                    self.stdout.write(
+                        f'\n👤 [{i}/{total_employees}] Обработка: {employee.full_name} ({employee.employee_id})'
+                    )
+                    self._rebuild_employee(employee, from_date, to_date, processor, stats, force_rebuild, dry_run)
+                    stats['processed_employees'] += 1
 
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING('\n⚠️  Остановлено пользователем'))
@@ -281,3 +203,242 @@ class Command(BaseCommand):
         
         if stats['errors'] > 0:
             self.stdout.write('\n💡 Совет: Проверьте логи ошибок и исправьте проблемные данные')
+
+    def _new_stats(self):
+        return {
+            'processed_employees': 0,
+            'processed_days': 0,
+            'created_sessions': 0,
+            'created_summaries': 0,
+            'updated_sessions': 0,
+            'updated_summaries': 0,
+            'deleted_sessions': 0,
+            'deleted_summaries': 0,
+            'errors': 0,
+            'skipped': 0
+        }
+
+    def _merge_stats(self, stats, partition_stats):
+        for key, value in partition_stats.items():
+            stats[key] += value
+
+    def _get_workers(self, workers):
+        """Количество процессов с учётом ограничений базы данных"""
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite не поддерживает параллельную запись из нескольких процессов
+            self.stdout.write(self.style.WARNING('⚠️  SQLite не поддерживает параллельную запись, используется 1 процесс'))
+            return 1
+        return max(workers, 1)
+
+    def _rebuild_employee(self, employee, from_date, to_date, processor, stats, force_rebuild, dry_run):
+        """Пересчёт всех дней периода для одного сотрудника"""
+        # Обрабатываем каждый день
+        current_date = from_date
+        while current_date <= to_date:
+            try:
+                if self.verbosity:
+                    self.stdout.write(f'   📅 {current_date}', ending='')
+
+                # Проверяем наличие данных для пересчёта
+                existing_sessions = WorkSession.objects.filter(
+                    employee=employee, date=current_date
+                ).count()
+                
+                existing_summaries = WorkDaySummary.objects.filter(
+                    employee=employee, date=current_date
+                ).count()
+
+                # Если данные существуют и не принудительный пересчёт
+                if existing_sessions > 0 or existing_summaries > 0:
+                    if not force_rebuild:
+                        if self.verbosity:
+                            self.stdout.write(f' - пропуск (данные существуют)', ending='')
+                        stats['skipped'] += 1
+                        current_date += timedelta(days=1)
+                        continue
+                    else:
+                        # Удаляем существующие данные
+                        if not dry_run:
+                            deleted_sessions = WorkSession.objects.filter(
+                                employee=employee, date=current_date
+                            ).delete()[0]
+                            
+                            deleted_summaries = WorkDaySummary.objects.filter(
+                                employee=employee, date=current_date
+                            ).delete()[0]
+                            
+                            stats['deleted_sessions'] += deleted_sessions
+                            stats['deleted_summaries'] += deleted_summaries
+
+                        if self.verbosity:
+                            self.stdout.write(f' - пересоздание', ending='')
+
+                # Проверяем наличие событий СКУД
+                skud_events = SKUDEvent.objects.filter(
+                    employee=employee,
+                    event_time__date=current_date
+                ).exists()
+
+                if not skud_events:
+                    if self.verbosity:
+                        self.stdout.write(f' - нет событий', ending='')
+                    stats['skipped'] += 1
+                    current_date += timedelta(days=1)
+                    continue
+
+                # Обрабатываем данные
+                if not dry_run:
+                    with transaction.atomic():
+                        success = processor.process_skud_events_for_employee(
+                            employee, current_date
+                        )
+                        
+                        if success:
+                            # Подсчитываем созданные данные
+                            new_sessions = WorkSession.objects.filter(
+                                employee=employee, date=current_date
+                            ).count()
+                            
+                            new_summaries = WorkDaySummary.objects.filter(
+                                employee=employee, date=current_date
+                            ).count()
+                            
+                            stats['created_sessions'] += new_sessions
+                            stats['created_summaries'] += new_summaries
+                            
+                            if self.verbosity:
+                                self.stdout.write(f' - ✅ создано {new_sessions} сессий, {new_summaries} сводок', ending='')
+                        else:
+                            stats['errors'] += 1
+                            if self.verbosity:
+                                self.stdout.write(f' - ❌ ошибка', ending='')
+                else:
+                    if self.verbosity:
+                        self.stdout.write(f' - будет обработан', ending='')
+
+                stats['processed_days'] += 1
+
+            except Exception as e:
+                stats['errors'] += 1
+                if self.verbosity:
+                    self.stdout.write(f' - ❌ ошибка: {str(e)}', ending='')
+                else:
+                    self.stdout.write(f'   ❌ Ошибка {current_date}: {str(e)}')
+
+            current_date += timedelta(days=1)
+            if self.verbosity:
+                self.stdout.write()  # Новая строка
+
+    def _rebuild_columnar(self, employees, from_date, to_date, force_rebuild):
+        """Пересчёт всего периода колоночным движком"""
+        if isinstance(employees, list):
+            employees = Employee.objects.filter(id__in=[employee.id for employee in employees])
+
+        self.stdout.write('🧮 Колоночный режим пересчёта')
+        stats = self._new_stats()
+
+        with transaction.atomic():
+            if force_rebuild:
+                stats['deleted_sessions'] = WorkSession.objects.filter(
+                    employee__in=employees, date__gte=from_date, date__lte=to_date
+                ).delete()[0]
+                stats['deleted_summaries'] = WorkDaySummary.objects.filter(
+                    employee__in=employees, date__gte=from_date, date__lte=to_date
+                ).delete()[0]
+
+            result = ColumnarWorkTimeEngine().rebuild(
+                from_date, to_date, employees=employees, skip_existing=not force_rebuild
+            )
+
+        stats['processed_employees'] = employees.count()
+        stats['processed_days'] = result['summaries_created'] + result['summaries_updated']
+        stats['created_sessions'] = result['sessions']
+        stats['created_summaries'] = result['summaries_created'] + result['summaries_updated']
+        stats['skipped'] = result['skipped']
+        return stats
+
+    def _rebuild_columnar_with_fallback(self, employees, from_date, to_date, force_rebuild):
+        """
+        Колоночный пересчёт, при ошибке - по одному сотруднику
+
+        Ошибку получают только сотрудники, пересчёт которых не удался,
+        статистика остальных сохраняется.
+        """
+        if isinstance(employees, list):
+            employees = Employee.objects.filter(id__in=[employee.id for employee in employees])
+
+        try:
+            return self._rebuild_columnar(employees, from_date, to_date, force_rebuild)
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'⚠️  Ошибка колоночного пересчёта, пересчёт по сотрудникам: {str(e)}'))
+
+        stats = self._new_stats()
+        for employee in employees:
+            try:
+                self._merge_stats(stats, self._rebuild_columnar(
+                    Employee.objects.filter(id=employee.id), from_date, to_date, force_rebuild
+                ))
+            except Exception as e:
+                stats['errors'] += 1
+                self.stdout.write(self.style.ERROR(f'   ❌ Ошибка для {employee.full_name}: {str(e)}'))
+        return stats
+
+    def _rebuild_parallel(self, employees, from_date, to_date, force_rebuild, dry_run, columnar, workers, stats):
+        """Пересчёт в пуле процессов, сотрудники разбиты на части"""
+        employee_ids = [employee.id for employee in employees]
+        partition_size = max(math.ceil(len(employee_ids) / (workers * self.PARTITIONS_PER_WORKER)), 1)
+        partitions = [
+            employee_ids[start:start + partition_size]
+            for start in range(0, len(employee_ids), partition_size)
+        ]
+
+        self.stdout.write(f'⚙️  Процессов: {workers}, частей: {len(partitions)} (по {partition_size} сотрудников)')
+
+        # Каждый процесс открывает собственные соединения с БД
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            futures = {
+                executor.submit(
+                    rebuild_partition, partition, from_date, to_date, force_rebuild, dry_run, columnar
+                ): partition
+                for partition in partitions
+            }
+
+            for done, future in enumerate(as_completed(futures), 1):
+                partition = futures[future]
+                try:
+                    self._merge_stats(stats, future.result())
+                except Exception as e:
+                    # Процесс пула упал (ошибки сотрудников учитываются в rebuild_partition):
+                    # результат части неизвестен, ошибка засчитывается каждому её сотруднику
+                    stats['errors'] += len(partition)
+                    self.stdout.write(self.style.ERROR(
+                        f'   ❌ Ошибка в части из {len(partition)} сотрудников: {str(e)}'
+                    ))
+
+                self.stdout.write(
+                    f'   [{done}/{len(partitions)}] 👥 {stats["processed_employees"]}/{len(employee_ids)} сотрудников, '
+                    f'📅 {stats["processed_days"]} дней, ❌ {stats["errors"]} ошибок'
+                )
+
+
+def rebuild_partition(employee_ids, from_date, to_date, force_rebuild, dry_run, columnar):
+    """Пересчёт части сотрудников в процессе пула, возвращает статистику"""
+    command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+    command.verbosity = False
+    employees = Employee.objects.filter(id__in=employee_ids)
+
+    if columnar:
+        return command._rebuild_columnar_with_fallback(employees, from_date, to_date, force_rebuild)
+
+    stats = command._new_stats()
+    processor = WorkTimeProcessor()
+    for employee in employees:
+        # Ошибка сотрудника не отменяет статистику уже пересчитанных
+        try:
+            command._rebuild_employee(employee, from_date, to_date, processor, stats, force_rebuild, dry_run)
+            stats['processed_employees'] += 1
+        except Exception:
+            stats['errors'] += 1
+    return stats
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:36
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0007_add_skud_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SKUDCard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('card_number', models.CharField(max_length=50, unique=True, verbose_name='Номер карты')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('description', models.CharField(blank=True, max_length=200, verbose_name='Описание')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skud_cards', to='employees.employee', verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Карта СКУД',
+                'verbose_name_plural': 'Карты СКУД',
+                'ordering': ['card_number'],
+            },
+        ),
+    ]
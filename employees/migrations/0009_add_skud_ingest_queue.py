@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0008_add_skud_card'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SKUDIngestItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_ip', models.GenericIPAddressField(verbose_name='IP адрес устройства')),
+                ('payload', models.JSONField(verbose_name='Данные события')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Время получения')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток обработки')),
+                ('is_failed', models.BooleanField(db_index=True, default=False, verbose_name='Ошибка обработки')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+            ],
+            options={
+                'verbose_name': 'Событие СКУД в очереди',
+                'verbose_name_plural': 'Очередь событий СКУД',
+                'ordering': ['id'],
+            },
+        ),
+    ]
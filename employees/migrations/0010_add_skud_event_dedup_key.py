@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0009_add_skud_ingest_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skudevent',
+            name='dedup_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Ключ дедупликации'),
+        ),
+        migrations.AddField(
+            model_name='skudevent',
+            name='device_sequence',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Порядковый номер на устройстве'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0010_add_skud_event_dedup_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workdaysummary',
+            name='last_event_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последнее обработанное событие'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0011_add_summary_last_event_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkDayDirtyMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('reason', models.CharField(choices=[('event', 'Новое событие СКУД'), ('manual', 'Ручная корректировка'), ('absence', 'Отпуск или командировка'), ('schedule', 'Изменение ставки или нормы часов')], max_length=20, verbose_name='Причина')),
+                ('marked_at', models.DateTimeField(auto_now_add=True, verbose_name='Время отметки')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dirty_days', to='employees.employee', verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'День к пересчёту',
+                'verbose_name_plural': 'Дни к пересчёту',
+                'ordering': ['date', 'id'],
+                'unique_together': {('employee', 'date')},
+            },
+        ),
+    ]
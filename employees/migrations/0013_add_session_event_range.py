@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_session_event_range(apps, schema_editor):
+    """Заполнение событий начала/окончания по существующей таблице связей"""
+    WorkSession = apps.get_model('employees', 'WorkSession')
+    SessionEvents = WorkSession.source_events.through
+
+    links = {}
+    for session_id, event_id in SessionEvents.objects.order_by(
+        'worksession_id', 'skudevent__event_time', 'skudevent_id'
+    ).values_list('worksession_id', 'skudevent_id').iterator(chunk_size=10000):
+        links.setdefault(session_id, []).append(event_id)
+
+    session_ids = list(links)
+    for start in range(0, len(session_ids), 1000):
+        sessions = list(WorkSession.objects.filter(id__in=session_ids[start:start + 1000]))
+        for session in sessions:
+            event_ids = links[session.id]
+            session.start_event_id = event_ids[0]
+            session.end_event_id = event_ids[-1] if session.end_time and len(event_ids) > 1 else None
+            session.event_count = len(event_ids)
+        WorkSession.objects.bulk_update(sessions, ['start_event', 'end_event', 'event_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0012_add_work_day_dirty_mark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='worksession',
+            name='end_event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='employees.skudevent', verbose_name='Событие окончания'),
+        ),
+        migrations.AddField(
+            model_name='worksession',
+            name='event_count',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Количество событий'),
+        ),
+        migrations.AddField(
+            model_name='worksession',
+            name='start_event',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='employees.skudevent', verbose_name='Событие начала'),
+        ),
+        migrations.RunPython(fill_session_event_range, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:58
+
+from datetime import time
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_month_summaries(apps, schema_editor):
+    """Заполнение сводок за месяц по существующим дневным сводкам"""
+    WorkDaySummary = apps.get_model('employees', 'WorkDaySummary')
+    EmployeeMonthSummary = apps.get_model('employees', 'EmployeeMonthSummary')
+
+    totals = {}
+    for row in WorkDaySummary.objects.values(
+        'employee_id', 'date', 'total_seconds_in_office', 'expected_seconds',
+        'overtime_seconds', 'underwork_seconds', 'status', 'sessions_count',
+        'has_missing_exit', 'has_manual_corrections', 'first_entry', 'employee__work_start_time',
+    ).order_by().iterator(chunk_size=10000):
+        key = (row['employee_id'], row['date'].replace(day=1))
+        summary = totals.get(key)
+        if summary is None:
+            summary = totals[key] = EmployeeMonthSummary(employee_id=key[0], month=key[1])
+
+        summary.total_seconds_in_office += row['total_seconds_in_office']
+        summary.expected_seconds += row['expected_seconds']
+        summary.overtime_seconds += max(row['overtime_seconds'], 0)
+        summary.underwork_seconds += max(row['underwork_seconds'], 0)
+        summary.days_count += 1
+        setattr(summary, f"{row['status']}_days", getattr(summary, f"{row['status']}_days") + 1)
+        summary.days_with_sessions += row['sessions_count'] > 0
+        summary.flagged_days += row['has_missing_exit'] or row['has_manual_corrections']
+        if row['first_entry'] is not None:
+            work_start = row['employee__work_start_time'] or time(9, 0)
+            summary.late_days += timezone.localtime(row['first_entry']).time() > work_start
+
+    EmployeeMonthSummary.objects.bulk_create(totals.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0013_add_session_event_range'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeMonthSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Первый день месяца', verbose_name='Месяц')),
+                ('total_seconds_in_office', models.PositiveIntegerField(default=0, verbose_name='Отработано (секунды)')),
+                ('expected_seconds', models.PositiveIntegerField(default=0, verbose_name='Ожидаемое время (секунды)')),
+                ('overtime_seconds', models.PositiveIntegerField(default=0, verbose_name='Переработка (секунды)')),
+                ('underwork_seconds', models.PositiveIntegerField(default=0, verbose_name='Недоработка (секунды)')),
+                ('days_count', models.PositiveSmallIntegerField(default=0, verbose_name='Дней со сводкой')),
+                ('present_days', models.PositiveSmallIntegerField(default=0, verbose_name='Присутствовал')),
+                ('partial_days', models.PositiveSmallIntegerField(default=0, verbose_name='Частично присутствовал')),
+                ('absent_days', models.PositiveSmallIntegerField(default=0, verbose_name='Отсутствовал')),
+                ('excused_days', models.PositiveSmallIntegerField(default=0, verbose_name='Уважительная причина')),
+                ('problem_days', models.PositiveSmallIntegerField(default=0, verbose_name='Проблема (нет выхода)')),
+                ('days_with_sessions', models.PositiveSmallIntegerField(default=0, verbose_name='Дней с сессиями')),
+                ('flagged_days', models.PositiveSmallIntegerField(default=0, verbose_name='Дней с незакрытыми сессиями или корректировками')),
+                ('late_days', models.PositiveSmallIntegerField(default=0, verbose_name='Дней с опозданием')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='month_summaries', to='employees.employee', verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Сводка за месяц',
+                'verbose_name_plural': 'Сводки за месяц',
+                'ordering': ['-month', 'employee'],
+                'indexes': [models.Index(fields=['month', 'employee'], name='employees_e_month_edc5bd_idx')],
+                'unique_together': {('employee', 'month')},
+            },
+        ),
+        migrations.RunPython(fill_month_summaries, migrations.RunPython.noop),
+    ]
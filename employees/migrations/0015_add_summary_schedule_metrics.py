@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:01
+
+import math
+from datetime import datetime, time
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_schedule_metrics(apps, schema_editor):
+    """Заполнение опозданий, ранних уходов и недобора по существующим сводкам"""
+    WorkDaySummary = apps.get_model('employees', 'WorkDaySummary')
+    EmployeeMonthSummary = apps.get_model('employees', 'EmployeeMonthSummary')
+
+    changed = []
+    for summary in WorkDaySummary.objects.filter(sessions_count__gt=0).exclude(status='excused').select_related(
+        'employee'
+    ).only(
+        'date', 'first_entry', 'last_exit', 'total_seconds_in_office', 'expected_seconds', 'has_missing_exit',
+        'employee__work_start_time', 'employee__work_end_time',
+    ):
+        work_start = summary.employee.work_start_time or time(9, 0)
+        work_end = summary.employee.work_end_time
+
+        start_datetime = timezone.make_aware(datetime.combine(summary.date, work_start))
+        if summary.first_entry and summary.first_entry > start_datetime:
+            summary.late_minutes = math.ceil((summary.first_entry - start_datetime).total_seconds() / 60)
+
+        if work_end and work_end > work_start and summary.last_exit and not summary.has_missing_exit:
+            end_datetime = timezone.make_aware(datetime.combine(summary.date, work_end))
+            if summary.last_exit < end_datetime:
+                summary.early_leave_minutes = math.ceil((end_datetime - summary.last_exit).total_seconds() / 60)
+
+        worked_seconds = 0 if summary.has_missing_exit else summary.total_seconds_in_office
+        summary.shortfall_seconds = max(summary.expected_seconds - worked_seconds, 0)
+        changed.append(summary)
+
+    WorkDaySummary.objects.bulk_update(
+        changed, ['late_minutes', 'early_leave_minutes', 'shortfall_seconds'], batch_size=2000
+    )
+
+    # Опоздания в сводках за месяц теперь считаются по late_minutes
+    late_days = {}
+    for row in WorkDaySummary.objects.values('employee_id', 'date').filter(late_minutes__gt=0).order_by():
+        key = (row['employee_id'], row['date'].replace(day=1))
+        late_days[key] = late_days.get(key, 0) + 1
+
+    months = list(EmployeeMonthSummary.objects.all())
+    for month_summary in months:
+        month_summary.late_days = late_days.get((month_summary.employee_id, month_summary.month), 0)
+    EmployeeMonthSummary.objects.bulk_update(months, ['late_days'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0014_add_employee_month_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workdaysummary',
+            name='early_leave_minutes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Ранний уход (минуты)'),
+        ),
+        migrations.AddField(
+            model_name='workdaysummary',
+            name='late_minutes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Опоздание (минуты)'),
+        ),
+        migrations.AddField(
+            model_name='workdaysummary',
+            name='shortfall_seconds',
+            field=models.PositiveIntegerField(default=0, help_text='В дни присутствия; при незакрытой сессии - вся норма дня', verbose_name='Недобор времени (секунды)'),
+        ),
+        migrations.AlterField(
+            model_name='workdaydirtymark',
+            name='reason',
+            field=models.CharField(choices=[('event', 'Новое событие СКУД'), ('manual', 'Ручная корректировка'), ('absence', 'Отпуск или командировка'), ('schedule', 'Изменение ставки, нормы часов или графика')], max_length=20, verbose_name='Причина'),
+        ),
+        migrations.RunPython(fill_schedule_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:06
+
+from django.db import migrations, models
+
+
+def fill_birth_month_day(apps, schema_editor):
+    """Заполнение ключа дня рождения у существующих сотрудников"""
+    Employee = apps.get_model('employees', 'Employee')
+
+    employees = []
+    for employee in Employee.objects.exclude(birth_date__isnull=True).only('id', 'birth_date'):
+        employee.birth_month_day = employee.birth_date.month * 100 + employee.birth_date.day
+        employees.append(employee)
+    Employee.objects.bulk_update(employees, ['birth_month_day'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0015_add_summary_schedule_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='birth_month_day',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='День рождения (месяц * 100 + день)'),
+        ),
+        migrations.RunPython(fill_birth_month_day, migrations.RunPython.noop),
+    ]
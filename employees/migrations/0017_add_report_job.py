@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:18
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0016_add_employee_birth_month_day'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('report_type', models.CharField(choices=[('monthly_xlsx', 'Месячный отчёт (Excel)'), ('monthly_csv', 'Месячный отчёт (CSV)'), ('employee_detailed', 'Детальный отчёт по сотруднику'), ('department_statistics', 'Статистика отдела')], max_length=30, verbose_name='Тип отчёта')),
+                ('params', models.JSONField(default=dict, verbose_name='Параметры')),
+                ('params_hash', models.CharField(db_index=True, help_text='Одинаковый у заданий с одним типом отчёта и одинаковыми параметрами', max_length=64, verbose_name='Хэш параметров')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Формируется'), ('done', 'Готов'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=20, verbose_name='Статус')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс (%)')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('file', models.FileField(blank=True, upload_to='reports/%Y/%m/', verbose_name='Файл отчёта')),
+                ('filename', models.CharField(blank=True, max_length=255, verbose_name='Имя файла')),
+                ('data_version', models.CharField(blank=True, max_length=64, verbose_name='Версия данных')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало формирования')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание формирования')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Заказал')),
+            ],
+            options={
+                'verbose_name': 'Задание на отчёт',
+                'verbose_name_plural': 'Задания на отчёты',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['params_hash', 'status'], name='employees_r_params__2a2c1a_idx'), models.Index(fields=['status', 'created_at'], name='employees_r_status_33e64e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0017_add_report_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workdaydirtymark',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток пересчёта'),
+        ),
+        migrations.AddField(
+            model_name='workdaydirtymark',
+            name='is_failed',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Ошибка пересчёта'),
+        ),
+        migrations.AddField(
+            model_name='workdaydirtymark',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='Последняя ошибка'),
+        ),
+    ]
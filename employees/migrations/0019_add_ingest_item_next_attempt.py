@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0018_add_dirty_mark_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='skudingestitem',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Следующая попытка не раньше'),
+        ),
+    ]
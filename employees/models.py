@@ -3,7 +3,10 @@ from django.contrib.auth.models import User
 from turbodrf.mixins import TurboDRFMixin
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from decimal import Decimal
+from datetime import timezone as dt_timezone
+import hashlib
 import uuid
 
 
@@ -160,6 +163,13 @@ class Employee(models.Model, TurboDRFMixin):
     
     # Личные данные
     birth_date = models.DateField(verbose_name="Дата рождения")
+    birth_month_day = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        verbose_name="День рождения (месяц * 100 + день)"
+    )
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, verbose_name="Пол")
     pinfl = models.CharField(
         max_length=14, 
@@ -247,6 +257,17 @@ class Employee(models.Model, TurboDRFMixin):
     def __str__(self):
         return f"{self.last_name} {self.first_name} {self.middle_name}".strip()
 
+    def save(self, *args, **kwargs):
+        # Ключ для поиска ближайших дней рождения (см. employees.birthdays)
+        birth_date = self.birth_date
+        if isinstance(birth_date, str):
+            birth_date = parse_date(birth_date)
+        self.birth_month_day = birth_date.month * 100 + birth_date.day if birth_date else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'birth_date' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'birth_month_day'}
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return f"{self.last_name} {self.first_name} {self.middle_name}".strip()
@@ -373,10 +394,16 @@ class Employee(models.Model, TurboDRFMixin):
         if date is None:
             date = timezone.now().date()
         
+        from .absence_calendar import absence_calendar
+        
         # Проверяем, есть ли отпуск или командировка на эту дату
-        if self.has_vacation_on_date(date) or self.has_business_trip_on_date(date):
+        if absence_calendar.is_excused(self.id, date):
             return 0
         
+        return self.get_base_daily_seconds()
+    
+    def get_base_daily_seconds(self):
+        """Ожидаемое количество секунд работы в день без учёта отпусков и командировок"""
         # Рассчитываем ожидаемые секунды: стандартные часы * ставка * 3600
         expected_hours = self.daily_hours * self.work_fraction
         return int(expected_hours * 3600)
@@ -386,7 +413,7 @@ class Employee(models.Model, TurboDRFMixin):
         return self.vacations.filter(
             start_date__lte=date,
             end_date__gte=date,
-            status__in=['approved', 'taken']
+            status__in=Vacation.EXCUSED_STATUSES
         ).exists()
     
     def has_business_trip_on_date(self, date):
@@ -394,7 +421,7 @@ class Employee(models.Model, TurboDRFMixin):
         return self.business_trips.filter(
             start_date__lte=date,
             end_date__gte=date,
-            status__in=['approved', 'in_progress']
+            status__in=BusinessTrip.EXCUSED_STATUSES
         ).exists()
 
     @classmethod
@@ -419,6 +446,9 @@ class Vacation(models.Model, TurboDRFMixin):
         ('cancelled', 'Отменен'),
     ]
 
+    # Статусы, при которых сотрудник отсутствует по уважительной причине
+    EXCUSED_STATUSES = ['approved', 'taken']
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE,
                                related_name='vacations', verbose_name="Сотрудник")
@@ -461,6 +491,9 @@ class BusinessTrip(models.Model, TurboDRFMixin):
         ('cancelled', 'Отменена'),
     ]
 
+    # Статусы, при которых сотрудник отсутствует по уважительной причине
+    EXCUSED_STATUSES = ['approved', 'in_progress']
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE,
                                related_name='business_trips', verbose_name="Сотрудник")
@@ -558,6 +591,36 @@ class SKUDDevice(models.Model):
             },
         }
 
+class SKUDCard(models.Model):
+    """Модель карты доступа СКУД (у сотрудника может быть несколько карт)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    card_number = models.CharField(max_length=50, unique=True, verbose_name="Номер карты")
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE,
+                               related_name='skud_cards', verbose_name="Сотрудник")
+    is_active = models.BooleanField(default=True, verbose_name="Активна")
+    description = models.CharField(max_length=200, blank=True, verbose_name="Описание")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Карта СКУД"
+        verbose_name_plural = "Карты СКУД"
+        ordering = ['card_number']
+
+    def __str__(self):
+        return f"{self.card_number} - {self.employee.full_name}"
+
+    @classmethod
+    def turbodrf(cls):
+        return {
+            'fields': {
+                'card_number': 'Номер карты',
+                'employee': 'Сотрудник',
+                'is_active': 'Активна',
+                'description': 'Описание',
+            },
+        }
+
 class SKUDEvent(models.Model):
     """Модель события СКУД (проход через устройство)"""
     EVENT_TYPES = [
@@ -577,6 +640,10 @@ class SKUDEvent(models.Model):
                                 verbose_name="Тип события")
     event_time = models.DateTimeField(verbose_name="Время события")
     raw_data = models.TextField(blank=True, verbose_name="Исходные данные")
+    device_sequence = models.PositiveBigIntegerField(null=True, blank=True,
+                                                   verbose_name="Порядковый номер на устройстве")
+    dedup_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False,
+                               verbose_name="Ключ дедупликации")
     is_processed = models.BooleanField(default=False, verbose_name="Обработано")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
 
@@ -589,6 +656,26 @@ class SKUDEvent(models.Model):
         employee_name = self.employee.full_name if self.employee else "Неизвестный"
         return f"{employee_name} - {self.get_event_type_display()} ({self.event_time})"
 
+    @staticmethod
+    def build_dedup_key(device_id, card_number, event_type, event_time=None, device_sequence=None):
+        """
+        Детерминированный ключ события для отбрасывания повторных отправок
+
+        Повтор можно распознать только по времени события от устройства или
+        по порядковому номеру, поэтому без них ключ не строится (None).
+        """
+        if event_time is None and device_sequence is None:
+            return None
+
+        parts = [
+            str(device_id),
+            card_number or '',
+            event_type,
+            event_time.astimezone(dt_timezone.utc).isoformat() if event_time else '',
+            str(device_sequence) if device_sequence is not None else '',
+        ]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
     @classmethod
     def turbodrf(cls):
         return {
@@ -603,6 +690,52 @@ class SKUDEvent(models.Model):
             },
         }
 
+class SKUDIngestItem(models.Model):
+    """Сырое событие СКУД в очереди на обработку (режим приема через очередь)"""
+    device_ip = models.GenericIPAddressField(verbose_name="IP адрес устройства")
+    payload = models.JSONField(verbose_name="Данные события")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="Время получения")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток обработки")
+    next_attempt_at = models.DateTimeField(null=True, blank=True, db_index=True,
+                                           verbose_name="Следующая попытка не раньше")
+    is_failed = models.BooleanField(default=False, db_index=True, verbose_name="Ошибка обработки")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+
+    class Meta:
+        verbose_name = "Событие СКУД в очереди"
+        verbose_name_plural = "Очередь событий СКУД"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.device_ip} - {self.received_at}"
+
+class WorkDayDirtyMark(models.Model):
+    """День сотрудника, который нужно пересчитать (сессии и сводка)"""
+    REASON_CHOICES = [
+        ('event', 'Новое событие СКУД'),
+        ('manual', 'Ручная корректировка'),
+        ('absence', 'Отпуск или командировка'),
+        ('schedule', 'Изменение ставки, нормы часов или графика'),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE,
+                               related_name='dirty_days', verbose_name="Сотрудник")
+    date = models.DateField(verbose_name="Дата")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, verbose_name="Причина")
+    marked_at = models.DateTimeField(auto_now_add=True, verbose_name="Время отметки")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток пересчёта")
+    is_failed = models.BooleanField(default=False, db_index=True, verbose_name="Ошибка пересчёта")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+
+    class Meta:
+        verbose_name = "День к пересчёту"
+        verbose_name_plural = "Дни к пересчёту"
+        ordering = ['date', 'id']
+        unique_together = ['employee', 'date']
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.date} ({self.get_reason_display()})"
+
 class WorkTimeRecord(models.Model, TurboDRFMixin):
     """Модель записи рабочего времени (для интеграции с СКУД)"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -633,7 +766,16 @@ class WorkTimeRecord(models.Model, TurboDRFMixin):
         return f"{self.employee.full_name} - {self.date}"
 
     def save(self, *args, **kwargs):
-        # Автоматический расчет общего времени работы
+        self.calculate_total_hours()
+        super().save(*args, **kwargs)
+
+    def calculate_total_hours(self):
+        """
+        Автоматический расчет общего времени работы
+
+        Вынесен из save(), чтобы его можно было вызывать перед bulk_create/bulk_update,
+        которые обходят save().
+        """
         if self.arrival_time and self.departure_time:
             # Преобразуем время в минуты для расчета
             arrival_minutes = self.arrival_time.hour * 60 + self.arrival_time.minute
@@ -646,8 +788,6 @@ class WorkTimeRecord(models.Model, TurboDRFMixin):
             total_minutes = departure_minutes - arrival_minutes
             self.total_hours = round(total_minutes / 60, 2)
             self.is_present = True
-        
-        super().save(*args, **kwargs)
 
 
 class WorkSession(models.Model):
@@ -684,7 +824,7 @@ class WorkSession(models.Model):
         verbose_name="Статус сессии"
     )
     
-    # Связь с событиями СКУД
+    # Связь с событиями СКУД (таблица связей заполняется при SESSION_EVENT_LINKAGE = 'm2m')
     source_events = models.ManyToManyField(
         SKUDEvent, 
         blank=True,
@@ -692,6 +832,26 @@ class WorkSession(models.Model):
         verbose_name="Исходные события СКУД"
     )
     
+    # Компактная связь: события входа и выхода, события сессии восстанавливаются по времени
+    start_event = models.ForeignKey(
+        SKUDEvent,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='+',
+        verbose_name="Событие начала"
+    )
+    end_event = models.ForeignKey(
+        SKUDEvent,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='+',
+        verbose_name="Событие окончания"
+    )
+    event_count = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Количество событий"
+    )
+    
     # Ручные корректировки
     manual_reason = models.TextField(
         blank=True,
@@ -725,16 +885,35 @@ class WorkSession(models.Model):
             return f"{self.employee.full_name} - {self.date} ({self.start_time.time()} - открыта)"
     
     def save(self, *args, **kwargs):
-        # Автоматический расчёт длительности
+        self.calculate_duration()
+        super().save(*args, **kwargs)
+    
+    def calculate_duration(self):
+        """Автоматический расчёт длительности (вызывается и перед bulk_create)"""
         if self.start_time and self.end_time:
             delta = self.end_time - self.start_time
             self.duration_seconds = int(delta.total_seconds())
         elif self.start_time and self.status == 'open':
-            # Для открытых сессий считаем до текущего времени
+            # Для открытых сессий считаем до текущего времени (вход "из будущего" - 0,
+            # например при расхождении часов устройства)
             delta = timezone.now() - self.start_time
-            self.duration_seconds = int(delta.total_seconds())
+            self.duration_seconds = max(int(delta.total_seconds()), 0)
+    
+    def get_source_events(self):
+        """
+        События СКУД сессии в порядке времени
         
-        super().save(*args, **kwargs)
+        Для сессий с компактной связью события выбираются по интервалу сессии,
+        для старых сессий - из таблицы связей source_events.
+        """
+        if self.start_event_id is None:
+            return self.source_events.order_by('event_time', 'id')
+        
+        return SKUDEvent.objects.filter(
+            employee_id=self.employee_id,
+            event_time__gte=self.start_time,
+            event_time__lte=self.end_time or self.start_time
+        ).order_by('event_time', 'id')
     
     @property
     def is_open(self):
@@ -811,6 +990,28 @@ class WorkDaySummary(models.Model):
         verbose_name="Есть ручные корректировки"
     )
     
+    # Отклонения от графика сотрудника (work_start_time/work_end_time)
+    late_minutes = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Опоздание (минуты)"
+    )
+    early_leave_minutes = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Ранний уход (минуты)"
+    )
+    shortfall_seconds = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Недобор времени (секунды)",
+        help_text="В дни присутствия; при незакрытой сессии - вся норма дня"
+    )
+    
+    # Время последнего обработанного события (для инкрементальной обработки)
+    last_event_time = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Последнее обработанное событие"
+    )
+    
     # Системные поля
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
@@ -830,7 +1031,11 @@ class WorkDaySummary(models.Model):
         return f"{self.employee.full_name} - {self.date} ({self.get_status_display()})"
     
     def save(self, *args, **kwargs):
-        # Автоматический расчёт переработки/недоработки
+        self.calculate_balance()
+        super().save(*args, **kwargs)
+    
+    def calculate_balance(self):
+        """Автоматический расчёт переработки/недоработки (вызывается и перед bulk_update)"""
         if self.total_seconds_in_office and self.expected_seconds:
             diff = self.total_seconds_in_office - self.expected_seconds
             if diff > 0:
@@ -839,8 +1044,6 @@ class WorkDaySummary(models.Model):
             else:
                 self.overtime_seconds = 0
                 self.underwork_seconds = abs(diff)
-        
-        super().save(*args, **kwargs)
     
     @property
     def total_hours(self):
@@ -863,6 +1066,58 @@ class WorkDaySummary(models.Model):
         return round(self.underwork_seconds / 3600, 2) if self.underwork_seconds > 0 else 0
 
 
+class EmployeeMonthSummary(models.Model):
+    """Помесячная сводка рабочего времени сотрудника (пересчитывается из WorkDaySummary)"""
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE,
+                               related_name='month_summaries', verbose_name="Сотрудник")
+    month = models.DateField(verbose_name="Месяц", help_text="Первый день месяца")
+
+    # Суммы по дневным сводкам
+    total_seconds_in_office = models.PositiveIntegerField(default=0, verbose_name="Отработано (секунды)")
+    expected_seconds = models.PositiveIntegerField(default=0, verbose_name="Ожидаемое время (секунды)")
+    overtime_seconds = models.PositiveIntegerField(default=0, verbose_name="Переработка (секунды)")
+    underwork_seconds = models.PositiveIntegerField(default=0, verbose_name="Недоработка (секунды)")
+
+    # Количество дней
+    days_count = models.PositiveSmallIntegerField(default=0, verbose_name="Дней со сводкой")
+    present_days = models.PositiveSmallIntegerField(default=0, verbose_name="Присутствовал")
+    partial_days = models.PositiveSmallIntegerField(default=0, verbose_name="Частично присутствовал")
+    absent_days = models.PositiveSmallIntegerField(default=0, verbose_name="Отсутствовал")
+    excused_days = models.PositiveSmallIntegerField(default=0, verbose_name="Уважительная причина")
+    problem_days = models.PositiveSmallIntegerField(default=0, verbose_name="Проблема (нет выхода)")
+    days_with_sessions = models.PositiveSmallIntegerField(default=0, verbose_name="Дней с сессиями")
+    flagged_days = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Дней с незакрытыми сессиями или корректировками"
+    )
+    late_days = models.PositiveSmallIntegerField(default=0, verbose_name="Дней с опозданием")
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Сводка за месяц"
+        verbose_name_plural = "Сводки за месяц"
+        ordering = ['-month', 'employee']
+        unique_together = ['employee', 'month']
+        indexes = [
+            models.Index(fields=['month', 'employee']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee.full_name} - {self.month:%m.%Y}"
+
+    @property
+    def total_hours(self):
+        """Отработано в часах"""
+        return round(self.total_seconds_in_office / 3600, 2)
+
+    @property
+    def expected_hours(self):
+        """Ожидаемое время в часах"""
+        return round(self.expected_seconds / 3600, 2)
+
+
 class WorkTimeAuditLog(models.Model):
     """Модель аудита изменений в системе учёта рабочего времени"""
     
@@ -916,6 +1171,67 @@ class WorkTimeAuditLog(models.Model):
         return f"{self.employee.full_name} - {self.action} - {self.date}"
 
 
+class ReportJob(models.Model):
+    """Фоновое формирование отчёта (employees/report_jobs.py)"""
+    
+    REPORT_TYPE_CHOICES = [
+        ('monthly_xlsx', 'Месячный отчёт (Excel)'),
+        ('monthly_csv', 'Месячный отчёт (CSV)'),
+        ('employee_detailed', 'Детальный отчёт по сотруднику'),
+        ('department_statistics', 'Статистика отдела'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Формируется'),
+        ('done', 'Готов'),
+        ('failed', 'Ошибка'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report_type = models.CharField(max_length=30, choices=REPORT_TYPE_CHOICES, verbose_name="Тип отчёта")
+    params = models.JSONField(default=dict, verbose_name="Параметры")
+    params_hash = models.CharField(
+        max_length=64,
+        db_index=True,
+        verbose_name="Хэш параметров",
+        help_text="Одинаковый у заданий с одним типом отчёта и одинаковыми параметрами"
+    )
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending',
+                              db_index=True, verbose_name="Статус")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Прогресс (%)")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    
+    # Готовый файл (MEDIA_ROOT) и версия данных, по которым он сформирован
+    file = models.FileField(upload_to='reports/%Y/%m/', blank=True, verbose_name="Файл отчёта")
+    filename = models.CharField(max_length=255, blank=True, verbose_name="Имя файла")
+    data_version = models.CharField(max_length=64, blank=True, verbose_name="Версия данных")
+    
+    created_by = models.ForeignKey(
+        'auth.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='report_jobs',
+        verbose_name="Заказал"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало формирования")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание формирования")
+    
+    class Meta:
+        verbose_name = "Задание на отчёт"
+        verbose_name_plural = "Задания на отчёты"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['params_hash', 'status']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_report_type_display()} - {self.get_status_display()} ({self.created_at:%d.%m.%Y %H:%M})"
+
+
 # =============================================================================
 # СИСТЕМА РОЛЕЙ И ПРАВ ДОСТУПА
 # =============================================================================
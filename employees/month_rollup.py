@@ -0,0 +1,250 @@
+"""
+Помесячные сводки рабочего времени сотрудников (EmployeeMonthSummary)
+
+Сводка за месяц пересчитывается из дневных сводок WorkDaySummary того же
+сотрудника и месяца в транзакции, в которой изменяются дневные сводки:
+сигнал post_save для одиночного save(), явный вызов refresh_month_summaries()
+в пакетных путях (bulk_create/bulk_update сигналы не вызывают).
+
+Отчёты за период читают сводки целых месяцев и досчитывают неполные
+крайние месяцы по дневным сводкам (get_period_totals).
+"""
+
+import calendar
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, Tuple
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import EmployeeMonthSummary, WorkDaySummary
+
+logger = logging.getLogger(__name__)
+
+# Суммируемые поля сводки за месяц (в порядке модели)
+TOTAL_FIELDS = [
+    'total_seconds_in_office', 'expected_seconds', 'overtime_seconds', 'underwork_seconds',
+    'days_count', 'present_days', 'partial_days', 'absent_days', 'excused_days', 'problem_days',
+    'days_with_sessions', 'flagged_days', 'late_days',
+]
+
+# Поля дневной сводки, по которым считается сводка за месяц
+DAY_FIELDS = [
+    'employee_id', 'date', 'total_seconds_in_office', 'expected_seconds',
+    'overtime_seconds', 'underwork_seconds', 'status', 'sessions_count',
+    'has_missing_exit', 'has_manual_corrections', 'late_minutes',
+]
+
+# Агрегаты дневных сводок, соответствующие полям сводки за месяц (см. add_day)
+DAY_AGGREGATES = {
+    'total_seconds_in_office': Sum('total_seconds_in_office'),
+    'expected_seconds': Sum('expected_seconds'),
+    'overtime_seconds': Sum('overtime_seconds', filter=Q(overtime_seconds__gt=0)),
+    'underwork_seconds': Sum('underwork_seconds', filter=Q(underwork_seconds__gt=0)),
+    'days_count': Count('id'),
+    'present_days': Count('id', filter=Q(status='present')),
+    'partial_days': Count('id', filter=Q(status='partial')),
+    'absent_days': Count('id', filter=Q(status='absent')),
+    'excused_days': Count('id', filter=Q(status='excused')),
+    'problem_days': Count('id', filter=Q(status='problem')),
+    'days_with_sessions': Count('id', filter=Q(sessions_count__gt=0)),
+    'flagged_days': Count('id', filter=Q(has_missing_exit=True) | Q(has_manual_corrections=True)),
+    'late_days': Count('id', filter=Q(late_minutes__gt=0)),
+}
+
+
+def month_start(day: date) -> date:
+    """Первый день месяца"""
+    return day.replace(day=1)
+
+
+def month_end(day: date) -> date:
+    """Последний день месяца"""
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def empty_totals() -> Dict[str, int]:
+    """Нулевые итоги"""
+    return dict.fromkeys(TOTAL_FIELDS, 0)
+
+
+def add_day(totals: Dict[str, int], row: Dict) -> None:
+    """Добавление дневной сводки (словарь с полями DAY_FIELDS) к итогам"""
+    totals['total_seconds_in_office'] += row['total_seconds_in_office']
+    totals['expected_seconds'] += row['expected_seconds']
+    totals['overtime_seconds'] += max(row['overtime_seconds'], 0)
+    totals['underwork_seconds'] += max(row['underwork_seconds'], 0)
+    totals['days_count'] += 1
+    totals[f"{row['status']}_days"] += 1
+    if row['sessions_count'] > 0:
+        totals['days_with_sessions'] += 1
+    if row['has_missing_exit'] or row['has_manual_corrections']:
+        totals['flagged_days'] += 1
+    if row['late_minutes'] > 0:
+        totals['late_days'] += 1
+
+
+def _summarize_days(queryset) -> Dict:
+    """Итоги по дневным сводкам: (id сотрудника, месяц) -> итоги"""
+    totals = {}
+    for row in queryset.values(*DAY_FIELDS).order_by():
+        key = (row['employee_id'], month_start(row['date']))
+        add_day(totals.setdefault(key, empty_totals()), row)
+    return totals
+
+
+def refresh_month_summaries(days: Iterable[Tuple]) -> int:
+    """
+    Пересчёт сводок за месяцы, в которые попадают дни
+
+    Вызывается внутри транзакции, изменившей дневные сводки. Месяцы без
+    дневных сводок удаляются.
+
+    Args:
+        days: Пары (id сотрудника, дата)
+
+    Returns:
+        int: Количество пересчитанных сводок за месяц
+    """
+    by_month = {}
+    for employee_id, day in days:
+        by_month.setdefault(month_start(day), set()).add(employee_id)
+
+    refreshed = 0
+    for month, employee_ids in by_month.items():
+        totals = _summarize_days(WorkDaySummary.objects.filter(
+            employee_id__in=employee_ids, date__range=[month, month_end(month)]
+        ))
+
+        summaries = [
+            EmployeeMonthSummary(employee_id=employee_id, month=month, **values)
+            for (employee_id, _), values in totals.items()
+        ]
+        if summaries:
+            EmployeeMonthSummary.objects.bulk_create(
+                summaries,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['employee', 'month'],
+                update_fields=TOTAL_FIELDS + ['updated_at'],
+            )
+
+        missing_ids = employee_ids - {employee_id for employee_id, _ in totals}
+        if missing_ids:
+            EmployeeMonthSummary.objects.filter(employee_id__in=missing_ids, month=month).delete()
+
+        refreshed += len(summaries)
+
+    return refreshed
+
+
+def rebuild_month_summaries(from_date: date, to_date: date, employees=None) -> int:
+    """Пересчёт сводок за все месяцы периода (для заполнения и сверки)"""
+    days_qs = WorkDaySummary.objects.filter(date__range=[month_start(from_date), month_end(to_date)])
+    months_qs = EmployeeMonthSummary.objects.filter(month__range=[month_start(from_date), to_date])
+    if employees is not None:
+        days_qs = days_qs.filter(employee__in=employees)
+        months_qs = months_qs.filter(employee__in=employees)
+
+    # Пары из существующих сводок за месяц нужны, чтобы удалить устаревшие
+    days = set(days_qs.annotate(month=TruncMonth('date')).values_list('employee_id', 'month').distinct().order_by())
+    days.update(months_qs.values_list('employee_id', 'month'))
+    return refresh_month_summaries(days)
+
+
+def _whole_months(date_from: date, date_to: date) -> Tuple[date, date]:
+    """Целые месяцы периода: [first_month, last_month] (first_month > last_month - таких нет)"""
+    first_month = date_from if date_from.day == 1 else month_end(date_from) + timedelta(days=1)
+    last_month = month_start(date_to if date_to == month_end(date_to) else month_start(date_to) - timedelta(days=1))
+    return first_month, last_month
+
+
+def get_period_totals(employees, date_from: date, date_to: date) -> Dict:
+    """
+    Итоги сотрудников за период
+
+    Целые месяцы периода читаются из EmployeeMonthSummary одним
+    агрегирующим запросом, неполные первый и последний месяцы - по
+    дневным сводкам.
+
+    Args:
+        employees: QuerySet или список id сотрудников
+
+    Returns:
+        Dict: id сотрудника -> итоги (поля TOTAL_FIELDS); сотрудники без
+        сводок за период в результат не попадают
+    """
+    first_month, last_month = _whole_months(date_from, date_to)
+
+    totals = {}
+
+    if first_month <= last_month:
+        for row in EmployeeMonthSummary.objects.filter(
+            employee_id__in=employees, month__range=[first_month, last_month]
+        ).values('employee_id').annotate(
+            **{f'sum_{field}': Sum(field) for field in TOTAL_FIELDS}
+        ).order_by():
+            totals[row['employee_id']] = {field: row[f'sum_{field}'] for field in TOTAL_FIELDS}
+        partial_ranges = [(date_from, first_month - timedelta(days=1)),
+                          (month_end(last_month) + timedelta(days=1), date_to)]
+    else:
+        # В периоде нет целых месяцев
+        partial_ranges = [(date_from, date_to)]
+
+    for range_from, range_to in partial_ranges:
+        if range_from > range_to:
+            continue
+        for (employee_id, _), values in _summarize_days(WorkDaySummary.objects.filter(
+            employee_id__in=employees, date__range=[range_from, range_to]
+        )).items():
+            employee_totals = totals.setdefault(employee_id, empty_totals())
+            for field, value in values.items():
+                employee_totals[field] += value
+
+    return totals
+
+
+def employee_aggregate(queryset, aggregate):
+    """Подзапрос агрегата по строкам сотрудника из внешнего запроса (0, если строк нет)"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(employee_id=OuterRef('pk')).values('employee_id')
+            .annotate(value=aggregate).values('value').order_by()[:1],
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def annotate_period_totals(employees, date_from: date, date_to: date, fields: Iterable[str], prefix: str = 'period_'):
+    """
+    Итоги за период как аннотации QuerySet сотрудников
+
+    SQL-вариант get_period_totals: целые месяцы - подзапрос к
+    EmployeeMonthSummary, неполные крайние месяцы - подзапрос к дневным
+    сводкам. Позволяет фильтровать, сортировать и разбивать на страницы
+    по итогам в базе данных.
+
+    Args:
+        fields: Поля из TOTAL_FIELDS
+        prefix: Префикс имен аннотаций (<prefix><поле>)
+    """
+    first_month, last_month = _whole_months(date_from, date_to)
+    if first_month <= last_month:
+        months = EmployeeMonthSummary.objects.filter(month__range=[first_month, last_month])
+        partial_days = WorkDaySummary.objects.filter(
+            Q(date__range=[date_from, first_month - timedelta(days=1)])
+            | Q(date__range=[month_end(last_month) + timedelta(days=1), date_to])
+        )
+    else:
+        months = None
+        partial_days = WorkDaySummary.objects.filter(date__range=[date_from, date_to])
+
+    annotations = {}
+    for field in fields:
+        value = employee_aggregate(partial_days, DAY_AGGREGATES[field])
+        if months is not None:
+            value = employee_aggregate(months, Sum(field)) + value
+        annotations[f'{prefix}{field}'] = value
+    return employees.annotate(**annotations)
@@ -0,0 +1,339 @@
+"""
+Фоновое формирование отчётов (ReportJob)
+
+Большие отчёты (например, статистика отдела за год) не формируются в
+запросе: пользователь создаёт задание с параметрами отчёта (submit_job), а
+воркер формирует файл в MEDIA_ROOT, обновляя прогресс задания. Готовый
+файл хранится для повторной загрузки.
+
+Задание с тем же типом отчёта и параметрами (params_hash) переиспользует
+готовый файл, если данные отчёта не менялись с момента его формирования:
+версия данных (data_version) - отпечаток количества и времени последнего
+изменения строк, из которых строится отчёт.
+
+Исполнитель задается REPORT_JOB_SETTINGS['EXECUTOR']:
+- celery: задания забирает периодическая задача employees.tasks.run_report_jobs;
+- local: пул потоков внутри процесса (задание запускается после фиксации
+  транзакции создания, подходит для одного процесса без Celery).
+"""
+
+import hashlib
+import json
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Department, Division, Employee, ReportJob, WorkDaySummary, WorkSession
+from .reports import ReportProgress, WorkTimeReportGenerator
+from .tabular_export import iter_csv
+
+logger = logging.getLogger(__name__)
+
+# Настройки по умолчанию (переопределяются REPORT_JOB_SETTINGS)
+DEFAULT_REPORT_JOB_SETTINGS = {
+    'EXECUTOR': 'celery',
+    'LOCAL_WORKERS': 2,
+    'BATCH_SIZE': 5,
+    'STALE_RUNNING_SECONDS': 3600,
+    'KEEP_DAYS': 30,
+}
+
+# Не чаще, чем раз в столько процентов, прогресс записывается в базу
+PROGRESS_STEP = 5
+
+
+def get_report_job_settings() -> Dict:
+    """Настройки фоновых отчётов с учетом значений по умолчанию"""
+    return {**DEFAULT_REPORT_JOB_SETTINGS, **getattr(settings, 'REPORT_JOB_SETTINGS', {})}
+
+
+def params_hash(report_type: str, params: Dict) -> str:
+    """Хэш типа отчёта и параметров (ключ переиспользования файла)"""
+    payload = json.dumps({'report_type': report_type, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _month_period(params: Dict) -> Tuple[date, date]:
+    start_date = date(params['year'], params['month'], 1)
+    end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start_date, end_date
+
+
+def _fingerprint(*querysets) -> str:
+    """Отпечаток строк: количество и время последнего изменения по каждому QuerySet"""
+    parts = [
+        queryset.order_by().aggregate(count=Count('pk'), updated=Max('updated_at'))
+        for queryset in querysets
+    ]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def data_version(report_type: str, params: Dict) -> str:
+    """
+    Версия данных отчёта
+
+    Меняется при добавлении, удалении или изменении сводок, сессий и
+    сотрудников, попадающих в отчёт (поля updated_at обновляются и в
+    пакетных путях пересчёта). Справочники отделов и подразделений
+    учитываются целиком - они небольшие.
+    """
+    directories = (Department.objects.all(), Division.objects.all())
+
+    if report_type in ('monthly_xlsx', 'monthly_csv'):
+        start_date, end_date = _month_period(params)
+        summaries = WorkDaySummary.objects.filter(date__range=[start_date, end_date])
+        employees = Employee.objects.all()
+        if params.get('department_id'):
+            summaries = summaries.filter(employee__department_id=params['department_id'])
+            employees = employees.filter(department_id=params['department_id'])
+        if params.get('employee_id'):
+            summaries = summaries.filter(employee_id=params['employee_id'])
+            employees = employees.filter(id=params['employee_id'])
+        return _fingerprint(summaries, employees, *directories)
+
+    start_date = date.fromisoformat(params['start_date'])
+    end_date = date.fromisoformat(params['end_date'])
+
+    if report_type == 'employee_detailed':
+        employee_filter = Q(employee_id=params['employee_id'], date__range=[start_date, end_date])
+        return _fingerprint(
+            WorkDaySummary.objects.filter(employee_filter),
+            WorkSession.objects.filter(employee_filter),
+            Employee.objects.filter(id=params['employee_id']),
+        )
+
+    if report_type == 'department_statistics':
+        # Сводки за месяц пересчитываются из дневных сводок, их версии достаточно
+        return _fingerprint(
+            WorkDaySummary.objects.filter(
+                employee__department_id=params['department_id'], date__range=[start_date, end_date]
+            ),
+            Employee.objects.filter(department_id=params['department_id']),
+            Department.objects.filter(id=params['department_id']),
+        )
+
+    raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+
+
+def build_report(report_type: str, params: Dict, progress: ReportProgress) -> Tuple[File, str]:
+    """Формирование файла отчёта: открытый временный файл и имя файла"""
+    generator = WorkTimeReportGenerator()
+
+    if report_type == 'monthly_csv':
+        filename, headers, rows = generator.build_monthly_report_csv(
+            params['year'], params['month'], params.get('department_id'), params.get('employee_id'),
+            progress=progress
+        )
+        output = tempfile.TemporaryFile(suffix='.csv')
+        for chunk in iter_csv(headers, rows):
+            output.write(chunk)
+        output.seek(0)
+        return File(output), filename
+
+    if report_type == 'monthly_xlsx':
+        writer, filename = generator.build_monthly_report_xlsx(
+            params['year'], params['month'], params.get('department_id'), params.get('employee_id'),
+            progress=progress
+        )
+    elif report_type == 'employee_detailed':
+        writer, filename = generator.build_employee_detailed_report(
+            params['employee_id'], date.fromisoformat(params['start_date']),
+            date.fromisoformat(params['end_date']), progress=progress
+        )
+    elif report_type == 'department_statistics':
+        writer, filename = generator.build_department_statistics_report(
+            params['department_id'], date.fromisoformat(params['start_date']),
+            date.fromisoformat(params['end_date']), progress=progress
+        )
+    else:
+        raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+
+    return File(writer.close()), filename
+
+
+def find_ready_job(report_type: str, params: Dict, version: Optional[str] = None) -> Optional[ReportJob]:
+    """Готовое задание с теми же параметрами, сформированное по текущей версии данных"""
+    version = version or data_version(report_type, params)
+    job = ReportJob.objects.filter(
+        params_hash=params_hash(report_type, params),
+        status='done',
+        data_version=version,
+    ).exclude(file='').order_by('-finished_at').first()
+
+    if job and not job.file.storage.exists(job.file.name):
+        logger.warning(f"Файл отчёта {job.file.name} задания {job.id} не найден")
+        return None
+    return job
+
+
+def _copy_result(job: ReportJob, ready_job: ReportJob) -> None:
+    """Задание получает готовый файл другого задания (файл не копируется)"""
+    job.file.name = ready_job.file.name
+    job.filename = ready_job.filename
+    job.data_version = ready_job.data_version
+    job.status = 'done'
+    job.progress = 100
+    job.finished_at = timezone.now()
+
+
+def submit_job(user, report_type: str, params: Dict) -> ReportJob:
+    """
+    Создание задания на отчёт
+
+    Если готовый отчёт с теми же параметрами сформирован по актуальным
+    данным, задание сразу создается выполненным с этим файлом.
+
+    Args:
+        params: Параметры отчёта (значения, сериализуемые в JSON)
+    """
+    job = ReportJob(
+        report_type=report_type,
+        params=params,
+        params_hash=params_hash(report_type, params),
+        created_by=user if user and user.is_authenticated else None,
+    )
+
+    ready_job = find_ready_job(report_type, params)
+    if ready_job:
+        _copy_result(job, ready_job)
+        job.started_at = job.finished_at
+        job.save()
+        logger.info(f"Задание на отчёт {job.id}: использован готовый файл задания {ready_job.id}")
+        return job
+
+    job.save()
+    if get_report_job_settings()['EXECUTOR'] == 'local':
+        job_id = job.id
+        transaction.on_commit(lambda: get_local_executor().submit(_run_in_thread, job_id))
+    return job
+
+
+def _claim_job(job_id) -> bool:
+    """Перевод задания в работу (False - его уже забрал другой воркер)"""
+    return ReportJob.objects.filter(id=job_id, status='pending').update(
+        status='running', started_at=timezone.now(), progress=0, error=''
+    ) == 1
+
+
+def _progress_callback(job_id) -> Callable[[int, int], None]:
+    last_percent = [0]
+
+    def update(done: int, total: int) -> None:
+        percent = min(99, done * 100 // total) if total else 0
+        if percent - last_percent[0] >= PROGRESS_STEP:
+            last_percent[0] = percent
+            ReportJob.objects.filter(id=job_id).update(progress=percent)
+
+    return update
+
+
+def run_job(job_id) -> bool:
+    """
+    Формирование отчёта по заданию
+
+    Returns:
+        bool: False - задание уже забрано другим воркером
+    """
+    if not _claim_job(job_id):
+        return False
+
+    job = ReportJob.objects.get(id=job_id)
+    try:
+        # Версия берется до чтения данных: изменения во время формирования
+        # приведут к пересборке при следующем таком же запросе
+        version = data_version(job.report_type, job.params)
+
+        ready_job = find_ready_job(job.report_type, job.params, version)
+        if ready_job:
+            _copy_result(job, ready_job)
+        else:
+            output, filename = build_report(
+                job.report_type, job.params,
+                ReportProgress(_progress_callback(job.id), WorkTimeReportGenerator().chunk_size)
+            )
+            with output:
+                job.file.save(filename, output, save=False)
+            job.filename = filename
+            job.data_version = version
+            job.status = 'done'
+            job.progress = 100
+            job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'filename', 'data_version', 'status', 'progress', 'finished_at'])
+        logger.info(f"Задание на отчёт {job.id} ({job.report_type}) выполнено: {job.file.name}")
+    except Exception as e:
+        logger.error(f"Ошибка формирования отчёта по заданию {job.id}: {e}")
+        ReportJob.objects.filter(id=job.id).update(status='failed', error=str(e), finished_at=timezone.now())
+    return True
+
+
+def run_pending_jobs(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Выполнение заданий из очереди (периодическая задача Celery)
+
+    Задания в работе дольше STALE_RUNNING_SECONDS (воркер остановлен
+    во время формирования) возвращаются в очередь.
+    """
+    job_settings = get_report_job_settings()
+    batch_size = batch_size or job_settings['BATCH_SIZE']
+
+    stale_before = timezone.now() - timedelta(seconds=job_settings['STALE_RUNNING_SECONDS'])
+    requeued = ReportJob.objects.filter(status='running', started_at__lt=stale_before).update(status='pending')
+    if requeued:
+        logger.warning(f"Задания на отчёты: возвращено в очередь прерванных {requeued}")
+
+    job_ids = list(
+        ReportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:batch_size]
+    )
+    processed = sum(1 for job_id in job_ids if run_job(job_id))
+    return {'processed': processed, 'requeued': requeued}
+
+
+def cleanup_expired_jobs(keep_days: Optional[int] = None) -> int:
+    """
+    Удаление заданий старше keep_days дней и их файлов
+
+    Файл удаляется, только если на него не ссылаются оставшиеся задания
+    (переиспользованный отчёт).
+    """
+    keep_days = keep_days if keep_days is not None else get_report_job_settings()['KEEP_DAYS']
+    expired = ReportJob.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=keep_days)
+    ).exclude(status__in=['pending', 'running'])
+
+    file_names = set(expired.exclude(file='').values_list('file', flat=True))
+    deleted, _ = expired.delete()
+
+    still_used = set(ReportJob.objects.filter(file__in=file_names).values_list('file', flat=True))
+    storage = ReportJob._meta.get_field('file').storage
+    for name in file_names - still_used:
+        storage.delete(name)
+    return deleted
+
+
+def _run_in_thread(job_id) -> None:
+    """Выполнение задания в потоке локального исполнителя"""
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+_local_executor = None
+
+
+def get_local_executor() -> ThreadPoolExecutor:
+    """Пул потоков локального исполнителя (один на процесс)"""
+    global _local_executor
+    if _local_executor is None:
+        _local_executor = ThreadPoolExecutor(
+            max_workers=get_report_job_settings()['LOCAL_WORKERS'], thread_name_prefix='report-jobs'
+        )
+    return _local_executor
@@ -2,15 +2,10 @@
 Модуль для генерации отчётов системы учёта рабочего времени
 """
 
-import io
-import csv
 from datetime import datetime, date, timedelta
 from decimal import Decimal
-from typing import Dict, List, Optional, Any
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils import get_column_letter
-from django.http import HttpResponse
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
+from django.http import HttpResponse, StreamingHttpResponse
 from django.db.models import Q, Sum, Count, Avg
 from django.contrib.auth.models import User
 
@@ -18,6 +13,36 @@ from .models import (
     Employee, WorkSession, WorkDaySummary, WorkTimeAuditLog,
     SKUDDevice, SKUDEvent
 )
+from .month_rollup import empty_totals, get_period_totals
+from .tabular_export import StreamingXlsxWriter, streaming_csv_response
+
+
+class ReportProgress:
+    """
+    Прогресс формирования отчёта по прочитанным строкам
+    
+    callback(обработано, всего) вызывается каждые every строк; без callback
+    строки не подсчитываются заранее (лишних запросов COUNT нет).
+    """
+    
+    def __init__(self, callback: Optional[Callable[[int, int], None]] = None, every: int = 2000):
+        self.callback = callback
+        self.every = every
+        self.done = 0
+        self.total = 0
+    
+    def expect(self, *querysets) -> None:
+        """Учёт строк, которые будут прочитаны"""
+        if self.callback:
+            self.total += sum(queryset.count() for queryset in querysets)
+    
+    def rows(self, queryset, chunk_size: int):
+        """Строки QuerySet пачками по chunk_size с отметкой прогресса"""
+        for row in queryset.iterator(chunk_size=chunk_size):
+            yield row
+            self.done += 1
+            if self.callback and self.done % self.every == 0:
+                self.callback(self.done, self.total)
 
 
 class WorkTimeReportGenerator:
@@ -26,63 +51,84 @@ class WorkTimeReportGenerator:
     def __init__(self):
         self.date_format = "%d.%m.%Y"
         self.datetime_format = "%d.%m.%Y %H:%M"
+        # Строк, читаемых из базы за раз при выгрузке
+        self.chunk_size = 2000
     
     def generate_monthly_report_csv(
         self, 
         year: int, 
         month: int, 
         department_id: Optional[str] = None,
-        employee_id: Optional[str] = None
-    ) -> HttpResponse:
-        """Генерация месячного отчёта в формате CSV"""
-        
-        # Определяем период
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
+        employee_id: Optional[str] = None,
+        compress: bool = False
+    ) -> StreamingHttpResponse:
+        """
+        Генерация месячного отчёта в формате CSV
+        
+        Строки читаются из базы пачками (values_list) и отдаются клиенту по
+        мере формирования. compress - сжатие ответа gzip (см. accepts_gzip).
+        """
+        filename, headers, rows = self.build_monthly_report_csv(year, month, department_id, employee_id)
+        return streaming_csv_response(filename, headers, rows, compress=compress)
+    
+    def build_monthly_report_csv(
+        self, 
+        year: int, 
+        month: int, 
+        department_id: Optional[str] = None,
+        employee_id: Optional[str] = None,
+        progress: Optional[ReportProgress] = None
+    ) -> Tuple[str, List[str], Iterator[List]]:
+        """Месячный отчёт CSV: имя файла, заголовок и итератор строк"""
+        progress = progress or ReportProgress()
         
         # Получаем данные
+        start_date, end_date = self._month_period(year, month)
         summaries = self._get_summaries_for_period(start_date, end_date, department_id, employee_id)
-        
-        # Создаём CSV ответ
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="worktime_report_{year}_{month:02d}.csv"'
-        
-        # Добавляем BOM для корректного отображения в Excel
-        response.write('\ufeff')
-        
-        writer = csv.writer(response)
+        progress.expect(summaries)
         
         # Заголовок
-        writer.writerow([
+        headers = [
             'ФИО', 'Табельный номер', 'Отдел', 'Подразделение',
             'Дата', 'Статус дня', 'Первый вход', 'Последний выход',
             'Отработано (часы)', 'Ожидаемо (часы)', 'Переработка (часы)', 'Недоработка (часы)',
             'Количество сессий', 'Проблемы'
-        ])
+        ]
         
-        # Данные
-        for summary in summaries:
-            writer.writerow([
-                summary.employee.full_name,
-                summary.employee.employee_id,
-                summary.employee.department.name if summary.employee.department else '',
-                summary.employee.division.name if summary.employee.division else '',
-                summary.date.strftime(self.date_format),
-                summary.get_status_display(),
-                summary.first_entry.strftime(self.datetime_format) if summary.first_entry else '',
-                summary.last_exit.strftime(self.datetime_format) if summary.last_exit else '',
-                round(summary.total_hours, 2),
-                round(summary.expected_hours, 2),
-                round(summary.overtime_hours, 2),
-                round(summary.underwork_hours, 2),
-                summary.sessions_count,
-                'Да' if (summary.has_missing_exit or summary.has_manual_corrections) else 'Нет'
-            ])
+        return f"worktime_report_{year}_{month:02d}.csv", headers, self._monthly_csv_rows(summaries, progress)
+    
+    def _monthly_csv_rows(self, summaries, progress: ReportProgress):
+        """Строки месячного отчёта из values_list без создания моделей"""
+        status_labels = dict(WorkDaySummary.SUMMARY_STATUS_CHOICES)
+        rows = summaries.values_list(
+            'employee__last_name', 'employee__first_name', 'employee__middle_name',
+            'employee__employee_id', 'employee__department__name', 'employee__division__name',
+            'date', 'status', 'first_entry', 'last_exit',
+            'total_seconds_in_office', 'expected_seconds', 'overtime_seconds', 'underwork_seconds',
+            'sessions_count', 'has_missing_exit', 'has_manual_corrections'
+        )
         
-        return response
+        for (last_name, first_name, middle_name, employee_code, department_name, division_name,
+             day, status, first_entry, last_exit, total_seconds, expected_seconds, overtime_seconds,
+             underwork_seconds, sessions_count, has_missing_exit, has_manual_corrections
+             ) in progress.rows(rows, self.chunk_size):
+            # Часы считаются так же, как свойства WorkDaySummary
+            yield [
+                f"{last_name} {first_name} {middle_name}".strip(),
+                employee_code,
+                department_name or '',
+                division_name or '',
+                day.strftime(self.date_format),
+                status_labels.get(status, status),
+                first_entry.strftime(self.datetime_format) if first_entry else '',
+                last_exit.strftime(self.datetime_format) if last_exit else '',
+                round(total_seconds / 3600, 2) if total_seconds else 0,
+                round(expected_seconds / 3600, 2) if expected_seconds else 0,
+                round(overtime_seconds / 3600, 2) if overtime_seconds > 0 else 0,
+                round(underwork_seconds / 3600, 2) if underwork_seconds > 0 else 0,
+                sessions_count,
+                'Да' if (has_missing_exit or has_manual_corrections) else 'Нет'
+            ]
     
     def generate_monthly_report_xlsx(
         self, 
@@ -92,33 +138,27 @@ class WorkTimeReportGenerator:
         employee_id: Optional[str] = None
     ) -> HttpResponse:
         """Генерация месячного отчёта в формате Excel"""
-        
-        # Определяем период
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            end_date = date(year, month + 1, 1) - timedelta(days=1)
+        writer, filename = self.build_monthly_report_xlsx(year, month, department_id, employee_id)
+        return writer.response(filename)
+    
+    def build_monthly_report_xlsx(
+        self, 
+        year: int, 
+        month: int, 
+        department_id: Optional[str] = None,
+        employee_id: Optional[str] = None,
+        progress: Optional[ReportProgress] = None
+    ) -> Tuple[StreamingXlsxWriter, str]:
+        """Месячный отчёт Excel: заполненная книга и имя файла"""
+        progress = progress or ReportProgress()
         
         # Получаем данные
+        start_date, end_date = self._month_period(year, month)
         summaries = self._get_summaries_for_period(start_date, end_date, department_id, employee_id)
+        progress.expect(summaries)
         
-        # Создаём Excel файл
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = f"Отчёт {month:02d}.{year}"
-        
-        # Стили
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        # Создаём Excel файл (строки пишутся на диск по мере чтения из базы)
+        writer = StreamingXlsxWriter()
         
         # Заголовки
         headers = [
@@ -127,17 +167,12 @@ class WorkTimeReportGenerator:
             'Отработано (часы)', 'Ожидаемо (часы)', 'Переработка (часы)', 'Недоработка (часы)',
             'Количество сессий', 'Проблемы'
         ]
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = border
+        sheet = writer.add_sheet(f"Отчёт {month:02d}.{year}", headers)
         
         # Данные
-        for row, summary in enumerate(summaries, 2):
-            data = [
+        for summary in progress.rows(summaries, self.chunk_size):
+            has_problems = summary.has_missing_exit or summary.has_manual_corrections
+            sheet.write_row([
                 summary.employee.full_name,
                 summary.employee.employee_id,
                 summary.employee.department.name if summary.employee.department else '',
@@ -151,37 +186,10 @@ class WorkTimeReportGenerator:
                 round(summary.overtime_hours, 2),
                 round(summary.underwork_hours, 2),
                 summary.sessions_count,
-                'Да' if (summary.has_missing_exit or summary.has_manual_corrections) else 'Нет'
-            ]
-            
-            for col, value in enumerate(data, 1):
-                cell = ws.cell(row=row, column=col, value=value)
-                cell.border = border
-                
-                # Выделяем проблемные строки
-                if summary.has_missing_exit or summary.has_manual_corrections:
-                    cell.fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-        
-        # Автоширина колонок
-        for col in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col)
-            max_length = 0
-            
-            for row in range(1, ws.max_row + 1):
-                cell_value = ws[f"{column_letter}{row}"].value
-                if cell_value:
-                    max_length = max(max_length, len(str(cell_value)))
-            
-            ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
-        
-        # Создаём ответ
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="worktime_report_{year}_{month:02d}.xlsx"'
+                'Да' if has_problems else 'Нет'
+            ], highlight=has_problems)
         
-        wb.save(response)
-        return response
+        return writer, f"worktime_report_{year}_{month:02d}.xlsx"
     
     def generate_employee_detailed_report(
         self, 
@@ -190,11 +198,22 @@ class WorkTimeReportGenerator:
         end_date: date
     ) -> HttpResponse:
         """Генерация детального отчёта по сотруднику"""
-        
         try:
-            employee = Employee.objects.get(id=employee_id)
+            writer, filename = self.build_employee_detailed_report(employee_id, start_date, end_date)
         except Employee.DoesNotExist:
             return HttpResponse("Сотрудник не найден", status=404)
+        return writer.response(filename)
+    
+    def build_employee_detailed_report(
+        self, 
+        employee_id: str, 
+        start_date: date, 
+        end_date: date,
+        progress: Optional[ReportProgress] = None
+    ) -> Tuple[StreamingXlsxWriter, str]:
+        """Детальный отчёт по сотруднику (Employee.DoesNotExist - сотрудник не найден)"""
+        progress = progress or ReportProgress()
+        employee = Employee.objects.get(id=employee_id)
         
         # Получаем данные
         summaries = WorkDaySummary.objects.filter(
@@ -208,40 +227,20 @@ class WorkTimeReportGenerator:
             date__gte=start_date,
             date__lte=end_date
         ).order_by('date', 'start_time')
+        progress.expect(summaries, sessions)
         
         # Создаём Excel файл
-        wb = openpyxl.Workbook()
+        writer = StreamingXlsxWriter()
         
         # Лист 1: Сводка по дням
-        ws_summary = wb.active
-        ws_summary.title = "Сводка по дням"
-        
-        # Лист 2: Детали сессий
-        ws_sessions = wb.create_sheet("Детали сессий")
-        
-        # Стили
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-        
-        # Заполняем лист сводки
-        summary_headers = [
+        ws_summary = writer.add_sheet("Сводка по дням", [
             'Дата', 'Статус', 'Первый вход', 'Последний выход',
             'Отработано (ч)', 'Ожидаемо (ч)', 'Переработка (ч)', 'Недоработка (ч)',
             'Сессий', 'Проблемы'
-        ]
-        
-        for col, header in enumerate(summary_headers, 1):
-            cell = ws_summary.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
+        ])
         
-        for row, summary in enumerate(summaries, 2):
-            data = [
+        for summary in progress.rows(summaries, self.chunk_size):
+            ws_summary.write_row([
                 summary.date.strftime(self.date_format),
                 summary.get_status_display(),
                 summary.first_entry.strftime(self.datetime_format) if summary.first_entry else '',
@@ -252,60 +251,26 @@ class WorkTimeReportGenerator:
                 round(summary.underwork_hours, 2),
                 summary.sessions_count,
                 'Да' if (summary.has_missing_exit or summary.has_manual_corrections) else 'Нет'
-            ]
-            
-            for col, value in enumerate(data, 1):
-                cell = ws_summary.cell(row=row, column=col, value=value)
-                cell.border = border
+            ])
         
-        # Заполняем лист сессий
-        session_headers = [
+        # Лист 2: Детали сессий
+        ws_sessions = writer.add_sheet("Детали сессий", [
             'Дата', 'Начало', 'Окончание', 'Длительность (ч)',
             'Статус', 'Причина корректировки'
-        ]
-        
-        for col, header in enumerate(session_headers, 1):
-            cell = ws_sessions.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
+        ])
         
-        for row, session in enumerate(sessions, 2):
-            data = [
+        for session in progress.rows(sessions, self.chunk_size):
+            ws_sessions.write_row([
                 session.date.strftime(self.date_format),
                 session.start_time.strftime(self.datetime_format),
                 session.end_time.strftime(self.datetime_format) if session.end_time else '',
                 round(session.duration_hours, 2),
                 session.get_status_display(),
                 session.manual_reason or ''
-            ]
-            
-            for col, value in enumerate(data, 1):
-                cell = ws_sessions.cell(row=row, column=col, value=value)
-                cell.border = border
-        
-        # Автоширина колонок
-        for ws in [ws_summary, ws_sessions]:
-            for col in range(1, ws.max_column + 1):
-                column_letter = get_column_letter(col)
-                max_length = 0
-                
-                for row in range(1, ws.max_row + 1):
-                    cell_value = ws[f"{column_letter}{row}"].value
-                    if cell_value:
-                        max_length = max(max_length, len(str(cell_value)))
-                
-                ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
+            ])
         
-        # Создаём ответ
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
         filename = f"employee_report_{employee.employee_id}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        wb.save(response)
-        return response
+        return writer, filename
     
     def generate_department_statistics_report(
         self, 
@@ -314,6 +279,21 @@ class WorkTimeReportGenerator:
         end_date: date
     ) -> HttpResponse:
         """Генерация отчёта по статистике отдела"""
+        try:
+            writer, filename = self.build_department_statistics_report(department_id, start_date, end_date)
+        except Employee.DoesNotExist:
+            return HttpResponse("В отделе нет активных сотрудников", status=404)
+        return writer.response(filename)
+    
+    def build_department_statistics_report(
+        self, 
+        department_id: str, 
+        start_date: date, 
+        end_date: date,
+        progress: Optional[ReportProgress] = None
+    ) -> Tuple[StreamingXlsxWriter, str]:
+        """Статистика отдела (Employee.DoesNotExist - в отделе нет активных сотрудников)"""
+        progress = progress or ReportProgress()
         
         # Получаем сотрудников отдела
         employees = Employee.objects.filter(
@@ -322,22 +302,13 @@ class WorkTimeReportGenerator:
         )
         
         if not employees.exists():
-            return HttpResponse("В отделе нет активных сотрудников", status=404)
+            raise Employee.DoesNotExist("В отделе нет активных сотрудников")
+        progress.expect(employees)
         
         department_name = employees.first().department.name
         
         # Создаём Excel файл
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = f"Статистика отдела {department_name}"
-        
-        # Стили
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
+        writer = StreamingXlsxWriter()
         
         # Заголовки
         headers = [
@@ -346,85 +317,53 @@ class WorkTimeReportGenerator:
             'Отработано (ч)', 'Ожидаемо (ч)', 'Переработка (ч)', 'Недоработка (ч)',
             'Эффективность (%)', 'Проблемных дней'
         ]
+        sheet = writer.add_sheet(f"Статистика отдела {department_name}", headers)
         
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
+        # Итоги сотрудников за период из сводок за месяц
+        period_totals = get_period_totals(employees, start_date, end_date)
+        total_days = (end_date - start_date).days + 1
         
         # Данные по каждому сотруднику
-        row = 2
-        for employee in employees:
-            summaries = WorkDaySummary.objects.filter(
-                employee=employee,
-                date__gte=start_date,
-                date__lte=end_date
-            )
+        for employee in progress.rows(employees, self.chunk_size):
+            totals = period_totals.get(employee.id) or empty_totals()
             
-            total_days = (end_date - start_date).days + 1
-            present_days = summaries.filter(status='present').count()
-            absent_days = summaries.filter(status='absent').count()
-            excused_days = summaries.filter(status='excused').count()
-            problem_days = summaries.filter(
-                Q(has_missing_exit=True) | Q(has_manual_corrections=True)
-            ).count()
-            
-            total_hours = sum(s.total_hours for s in summaries)
-            expected_hours = sum(s.expected_hours for s in summaries)
-            overtime_hours = sum(s.overtime_hours for s in summaries)
-            underwork_hours = sum(s.underwork_hours for s in summaries)
+            problem_days = totals['flagged_days']
+            total_hours = totals['total_seconds_in_office'] / 3600
+            expected_hours = totals['expected_seconds'] / 3600
+            overtime_hours = totals['overtime_seconds'] / 3600
+            underwork_hours = totals['underwork_seconds'] / 3600
             
             efficiency = (total_hours / expected_hours * 100) if expected_hours > 0 else 0
             
-            data = [
+            # Выделяем проблемных сотрудников
+            sheet.write_row([
                 employee.full_name,
                 employee.employee_id,
                 employee.get_position_display(),
                 f"{employee.work_fraction * 100:.0f}%",
                 total_days,
-                present_days,
-                absent_days,
-                excused_days,
+                totals['present_days'],
+                totals['absent_days'],
+                totals['excused_days'],
                 round(total_hours, 2),
                 round(expected_hours, 2),
                 round(overtime_hours, 2),
                 round(underwork_hours, 2),
                 round(efficiency, 1),
                 problem_days
-            ]
-            
-            for col, value in enumerate(data, 1):
-                cell = ws.cell(row=row, column=col, value=value)
-                cell.border = border
-                
-                # Выделяем проблемных сотрудников
-                if problem_days > 0 or efficiency < 80:
-                    cell.fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-            
-            row += 1
+            ], highlight=problem_days > 0 or efficiency < 80)
         
-        # Автоширина колонок
-        for col in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col)
-            max_length = 0
-            
-            for row in range(1, ws.max_row + 1):
-                cell_value = ws[f"{column_letter}{row}"].value
-                if cell_value:
-                    max_length = max(max_length, len(str(cell_value)))
-            
-            ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
-        
-        # Создаём ответ
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
         filename = f"department_stats_{department_name}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.xlsx"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        wb.save(response)
-        return response
+        return writer, filename
+    
+    def _month_period(self, year: int, month: int) -> Tuple[date, date]:
+        """Первый и последний день месяца"""
+        start_date = date(year, month, 1)
+        if month == 12:
+            end_date = date(year + 1, 1, 1) - timedelta(days=1)
+        else:
+            end_date = date(year, month + 1, 1) - timedelta(days=1)
+        return start_date, end_date
     
     def _get_summaries_for_period(
         self, 
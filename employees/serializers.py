@@ -8,9 +8,10 @@ from django.utils import timezone
 from datetime import datetime, date
 from decimal import Decimal
 
+from .birthdays import days_until_birthday
 from .models import (
     Employee, WorkSession, WorkDaySummary, WorkTimeAuditLog,
-    SKUDEvent, SKUDDevice
+    SKUDEvent, SKUDDevice, ReportJob
 )
 
 
@@ -245,6 +246,82 @@ class ReprocessWorkTimeSerializer(serializers.Serializer):
         return data
 
 
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Сериализатор для заданий на отчёты"""
+    
+    report_type_display = serializers.CharField(source='get_report_type_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report_type', 'report_type_display', 'params',
+            'status', 'status_display', 'progress', 'error',
+            'filename', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    """Сериализатор для создания задания на отчёт"""
+    
+    # Обязательные параметры по типу отчёта
+    REQUIRED_FIELDS = {
+        'monthly_xlsx': ['year', 'month'],
+        'monthly_csv': ['year', 'month'],
+        'employee_detailed': ['employee_id', 'start_date', 'end_date'],
+        'department_statistics': ['department_id', 'start_date', 'end_date'],
+    }
+    
+    # Параметры, которые передаются генератору отчёта
+    REPORT_FIELDS = {
+        'monthly_xlsx': ['year', 'month', 'department_id', 'employee_id'],
+        'monthly_csv': ['year', 'month', 'department_id', 'employee_id'],
+        'employee_detailed': ['employee_id', 'start_date', 'end_date'],
+        'department_statistics': ['department_id', 'start_date', 'end_date'],
+    }
+    
+    report_type = serializers.ChoiceField(choices=ReportJob.REPORT_TYPE_CHOICES)
+    year = serializers.IntegerField(required=False, min_value=2000, max_value=2100)
+    month = serializers.IntegerField(required=False, min_value=1, max_value=12)
+    department_id = serializers.UUIDField(required=False)
+    employee_id = serializers.UUIDField(required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    
+    def validate(self, data):
+        """Валидация параметров по типу отчёта"""
+        missing = [
+            field for field in self.REQUIRED_FIELDS[data['report_type']]
+            if data.get(field) is None
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                {field: "Обязательный параметр для этого типа отчёта" for field in missing}
+            )
+        
+        if data.get('start_date') and data.get('end_date'):
+            if data['start_date'] > data['end_date']:
+                raise serializers.ValidationError(
+                    "Дата начала периода не может быть позже даты окончания"
+                )
+        
+        return data
+    
+    def get_report_params(self):
+        """Параметры отчёта в виде, пригодном для JSON (без пустых значений)"""
+        data = self.validated_data
+        params = {}
+        for field in self.REPORT_FIELDS[data['report_type']]:
+            value = data.get(field)
+            if value is None:
+                continue
+            params[field] = value.isoformat() if isinstance(value, date) else (
+                str(value) if field.endswith('_id') else value
+            )
+        return params
+
+
 class BirthdayEmployeeSerializer(serializers.ModelSerializer):
     """Сериализатор для именинников"""
     
@@ -264,15 +341,7 @@ class BirthdayEmployeeSerializer(serializers.ModelSerializer):
     
     def get_days_until_birthday(self, obj):
         """Вычисляет количество дней до дня рождения"""
-        today = timezone.now().date()
-        this_year_birthday = obj.birth_date.replace(year=today.year)
-        
-        # Если день рождения уже прошел в этом году, считаем до следующего года
-        if this_year_birthday < today:
-            next_year_birthday = obj.birth_date.replace(year=today.year + 1)
-            return (next_year_birthday - today).days
-        else:
-            return (this_year_birthday - today).days
+        return days_until_birthday(obj.birth_date, timezone.localdate())
 
 
 class PINFLSyncSerializer(serializers.Serializer):
@@ -0,0 +1,143 @@
+"""
+Сигналы приложения employees
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .absence_calendar import absence_calendar
+from .card_resolver import card_resolver
+from .dashboard_snapshot import dashboard_snapshots
+from .device_registry import device_registry
+from .dirty_days import mark_days_dirty, mark_range_dirty
+from .models import BusinessTrip, Employee, SKUDCard, SKUDDevice, Vacation, WorkDaySummary, WorkSession
+from .month_rollup import refresh_month_summaries
+from .work_time_processor import WorkTimeProcessor
+
+logger = logging.getLogger(__name__)
+
+# Поля устройства, изменение которых не влияет на прием событий
+DEVICE_SERVICE_FIELDS = {'last_communication', 'status'}
+
+# Поля сотрудника, от которых зависят ожидаемое время работы и отклонения от графика
+EMPLOYEE_SCHEDULE_FIELDS = ('work_fraction', 'daily_hours', 'work_start_time', 'work_end_time')
+
+# Поля сотрудника, от которых зависит определение сотрудника по карте, и поля графика:
+# индекс карт хранит объекты сотрудников, по которым считаются сводки при приеме событий
+EMPLOYEE_CARD_FIELDS = {'employee_id', 'is_active', *EMPLOYEE_SCHEDULE_FIELDS}
+
+
+@receiver(post_save, sender=SKUDDevice)
+def invalidate_device_registry_on_save(sender, instance, update_fields=None, **kwargs):
+    """Сброс реестра устройств при изменении устройства"""
+    if update_fields and set(update_fields) <= DEVICE_SERVICE_FIELDS:
+        return
+    
+    transaction.on_commit(device_registry.invalidate)
+
+
+@receiver(post_delete, sender=SKUDDevice)
+def invalidate_device_registry_on_delete(sender, instance, **kwargs):
+    """Сброс реестра устройств при удалении устройства"""
+    transaction.on_commit(device_registry.invalidate)
+
+
+@receiver(post_save, sender=Employee)
+def invalidate_card_resolver_on_employee_save(sender, instance, update_fields=None, **kwargs):
+    """Сброс индекса карт при изменении табельного номера, активности или графика сотрудника"""
+    if update_fields and not set(update_fields) & EMPLOYEE_CARD_FIELDS:
+        return
+    
+    transaction.on_commit(card_resolver.invalidate)
+
+
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=SKUDCard)
+@receiver(post_delete, sender=SKUDCard)
+def invalidate_card_resolver(sender, instance, **kwargs):
+    """Сброс индекса карт при удалении сотрудника или изменении карт"""
+    transaction.on_commit(card_resolver.invalidate)
+
+
+@receiver(post_save, sender=Vacation)
+@receiver(post_delete, sender=Vacation)
+@receiver(post_save, sender=BusinessTrip)
+@receiver(post_delete, sender=BusinessTrip)
+def invalidate_absence_calendar(sender, instance, **kwargs):
+    """Сброс календаря отсутствий при изменении отпусков и командировок"""
+    # Другие процессы увидят изменение по версии календаря в БД
+    transaction.on_commit(absence_calendar.invalidate)
+
+
+@receiver(pre_save, sender=Vacation)
+@receiver(pre_save, sender=BusinessTrip)
+def remember_absence_range(sender, instance, **kwargs):
+    """Запоминаем прежний период, чтобы пересчитать и его"""
+    instance._previous_range = None
+    if not instance._state.adding:
+        instance._previous_range = sender.objects.filter(pk=instance.pk).values_list(
+            'start_date', 'end_date'
+        ).first()
+
+
+@receiver(post_save, sender=Vacation)
+@receiver(post_save, sender=BusinessTrip)
+def mark_absence_days_on_save(sender, instance, **kwargs):
+    """Отметка дней отпуска/командировки (прежнего и нового периода) для пересчёта"""
+    previous_range = getattr(instance, '_previous_range', None)
+    if previous_range:
+        mark_range_dirty(instance.employee_id, previous_range[0], previous_range[1], 'absence')
+    mark_range_dirty(instance.employee_id, instance.start_date, instance.end_date, 'absence')
+
+
+@receiver(post_delete, sender=Vacation)
+@receiver(post_delete, sender=BusinessTrip)
+def mark_absence_days_on_delete(sender, instance, **kwargs):
+    """Отметка дней удалённого отпуска/командировки для пересчёта"""
+    mark_range_dirty(instance.employee_id, instance.start_date, instance.end_date, 'absence')
+
+
+# Пакетные пути (bulk_create/bulk_update сводок) вызывают
+# refresh_month_summaries сами
+@receiver(post_save, sender=WorkDaySummary)
+def refresh_month_summary_on_save(sender, instance, **kwargs):
+    """Пересчёт сводки за месяц при сохранении дневной сводки"""
+    refresh_month_summaries([(instance.employee_id, instance.date)])
+    transaction.on_commit(dashboard_snapshots.invalidate)
+
+
+# post_delete для WorkSession не подключается: он отключил бы быстрое
+# удаление автоматических сессий при пересчёте
+@receiver(post_save, sender=WorkSession)
+def mark_day_on_manual_session_change(sender, instance, **kwargs):
+    """Отметка дня для пересчёта при ручной корректировке сессии"""
+    if instance.status not in WorkTimeProcessor.AUTO_SESSION_STATUSES:
+        mark_days_dirty([(instance.employee_id, instance.date)], 'manual')
+
+
+@receiver(pre_save, sender=Employee)
+def remember_employee_schedule(sender, instance, update_fields=None, **kwargs):
+    """Запоминаем прежние ставку, норму часов и график"""
+    instance._previous_schedule = None
+    if instance._state.adding or (update_fields and not set(update_fields) & set(EMPLOYEE_SCHEDULE_FIELDS)):
+        return
+    instance._previous_schedule = sender.objects.filter(pk=instance.pk).values_list(
+        *EMPLOYEE_SCHEDULE_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=Employee)
+def mark_days_on_schedule_change(sender, instance, **kwargs):
+    """Отметка дней текущего месяца для пересчёта при изменении ставки, нормы часов или графика"""
+    previous_schedule = getattr(instance, '_previous_schedule', None)
+    if previous_schedule is None:
+        return
+
+    current_schedule = tuple(getattr(instance, field) for field in EMPLOYEE_SCHEDULE_FIELDS)
+    if tuple(previous_schedule) != current_schedule:
+        today = timezone.localdate()
+        mark_range_dirty(instance.id, today.replace(day=1), today, 'schedule')
@@ -13,9 +13,21 @@ from django.utils import timezone
 from django.core.exceptions import ValidationError
 from .models import SKUDDevice, SKUDEvent, Employee
 from .skud_device_communication import SKUDDeviceCommunicator, SKUDEventProcessor
+from .device_registry import device_registry
+from .ingest_queue import get_ingest_queue, is_queue_mode
+from .timestamp_parser import timestamp_parser
 
 logger = logging.getLogger(__name__)
 
+# Обязательные поля события СКУД
+REQUIRED_EVENT_FIELDS = ['card_number', 'event_type']
+
+# Максимальное количество событий в одном пакете
+MAX_BATCH_EVENTS = 1000
+
+# Строка NDJSON, которую не удалось разобрать
+INVALID_JSON_LINE = object()
+
 
 class SKUDAPIView(View):
     """Базовый класс для API СКУД"""
@@ -35,6 +47,17 @@ class SKUDAPIView(View):
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
+    
+    def validate_event_data(self, data):
+        """Проверка события, возвращает текст ошибки или None"""
+        if not isinstance(data, dict):
+            return 'Событие должно быть JSON объектом'
+        
+        for field in REQUIRED_EVENT_FIELDS:
+            if field not in data:
+                return f'Отсутствует обязательное поле: {field}'
+        
+        return None
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -53,7 +76,8 @@ class SKUDEventEndpoint(SKUDAPIView):
             'format': {
                 'card_number': 'string',
                 'event_type': 'entry|exit|denied|alarm',
-                'timestamp': 'ISO datetime'
+                'timestamp': 'ISO datetime',
+                'sequence': 'integer (необязательно, порядковый номер события на устройстве)'
             },
             'example': {
                 'card_number': '12345',
@@ -82,17 +106,27 @@ class SKUDEventEndpoint(SKUDAPIView):
                 }, status=400)
             
             # Проверяем наличие обязательных полей
-            required_fields = ['card_number', 'event_type']
-            for field in required_fields:
-                if field not in data:
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': f'Отсутствует обязательное поле: {field}'
-                    }, status=400)
+            error_message = self.validate_event_data(data)
+            if error_message:
+                return JsonResponse({
+                    'status': 'error',
+                    'message': error_message
+                }, status=400)
             
             # Добавляем IP адрес отправителя в данные
             data['device_ip'] = client_ip
             
+            # В режиме очереди только сохраняем событие, обработка выполняется воркером
+            if is_queue_mode():
+                if device_registry.get_by_ip(client_ip) is None:
+                    raise SKUDDevice.DoesNotExist
+                
+                get_ingest_queue().enqueue(client_ip, data)
+                return JsonResponse({
+                    'status': 'accepted',
+                    'message': 'Событие принято в очередь на обработку'
+                }, status=202)
+            
             # Обрабатываем событие
             communicator = SKUDDeviceCommunicator()
             skud_event = communicator.process_device_event(client_ip, data)
@@ -103,7 +137,8 @@ class SKUDEventEndpoint(SKUDAPIView):
                 'status': 'success',
                 'message': 'Событие успешно обработано',
                 'event_id': str(skud_event.id),
-                'employee_found': skud_event.employee is not None
+                'employee_found': skud_event.employee is not None,
+                'duplicate': skud_event.is_duplicate
             })
             
         except SKUDDevice.DoesNotExist:
@@ -121,6 +156,158 @@ class SKUDEventEndpoint(SKUDAPIView):
             }, status=500)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class SKUDEventBatchEndpoint(SKUDAPIView):
+    """
+    Endpoint для пакетного приема событий от одного СКУД устройства
+    POST /api/skud/events/batch/
+    
+    Принимает JSON массив событий, JSON объект {"events": [...]}
+    или NDJSON (одно событие на строку). Возвращает результат по каждому
+    событию, чтобы устройство могло повторить отправку только неудачных.
+    """
+    
+    def get(self, request):
+        """Информация о том, как использовать API"""
+        return JsonResponse({
+            'status': 'info',
+            'message': 'СКУД Batch Event API',
+            'usage': 'Отправляйте POST запросы с массивом событий (JSON или NDJSON)',
+            'max_events': MAX_BATCH_EVENTS,
+            'example': [
+                {'card_number': '12345', 'event_type': 'entry', 'timestamp': '2025-09-18T09:00:00'},
+                {'card_number': '12346', 'event_type': 'exit', 'timestamp': '2025-09-18T18:00:00'}
+            ]
+        })
+    
+    def post(self, request):
+        client_ip = self.get_client_ip(request)
+        
+        try:
+            items = self._parse_items(request)
+        except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+            logger.error(f"Ошибка парсинга пакета от {client_ip}: {e}")
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Неверный формат пакета: ожидается JSON массив или NDJSON'
+            }, status=400)
+        
+        if not items:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Пакет не содержит событий'
+            }, status=400)
+        
+        if len(items) > MAX_BATCH_EVENTS:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Слишком много событий в пакете (максимум {MAX_BATCH_EVENTS})'
+            }, status=413)
+        
+        # Проверяем каждое событие, невалидные сразу отмечаем ошибкой
+        results = [None] * len(items)
+        valid_indexes = []
+        valid_events = []
+        
+        for index, data in enumerate(items):
+            error_message = (
+                'Неверный формат JSON' if data is INVALID_JSON_LINE else self.validate_event_data(data)
+            )
+            if error_message:
+                results[index] = {'index': index, 'status': 'error', 'message': error_message}
+                continue
+            
+            data['device_ip'] = client_ip
+            valid_indexes.append(index)
+            valid_events.append(data)
+        
+        queued = bool(valid_events) and is_queue_mode()
+        
+        if valid_events:
+            try:
+                if queued:
+                    # В режиме очереди пакет сохраняется одной вставкой
+                    if device_registry.get_by_ip(client_ip) is None:
+                        raise ValueError(f"Устройство с IP {client_ip} не найдено")
+                    get_ingest_queue().enqueue_many(client_ip, valid_events)
+                    batch_results = [{'status': 'success', 'queued': True} for _ in valid_events]
+                else:
+                    # Ошибка отдельного события не отменяет остальные события пакета
+                    communicator = SKUDDeviceCommunicator()
+                    batch_results = communicator.process_device_events_isolated(client_ip, valid_events)
+            except ValueError as e:
+                # Устройство не зарегистрировано
+                logger.error(str(e))
+                return JsonResponse({
+                    'status': 'error',
+                    'message': 'Устройство не зарегистрировано в системе'
+                }, status=404)
+            except Exception as e:
+                logger.error(f"Ошибка пакетной обработки событий от {client_ip}: {e}")
+                batch_results = [
+                    {'status': 'error', 'message': 'Внутренняя ошибка сервера'}
+                    for _ in valid_events
+                ]
+            
+            for index, item_result in zip(valid_indexes, batch_results):
+                results[index] = {'index': index, **item_result}
+        
+        failed_count = sum(1 for result in results if result['status'] != 'success')
+        accepted_count = len(results) - failed_count
+        
+        logger.info(
+            f"Пакет СКУД от {client_ip}: принято {accepted_count}, ошибок {failed_count}"
+        )
+        
+        if accepted_count == 0:
+            overall_status = 'error'
+        elif failed_count:
+            overall_status = 'partial'
+        else:
+            overall_status = 'success'
+        
+        return JsonResponse({
+            'status': overall_status,
+            'accepted': accepted_count,
+            'failed': failed_count,
+            'results': results
+        }, status=500 if valid_events and accepted_count == 0 else (202 if queued else 200))
+    
+    def _parse_items(self, request):
+        """
+        Разбор тела запроса в список событий
+        
+        Строки NDJSON, которые не удалось распарсить, возвращаются как INVALID_JSON_LINE,
+        чтобы остальные события пакета были обработаны.
+        """
+        body = request.body.decode('utf-8')
+        
+        if request.content_type not in ('application/x-ndjson', 'application/jsonl'):
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                # Возможно, это NDJSON без соответствующего Content-Type
+                if '\n' not in body.strip():
+                    raise
+            else:
+                if isinstance(data, dict) and isinstance(data.get('events'), list):
+                    return data['events']
+                if isinstance(data, list):
+                    return data
+                raise ValueError('Ожидается массив событий')
+        
+        items = []
+        for line in body.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append(INVALID_JSON_LINE)
+        return items
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class SKUDStatusEndpoint(SKUDAPIView):
     """
@@ -142,7 +329,8 @@ class SKUDStatusEndpoint(SKUDAPIView):
                 'server_time': timezone.now().isoformat(),
                 'total_devices': total_devices,
                 'online_devices': online_devices,
-                'devices': health_status
+                'devices': health_status,
+                'timestamp_fallbacks': timestamp_parser.get_fallback_stats()
             })
             
         except Exception as e:
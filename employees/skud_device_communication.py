@@ -9,8 +9,16 @@ import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
 from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone as django_timezone
 from .models import SKUDDevice, SKUDEvent, Employee, WorkTimeRecord
+from .device_registry import device_registry
+from .card_resolver import card_resolver
+from .dashboard_snapshot import dashboard_snapshots
+from .live_events import publish_events
+from .dirty_days import mark_days_dirty
+from .timestamp_parser import timestamp_parser
+from .work_time_processor import WorkTimeProcessor
 
 logger = logging.getLogger(__name__)
 
@@ -195,26 +203,51 @@ class SKUDDeviceCommunicator:
             SKUDEvent: Созданное событие
         """
         try:
-            # Находим устройство по IP
-            device = SKUDDevice.objects.get(ip_address=device_ip)
+            # Находим устройство по IP (в реестре, без запроса к БД)
+            device = device_registry.get_by_ip(device_ip)
+            if device is None:
+                raise SKUDDevice.DoesNotExist
             
             # Парсим данные события
             card_number = event_data.get('card_number', '')
             event_type = self._determine_event_type(event_data)
-            event_time = self._parse_event_time(event_data.get('timestamp'))
+            event_time = self._parse_event_time(event_data.get('timestamp'), device.ip_address)
+            device_sequence = self._parse_device_sequence(event_data)
+            dedup_key = SKUDEvent.build_dedup_key(
+                device.id, card_number, event_type,
+                event_time if event_data.get('timestamp') else None, device_sequence
+            )
             
             # Ищем сотрудника по номеру карты
             employee = self._find_employee_by_card(card_number)
             
-            # Создаем событие
-            skud_event = SKUDEvent.objects.create(
-                device=device,
-                employee=employee,
-                card_number=card_number,
-                event_type=event_type,
-                event_time=event_time,
-                raw_data=json.dumps(event_data, ensure_ascii=False)
-            )
+            # Создаем событие, повторная отправка упирается в уникальный dedup_key
+            try:
+                with transaction.atomic():
+                    skud_event = SKUDEvent.objects.create(
+                        device=device,
+                        employee=employee,
+                        card_number=card_number,
+                        event_type=event_type,
+                        event_time=event_time,
+                        raw_data=json.dumps(event_data, ensure_ascii=False),
+                        device_sequence=device_sequence,
+                        dedup_key=dedup_key
+                    )
+            except IntegrityError:
+                if dedup_key is None:
+                    raise
+                skud_event = SKUDEvent.objects.get(dedup_key=dedup_key)
+                skud_event.is_duplicate = True
+                self.logger.info(f"Повторное событие СКУД отброшено: {skud_event.id}")
+                return skud_event
+            
+            skud_event.is_duplicate = False
+            
+            # Сессии и сводка дня сотрудника
+            self._process_new_events_for_work_days([skud_event])
+            transaction.on_commit(dashboard_snapshots.invalidate)
+            publish_events([skud_event])
             
             # Обрабатываем событие для рабочего времени
             self._process_event_for_work_time(skud_event)
@@ -229,6 +262,131 @@ class SKUDDeviceCommunicator:
             self.logger.error(f"Ошибка обработки события: {e}")
             raise
     
+    def process_device_events_batch(self, device_ip: str, events_data: List[Dict]) -> List[Dict]:
+        """
+        Пакетная обработка событий от одного СКУД устройства
+        
+        Все события сохраняются одним bulk_create, записи рабочего времени
+        обновляются одним bulk_create/bulk_update в рамках одной транзакции.
+        
+        Args:
+            device_ip: IP адрес устройства
+            events_data: Список данных событий (уже проверенных на наличие обязательных полей)
+            
+        Returns:
+            List[Dict]: Результат по каждому событию в порядке следования
+        """
+        device = device_registry.get_by_ip(device_ip)
+        if device is None:
+            self.logger.error(f"Устройство с IP {device_ip} не найдено")
+            raise ValueError(f"Устройство с IP {device_ip} не найдено")
+        
+        # Сотрудников ищем одним запросом для всех карт пакета
+        employees_by_card = self._find_employees_by_cards(
+            [event_data.get('card_number', '') for event_data in events_data]
+        )
+        
+        skud_events = []
+        for event_data in events_data:
+            card_number = event_data.get('card_number', '')
+            employee = employees_by_card.get(card_number)
+            event_type = self._determine_event_type(event_data)
+            event_time = self._parse_event_time(event_data.get('timestamp'), device.ip_address)
+            device_sequence = self._parse_device_sequence(event_data)
+            skud_events.append(SKUDEvent(
+                device=device,
+                employee=employee,
+                card_number=card_number,
+                event_type=event_type,
+                event_time=event_time,
+                raw_data=json.dumps(event_data, ensure_ascii=False),
+                device_sequence=device_sequence,
+                dedup_key=SKUDEvent.build_dedup_key(
+                    device.id, card_number, event_type,
+                    event_time if event_data.get('timestamp') else None, device_sequence
+                ),
+                # События с сотрудником обрабатываются в этой же транзакции
+                is_processed=employee is not None
+            ))
+        
+        # Повторы внутри самого пакета сводим к первому событию
+        first_by_key = {}
+        new_events = []
+        for skud_event in skud_events:
+            if skud_event.dedup_key is None:
+                new_events.append(skud_event)
+            elif skud_event.dedup_key not in first_by_key:
+                first_by_key[skud_event.dedup_key] = skud_event
+                new_events.append(skud_event)
+        
+        with transaction.atomic():
+            # Повторы ранее принятых событий отбрасываются уникальным индексом
+            SKUDEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+            
+            stored_ids = dict(
+                SKUDEvent.objects.filter(dedup_key__in=list(first_by_key))
+                .values_list('dedup_key', 'id')
+            ) if first_by_key else {}
+            
+            inserted_events = [
+                skud_event for skud_event in new_events
+                if skud_event.dedup_key is None or stored_ids.get(skud_event.dedup_key) == skud_event.id
+            ]
+            self._process_events_for_work_time_bulk(inserted_events, device)
+            self._process_new_events_for_work_days(inserted_events)
+            
+            if inserted_events:
+                transaction.on_commit(dashboard_snapshots.invalidate)
+            publish_events(inserted_events)
+        
+        inserted_ids = {skud_event.id for skud_event in inserted_events}
+        duplicates_count = len(skud_events) - len(inserted_ids)
+        
+        self.logger.info(
+            f"Создано {len(inserted_ids)} событий СКУД от {device.name} пакетом"
+            + (f", повторов отброшено: {duplicates_count}" if duplicates_count else "")
+        )
+        
+        results = []
+        for skud_event in skud_events:
+            is_duplicate = skud_event.id not in inserted_ids
+            event_id = stored_ids.get(skud_event.dedup_key, skud_event.id) if is_duplicate else skud_event.id
+            results.append({
+                'status': 'success',
+                'event_id': str(event_id),
+                'employee_found': skud_event.employee is not None,
+                'duplicate': is_duplicate
+            })
+        return results
+    
+    def process_device_events_isolated(self, device_ip: str, events_data: List[Dict]) -> List[Dict]:
+        """
+        Пакетная обработка с изоляцией ошибок отдельных событий
+        
+        Если пакет не удалось обработать, события обрабатываются по одному:
+        ошибку получают только события, которые не обрабатываются сами по себе.
+        
+        Raises:
+            ValueError: Устройство не зарегистрировано
+        """
+        if device_registry.get_by_ip(device_ip) is None:
+            self.logger.error(f"Устройство с IP {device_ip} не найдено")
+            raise ValueError(f"Устройство с IP {device_ip} не найдено")
+        
+        try:
+            return self.process_device_events_batch(device_ip, events_data)
+        except Exception as e:
+            self.logger.error(f"Ошибка пакетной обработки событий от {device_ip}, обработка по одному: {e}")
+        
+        results = []
+        for event_data in events_data:
+            try:
+                results.extend(self.process_device_events_batch(device_ip, [event_data]))
+            except Exception as e:
+                self.logger.error(f"Событие от {device_ip} не обработано: {e}, данные: {event_data}")
+                results.append({'status': 'error', 'message': 'Внутренняя ошибка сервера'})
+        return results
+    
     def _determine_event_type(self, event_data: Dict) -> str:
         """Определение типа события"""
         event_type = event_data.get('event_type', '').lower()
@@ -252,47 +410,53 @@ class SKUDDeviceCommunicator:
             
             return 'entry'  # По умолчанию считаем входом
     
-    def _parse_event_time(self, timestamp: str) -> datetime:
-        """Парсинг времени события"""
-        if not timestamp:
-            return django_timezone.now()
-        
-        try:
-            # Пробуем разные форматы времени
-            formats = [
-                '%Y-%m-%d %H:%M:%S',
-                '%Y-%m-%dT%H:%M:%S',
-                '%Y-%m-%dT%H:%M:%S.%f',
-                '%Y-%m-%dT%H:%M:%SZ',
-                '%Y-%m-%dT%H:%M:%S%z'
-            ]
-            
-            for fmt in formats:
-                try:
-                    dt = datetime.strptime(timestamp, fmt)
-                    if dt.tzinfo is None:
-                        dt = django_timezone.make_aware(dt)
-                    return dt
-                except ValueError:
-                    continue
-            
-            # Если не удалось распарсить, используем текущее время
-            return django_timezone.now()
-            
-        except Exception:
-            return django_timezone.now()
+    def _parse_event_time(self, timestamp: str, device_ip: Optional[str] = None) -> datetime:
+        """Парсинг времени события (формат запоминается для каждого устройства)"""
+        return timestamp_parser.parse_event_time(timestamp, device_ip)
     
-    def _find_employee_by_card(self, card_number: str) -> Optional[Employee]:
-        """Поиск сотрудника по номеру карты"""
-        if not card_number:
+    def _parse_device_sequence(self, event_data: Dict) -> Optional[int]:
+        """Порядковый номер события на устройстве (если устройство его передает)"""
+        sequence = event_data.get('sequence')
+        if sequence in (None, ''):
             return None
         
-        # Пока что используем employee_id как номер карты
-        # В будущем можно добавить отдельное поле card_number в модель Employee
         try:
-            return Employee.objects.get(employee_id=card_number)
-        except Employee.DoesNotExist:
+            sequence = int(sequence)
+        except (TypeError, ValueError):
             return None
+        return sequence if sequence >= 0 else None
+    
+    def _process_new_events_for_work_days(self, skud_events: List[SKUDEvent]):
+        """
+        Обработка новых событий в сессиях и сводках дней сотрудников
+        
+        События применяются к концу дня (WorkTimeProcessor.process_new_events),
+        без пересчёта всего дня. Дни, которые так обработать нельзя (событие
+        пришло с опозданием, день ещё не обработан, есть ручные сессии, ошибка),
+        отмечаются для пакетного пересчёта.
+        """
+        events_by_day = {}
+        for skud_event in skud_events:
+            if skud_event.employee_id is not None:
+                day = django_timezone.localdate(skud_event.event_time)
+                events_by_day.setdefault((skud_event.employee_id, day), []).append(skud_event)
+        
+        processor = WorkTimeProcessor()
+        mark_days_dirty(
+            (
+                (employee_id, day) for (employee_id, day), events in events_by_day.items()
+                if not processor.process_new_events(events[0].employee, day, events, rebuild_late=False)
+            ),
+            'event'
+        )
+    
+    def _find_employee_by_card(self, card_number: str) -> Optional[Employee]:
+        """Поиск сотрудника по номеру карты"""
+        return card_resolver.resolve(card_number)
+    
+    def _find_employees_by_cards(self, card_numbers: List[str]) -> Dict[str, Employee]:
+        """Поиск сотрудников по списку номеров карт"""
+        return card_resolver.resolve_many(card_numbers)
     
     def _process_event_for_work_time(self, event: SKUDEvent):
         """Обработка события для записи рабочего времени"""
@@ -308,24 +472,77 @@ class SKUDDeviceCommunicator:
             defaults={}
         )
         
+        self._apply_event_to_work_record(work_record, event, event.device)
+        
+        work_record.save()
+        event.is_processed = True
+        event.save(update_fields=['is_processed'])
+    
+    def _process_events_for_work_time_bulk(self, events: List[SKUDEvent], device: SKUDDevice):
+        """Обработка пакета событий одного устройства для записей рабочего времени"""
+        events = sorted(
+            (event for event in events if event.employee is not None),
+            key=lambda event: event.event_time
+        )
+        if not events:
+            return
+        
+        # Загружаем существующие записи одним запросом
+        keys = {(event.employee.id, event.event_time.date()) for event in events}
+        employee_ids = {employee_id for employee_id, _ in keys}
+        dates = {event_date for _, event_date in keys}
+        
+        records = {
+            (record.employee_id, record.date): record
+            for record in WorkTimeRecord.objects.filter(employee_id__in=employee_ids, date__in=dates)
+        }
+        existing_keys = set(records)
+        
+        for event in events:
+            key = (event.employee.id, event.event_time.date())
+            work_record = records.get(key)
+            if work_record is None:
+                work_record = WorkTimeRecord(employee=event.employee, date=key[1])
+                records[key] = work_record
+            self._apply_event_to_work_record(work_record, event, device)
+        
+        new_records = []
+        changed_records = []
+        for key, work_record in records.items():
+            if key not in keys:
+                continue
+            # bulk-операции обходят save(), поэтому считаем итоги явно
+            work_record.calculate_total_hours()
+            if key in existing_keys:
+                changed_records.append(work_record)
+            else:
+                new_records.append(work_record)
+        
+        WorkTimeRecord.objects.bulk_create(new_records)
+        if changed_records:
+            for work_record in changed_records:
+                work_record.updated_at = django_timezone.now()
+            WorkTimeRecord.objects.bulk_update(changed_records, [
+                'arrival_time', 'departure_time', 'arrival_event', 'departure_event',
+                'total_hours', 'is_present', 'notes', 'updated_at'
+            ])
+    
+    def _apply_event_to_work_record(self, work_record: WorkTimeRecord, event: SKUDEvent, device: SKUDDevice):
+        """Обновление записи рабочего времени по событию"""
         event_time = event.event_time.time()
         
         # Обновляем время в зависимости от типа события
         if event.event_type == 'entry':
             work_record.arrival_time = event_time
             work_record.arrival_event = event
-            work_record.notes = f"Вход через {event.device.name}"
+            work_record.notes = f"Вход через {device.name}"
         elif event.event_type == 'exit':
             work_record.departure_time = event_time
             work_record.departure_event = event
             if work_record.notes:
-                work_record.notes += f"; Выход через {event.device.name}"
+                work_record.notes += f"; Выход через {device.name}"
             else:
-                work_record.notes = f"Выход через {event.device.name}"
-        
-        work_record.save()
-        event.is_processed = True
-        event.save(update_fields=['is_processed'])
+                work_record.notes = f"Выход через {device.name}"
     
     def get_device_events(self, device: SKUDDevice, hours: int = 24) -> List[SKUDEvent]:
         """
@@ -9,6 +9,7 @@ from typing import List, Dict, Optional
 from django.conf import settings
 from django.utils import timezone
 from .models import Employee, WorkTimeRecord
+from .timestamp_parser import timestamp_parser
 
 
 class SKUDIntegration:
@@ -180,23 +181,7 @@ class SKUDIntegration:
         Returns:
             Объект time или None
         """
-        if not time_str:
-            return None
-        
-        try:
-            # Пробуем разные форматы времени
-            formats = ['%H:%M:%S', '%H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
-            
-            for fmt in formats:
-                try:
-                    dt = datetime.strptime(time_str, fmt)
-                    return dt.time()
-                except ValueError:
-                    continue
-            
-            return None
-        except Exception:
-            return None
+        return timestamp_parser.parse_time(time_str)
 
 
 class SKUDMockIntegration(SKUDIntegration):
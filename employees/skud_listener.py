@@ -0,0 +1,246 @@
+"""
+Прием событий от СКУД контроллеров по TCP/UDP (asyncio)
+
+Контроллер отправляет события JSON объектами: по TCP - по одному на строку
+(NDJSON), по UDP - одна датаграмма с объектом, массивом или NDJSON.
+Устройство определяется по IP адресу отправителя, как и в HTTP API.
+
+События накапливаются в буфере и сохраняются пакетами через
+SKUDDeviceCommunicator.process_device_events_batch (или в очередь приема,
+если включен режим очереди), поэтому один процесс обслуживает тысячи
+соединений без отдельного WSGI воркера на каждое.
+"""
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .device_registry import device_registry
+from .ingest_queue import get_ingest_queue, is_queue_mode
+from .skud_api import REQUIRED_EVENT_FIELDS
+from .skud_device_communication import SKUDDeviceCommunicator
+
+logger = logging.getLogger(__name__)
+
+
+def parse_frame(line: bytes) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    """
+    Разбор одного кадра (строки) от контроллера
+
+    Returns:
+        Список пар (данные события, None) или (None, текст ошибки)
+    """
+    line = line.strip()
+    if not line:
+        return []
+
+    try:
+        data = json.loads(line.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return [(None, 'Неверный формат JSON')]
+
+    items = data if isinstance(data, list) else [data]
+    frames = []
+    for item in items:
+        if not isinstance(item, dict):
+            frames.append((None, 'Событие должно быть JSON объектом'))
+            continue
+
+        missing = [field for field in REQUIRED_EVENT_FIELDS if field not in item]
+        if missing:
+            frames.append((None, f'Отсутствует обязательное поле: {missing[0]}'))
+        else:
+            frames.append((item, None))
+    return frames
+
+
+def persist_events(device_ip: str, events_data: List[Dict]) -> List[Dict]:
+    """
+    Сохранение пакета событий одного устройства (синхронно, вызывается из потока)
+
+    События незарегистрированных устройств отклоняются и в режиме очереди,
+    как в HTTP API. Ошибка отдельного события не отменяет остальные события
+    пакета (отправитель по UDP ответа не получает, поэтому они не теряются).
+    """
+    close_old_connections()
+    try:
+        if is_queue_mode():
+            if device_registry.get_by_ip(device_ip) is None:
+                raise ValueError(f"Устройство с IP {device_ip} не найдено")
+            get_ingest_queue().enqueue_many(device_ip, events_data)
+            return [{'status': 'success', 'queued': True} for _ in events_data]
+
+        return SKUDDeviceCommunicator().process_device_events_isolated(device_ip, events_data)
+    finally:
+        close_old_connections()
+
+
+class SKUDFrameListener:
+    """TCP/UDP сервер приема событий СКУД с пакетной записью"""
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.5, send_ack: bool = True):
+        self.logger = logger
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.send_ack = send_ack
+        self.stats = {'received': 0, 'saved': 0, 'failed': 0, 'connections': 0}
+
+        # IP устройства -> список (данные события, future для ответа)
+        self._buffer: Dict[str, List[Tuple[Dict, Optional[asyncio.Future]]]] = OrderedDict()
+        self._buffered = 0
+        self._flush_event = None
+        self._persist = sync_to_async(persist_events, thread_sensitive=True)
+
+    def add_event(self, device_ip: str, event_data: Dict) -> asyncio.Future:
+        """Добавление события в буфер, future завершается результатом сохранения"""
+        event_data['device_ip'] = device_ip
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.setdefault(device_ip, []).append((event_data, future))
+        self._buffered += 1
+        self.stats['received'] += 1
+
+        if self._buffered >= self.batch_size:
+            self._flush_event.set()
+        return future
+
+    async def flush(self) -> None:
+        """Сохранение всех накопленных событий пакетами по устройствам"""
+        buffer, self._buffer = self._buffer, OrderedDict()
+        self._buffered = 0
+
+        for device_ip, items in buffer.items():
+            events_data = [event_data for event_data, _ in items]
+            try:
+                results = await self._persist(device_ip, events_data)
+            except ValueError as e:
+                # Устройство не зарегистрировано
+                self.logger.warning(str(e))
+                results = [{'status': 'error', 'message': 'Устройство не зарегистрировано в системе'}] * len(items)
+            except Exception as e:
+                self.logger.error(f"Ошибка сохранения событий от {device_ip}: {e}")
+                results = [{'status': 'error', 'message': 'Внутренняя ошибка сервера'}] * len(items)
+
+            for (_, future), result in zip(items, results):
+                if result['status'] == 'success':
+                    self.stats['saved'] += 1
+                else:
+                    self.stats['failed'] += 1
+                if not future.done():
+                    future.set_result(result)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            if self._buffered:
+                await self.flush()
+
+    async def handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Обработка TCP соединения контроллера"""
+        device_ip = writer.get_extra_info('peername')[0]
+        self.stats['connections'] += 1
+        self.logger.info(f"СКУД контроллер подключен: {device_ip}")
+
+        acks = asyncio.Queue()
+        ack_task = asyncio.create_task(self._write_acks(writer, acks)) if self.send_ack else None
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    self.logger.warning(f"Слишком длинный кадр от {device_ip}, соединение закрыто")
+                    break
+                if not line:
+                    break
+
+                for event_data, error in parse_frame(line):
+                    if error:
+                        self.stats['failed'] += 1
+                        result = {'status': 'error', 'message': error}
+                    else:
+                        result = self.add_event(device_ip, event_data)
+                    if ack_task:
+                        await acks.put(result)
+        except ConnectionError:
+            pass
+        finally:
+            self.stats['connections'] -= 1
+            if ack_task:
+                await acks.put(None)
+                await ack_task
+            writer.close()
+            self.logger.info(f"СКУД контроллер отключен: {device_ip}")
+
+    async def _write_acks(self, writer: asyncio.StreamWriter, acks: asyncio.Queue) -> None:
+        """Отправка ответов контроллеру в порядке получения кадров"""
+        while True:
+            item = await acks.get()
+            if item is None:
+                return
+
+            result = await item if isinstance(item, asyncio.Future) else item
+            try:
+                writer.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                return
+
+    async def serve(self, host: str, tcp_port: Optional[int] = None, udp_port: Optional[int] = None) -> None:
+        """Запуск серверов и фоновой записи пакетов"""
+        loop = asyncio.get_running_loop()
+        self._flush_event = asyncio.Event()
+        flush_task = asyncio.create_task(self._flush_loop())
+
+        servers = []
+        transports = []
+        if tcp_port:
+            servers.append(await asyncio.start_server(self.handle_tcp, host, tcp_port))
+            self.logger.info(f"СКУД TCP listener запущен на {host}:{tcp_port}")
+        if udp_port:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: SKUDDatagramProtocol(self), local_addr=(host, udp_port)
+            )
+            transports.append(transport)
+            self.logger.info(f"СКУД UDP listener запущен на {host}:{udp_port}")
+
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in servers), flush_task)
+        finally:
+            for server in servers:
+                server.close()
+            for transport in transports:
+                transport.close()
+            flush_task.cancel()
+            if self._buffered:
+                await self.flush()
+
+
+class SKUDDatagramProtocol(asyncio.DatagramProtocol):
+    """Прием событий по UDP (ответы не отправляются)"""
+
+    def __init__(self, listener: SKUDFrameListener):
+        self.listener = listener
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        device_ip = addr[0]
+
+        # Датаграмма - один JSON (объект или массив) либо NDJSON
+        frames = parse_frame(data)
+        if len(frames) == 1 and frames[0][1] == 'Неверный формат JSON' and b'\n' in data.strip():
+            frames = [frame for line in data.splitlines() for frame in parse_frame(line)]
+
+        for event_data, error in frames:
+            if error:
+                self.listener.stats['failed'] += 1
+                logger.warning(f"Неверный UDP кадр от {device_ip}: {error}")
+            else:
+                self.listener.add_event(device_ip, event_data)
@@ -0,0 +1,191 @@
+"""
+Потоковая выгрузка таблиц в XLSX и CSV
+
+Книга XLSX пишется xlsxwriter в режиме constant_memory: строки сбрасываются на
+диск по мере записи, поэтому память не зависит от размера выгрузки. Ширина
+колонок считается по ходу записи строк, без повторного обхода ячеек.
+Готовый файл (временный, удаляется после отправки) отдается FileResponse.
+
+Строки листа должны записываться по порядку, листы книги - независимо
+друг от друга.
+
+CSV отдается StreamingHttpResponse: строки формируются пачками по мере
+чтения из базы (QuerySet.iterator), поэтому первый байт уходит клиенту
+сразу, а память не зависит от периода выгрузки. При compress=True поток
+сжимается gzip (если клиент его принимает).
+"""
+
+import csv
+import logging
+import re
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import xlsxwriter
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Ограничения Excel на имя листа
+SHEET_TITLE_MAX_LENGTH = 31
+SHEET_TITLE_INVALID_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+
+# Строк CSV в одном фрагменте ответа
+CSV_CHUNK_ROWS = 500
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class TableSheet:
+    """Лист с таблицей: заголовок таблицы и строки данных с границами"""
+
+    MAX_COLUMN_WIDTH = 50
+
+    def __init__(self, writer: 'StreamingXlsxWriter', worksheet, headers: List[str], title: Optional[str] = None):
+        self.writer = writer
+        self.worksheet = worksheet
+        self.widths = [0] * len(headers)
+        self.row = 0
+
+        # Заголовок отчета над таблицей (через строку)
+        if title:
+            self.worksheet.merge_range(0, 0, 0, len(headers) - 1, title, writer.formats['title'])
+            self.row = 2
+
+        for col, header in enumerate(headers):
+            self.worksheet.write(self.row, col, header, writer.formats['header'])
+            self._track_width(col, header)
+        self.row += 1
+
+    def write_row(self, values: Iterable, highlight: bool = False) -> None:
+        """Запись строки данных (highlight - выделить строку цветом)"""
+        cell_format = self.writer.formats['highlight' if highlight else 'cell']
+        for col, value in enumerate(values):
+            if value is None or value == '':
+                self.worksheet.write_blank(self.row, col, None, cell_format)
+            else:
+                self.worksheet.write(self.row, col, value, cell_format)
+                self._track_width(col, value)
+        self.row += 1
+
+    def finish(self) -> None:
+        """Установка ширины колонок по самому длинному значению"""
+        for col, width in enumerate(self.widths):
+            self.worksheet.set_column(col, col, min(width + 2, self.MAX_COLUMN_WIDTH))
+
+    def _track_width(self, col: int, value) -> None:
+        if col >= len(self.widths):
+            self.widths.extend([0] * (col + 1 - len(self.widths)))
+        self.widths[col] = max(self.widths[col], len(str(value)))
+
+
+class StreamingXlsxWriter:
+    """
+    Потоковая запись книги XLSX во временный файл
+
+    Пример:
+        writer = StreamingXlsxWriter()
+        sheet = writer.add_sheet('Отчёт', headers)
+        for row in rows:
+            sheet.write_row(row)
+        return writer.response('report.xlsx')
+    """
+
+    def __init__(self, header_color: str = '#366092', highlight_color: str = '#FFE6E6'):
+        self.logger = logger
+        self.file = tempfile.TemporaryFile(suffix='.xlsx')
+        self.workbook = xlsxwriter.Workbook(self.file, {'constant_memory': True})
+        self.sheets = []
+        self.formats = {
+            'title': self.workbook.add_format({'bold': True, 'font_size': 16}),
+            'header': self.workbook.add_format({
+                'bold': True, 'font_color': '#FFFFFF', 'bg_color': header_color, 'border': 1,
+                'align': 'center', 'valign': 'vcenter',
+            }),
+            'cell': self.workbook.add_format({'border': 1}),
+            'highlight': self.workbook.add_format({'border': 1, 'bg_color': highlight_color}),
+        }
+
+    def add_sheet(self, name: str, headers: List[str], title: Optional[str] = None) -> TableSheet:
+        """Новый лист с таблицей (title - заголовок отчета над таблицей)"""
+        worksheet = self.workbook.add_worksheet(self.sheet_title(name))
+        sheet = TableSheet(self, worksheet, headers, title)
+        self.sheets.append(sheet)
+        return sheet
+
+    def close(self):
+        """Завершение книги; возвращает файл, открытый на чтение с начала"""
+        for sheet in self.sheets:
+            sheet.finish()
+        self.workbook.close()
+        self.file.seek(0)
+        return self.file
+
+    def response(self, filename: str) -> FileResponse:
+        """Ответ с готовой книгой (временный файл удаляется после отправки)"""
+        return FileResponse(
+            self.close(), as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE
+        )
+
+    @staticmethod
+    def sheet_title(name: str) -> str:
+        """Имя листа с учетом ограничений Excel"""
+        return SHEET_TITLE_INVALID_CHARS.sub('_', name)[:SHEET_TITLE_MAX_LENGTH] or 'Лист'
+
+
+class _EchoBuffer:
+    """Буфер для csv.writer: возвращает записанную строку вместо хранения"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv(headers: Sequence[str], rows: Iterable[Sequence], bom: bool = True,
+             chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Фрагменты CSV в UTF-8 по chunk_rows строк
+
+    Args:
+        bom: Добавить BOM для корректного отображения в Excel
+    """
+    writer = csv.writer(_EchoBuffer())
+    chunk = ['\ufeff' if bom else '', writer.writerow(headers)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+
+def accepts_gzip(request) -> bool:
+    """Принимает ли клиент ответ, сжатый gzip"""
+    return bool(ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def streaming_csv_response(filename: str, headers: Sequence[str], rows: Iterable[Sequence],
+                           compress: bool = False) -> StreamingHttpResponse:
+    """
+    Потоковый ответ с CSV
+
+    Args:
+        rows: Итератор строк (например, values_list(...).iterator())
+        compress: Сжимать поток gzip (проверку Accept-Encoding делает вызывающий код)
+    """
+    content = iter_csv(headers, rows)
+    if compress:
+        content = compress_sequence(content)
+
+    response = StreamingHttpResponse(content, content_type=CSV_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,65 @@
+"""
+Celery задачи приложения employees
+"""
+
+import logging
+
+from celery import shared_task
+
+from .dashboard_snapshot import dashboard_snapshots
+from .dirty_days import drain_all_dirty_days
+from .ingest_queue import get_ingest_queue
+from .report_jobs import cleanup_expired_jobs, run_pending_jobs
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def drain_skud_ingest_queue(batch_size=None, max_batches=None):
+    """Обработка очереди событий СКУД пакетами"""
+    result = get_ingest_queue().drain_all(batch_size=batch_size, max_batches=max_batches)
+    if result['processed'] or result['failed']:
+        logger.info(
+            f"Очередь СКУД: обработано {result['processed']}, ошибок {result['failed']}, "
+            f"пакетов {result['batches']}"
+        )
+    return result
+
+
+@shared_task(ignore_result=True)
+def drain_dirty_work_days(batch_size=None, max_batches=None):
+    """Пересчёт дней сотрудников, отмеченных к пересчёту"""
+    result = drain_all_dirty_days(batch_size=batch_size, max_batches=max_batches)
+    if result['processed'] or result['failed']:
+        logger.info(
+            f"Пересчёт отмеченных дней: пересчитано {result['processed']}, ошибок {result['failed']}, "
+            f"пакетов {result['batches']}"
+        )
+    return result
+
+
+@shared_task(ignore_result=True)
+def refresh_dashboard_snapshots():
+    """Фоновая пересборка устаревших снимков дашборда"""
+    refreshed = dashboard_snapshots.refresh_stale()
+    if refreshed:
+        logger.info(f"Снимки дашборда: пересобрано {refreshed}")
+    return refreshed
+
+
+@shared_task(ignore_result=True)
+def run_report_jobs(batch_size=None):
+    """Формирование отчётов по заданиям из очереди"""
+    result = run_pending_jobs(batch_size=batch_size)
+    if result['processed']:
+        logger.info(f"Задания на отчёты: выполнено {result['processed']}")
+    return result
+
+
+@shared_task(ignore_result=True)
+def cleanup_report_jobs():
+    """Удаление устаревших заданий на отчёты и их файлов"""
+    deleted = cleanup_expired_jobs()
+    if deleted:
+        logger.info(f"Задания на отчёты: удалено устаревших {deleted}")
+    return deleted
@@ -1,3 +1,1174 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import time as time_module
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .absence_calendar import AbsenceCalendar
+from .analytics_queries import departments_chart, problematic_employees_chart, top_employees_chart
+from .api_views import ReportJobViewSet
+from .attendance_queries import MONTHLY_FIELDS, attendance_queryset
+from .birthdays import todays_birthdays, upcoming_birthdays
+from .cache_utils import is_shared_cache
+from .card_resolver import CardResolver, card_resolver
+from .columnar_worktime import ColumnarWorkTimeEngine
+from .device_registry import device_registry
+from .dirty_days import MAX_ATTEMPTS, drain_dirty_days, mark_days_dirty, pending_dirty_days
+from .frontend_views import live_events_stream
+from .ingest_queue import DatabaseIngestQueue
+from .live_events import LocalEventBroker, build_messages, live_events_available
+from .dashboard_snapshot import ALL_SCOPE, DashboardSnapshotService, build_dashboard_payload
+from .models import (
+    BusinessTrip, Department, Division, Employee, EmployeeMonthSummary, Organization, ReportJob, SKUDCard,
+    SKUDDevice, SKUDEvent, SKUDIngestItem, Vacation, WorkDayDirtyMark, WorkDaySummary, WorkSession,
+)
+from .month_rollup import get_period_totals
+from .permissions import PermissionChecker
+from .report_jobs import run_pending_jobs, submit_job
+from .skud_device_communication import SKUDDeviceCommunicator
+from .skud_listener import SKUDDatagramProtocol, SKUDFrameListener, parse_frame, persist_events
+from .timestamp_parser import ISO_FORMAT, TimestampParser
+from .tabular_export import StreamingXlsxWriter, iter_csv, streaming_csv_response
+from .work_time_processor import WorkTimeProcessor
+
+
+class OrgStructureTestCase(TestCase):
+    """Общая оргструктура тестов: организация, отдел и подразделение"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name='Организация')
+        cls.department = Department.objects.create(organization=cls.organization, name='Отдел')
+        cls.division = Division.objects.create(department=cls.department, name='Подразделение')
+
+    @classmethod
+    def create_employee(cls, employee_id, **fields):
+        values = {
+            'first_name': 'Имя', 'last_name': 'Фамилия', 'birth_date': '1990-01-01', 'hire_date': '2020-01-01',
+            'gender': 'M', 'phone': '+998901234567', 'email': f'{employee_id.lower()}@example.com',
+            'organization': cls.organization, 'department': cls.department, 'division': cls.division,
+            'position': 'specialist',
+        }
+        values.update(fields)
+        return Employee.objects.create(employee_id=employee_id, **values)
+
+
+class ColumnarWorkTimeParityTest(OrgStructureTestCase):
+    """Колоночный движок даёт те же сессии и сводки, что и WorkTimeProcessor"""
+
+    FROM_DATE = date(2024, 3, 4)
+    TO_DATE = date(2024, 3, 8)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        cls.device = SKUDDevice.objects.create(
+            name='Турникет', ip_address='10.0.0.1', device_type='door',
+            serial_number='SN-1', location='Вход'
+        )
+
+        cls.employees = []
+        for n in range(3):
+            cls.employees.append(cls.create_employee(
+                f'E{n}', last_name=f'Фамилия{n}', work_fraction=Decimal(['1.00', '0.50', '1.00'][n])
+            ))
+
+        first, second, third = cls.employees
+        day = cls.FROM_DATE
+
+        # Обычный день, короткая сессия, повторный вход и выход без входа
+        cls._events(first, day, [
+            ('09:00', 'entry'), ('12:00', 'exit'), ('12:30', 'entry'), ('12:31', 'exit'),
+            ('13:00', 'entry'), ('13:05', 'entry'), ('18:00', 'exit'), ('18:10', 'exit'),
+        ])
+        # Открытая сессия в конце дня
+        cls._events(first, day + timedelta(days=1), [('09:00', 'entry'), ('11:00', 'exit'), ('14:00', 'entry')])
+        # Только выходы - сессий нет
+        cls._events(first, day + timedelta(days=2), [('10:00', 'exit'), ('11:00', 'out')])
+
+        # Направление из raw_data и события около полуночи
+        cls._events(second, day, [
+            ('00:00', 'denied', '{"direction": "in"}'), ('01:00', 'alarm', '{"direction": "out"}'),
+            ('23:55', 'entry'),
+        ])
+        cls._events(second, day + timedelta(days=1), [('00:02', 'exit'), ('08:00', 'вход'), ('10:00', 'выход')])
+
+        # Отпуск: день с событиями получает статус excused
+        Vacation.objects.create(
+            employee=third, start_date=day + timedelta(days=3), end_date=day + timedelta(days=4),
+            days_count=2, status='approved'
+        )
+        cls._events(third, day + timedelta(days=3), [('09:00', 'entry'), ('17:00', 'exit')])
+        cls._events(third, day, [('09:00', 'entry'), ('10:00', 'exit')])
+
+    @classmethod
+    def _events(cls, employee, day, items):
+        for item in items:
+            clock, event_type = item[0], item[1]
+            raw_data = item[2] if len(item) > 2 else ''
+            event_time = timezone.make_aware(datetime.combine(day, datetime.strptime(clock, '%H:%M').time()))
+            SKUDEvent.objects.create(
+                device=cls.device, employee=employee, card_number=employee.employee_id,
+                event_type=event_type, event_time=event_time, raw_data=raw_data
+            )
+
+    def _snapshot(self):
+        sessions = sorted(
+            (s.employee_id, s.date, s.start_time, s.end_time, s.status,
+             s.duration_seconds if s.end_time else None,
+             s.start_event_id, s.end_event_id, s.event_count,
+             tuple(str(pk) for pk in s.get_source_events().values_list('id', flat=True)))
+            for s in WorkSession.objects.all()
+        )
+        # Длительность открытой сессии зависит от текущего времени и не сравнивается
+        summaries = sorted(
+            (s.employee_id, s.date, s.first_entry, s.last_exit,
+             None if s.has_missing_exit else s.total_seconds_in_office,
+             s.expected_seconds,
+             None if s.has_missing_exit else (s.overtime_seconds, s.underwork_seconds),
+             s.status, s.sessions_count, s.has_missing_exit, s.last_event_time,
+             s.late_minutes, s.early_leave_minutes,
+             None if s.has_missing_exit else s.shortfall_seconds)
+            for s in WorkDaySummary.objects.all()
+        )
+        return sessions, summaries
+
+    def _reset(self):
+        WorkSession.objects.all().delete()
+        WorkDaySummary.objects.all().delete()
+
+    def test_rebuild_matches_work_time_processor(self):
+        # Часы устройства спешат: открытая сессия начинается позже текущего времени
+        first = self.employees[0]
+        future_entry = timezone.now() + timedelta(minutes=30)
+        SKUDEvent.objects.create(
+            device=self.device, employee=first, card_number=first.employee_id,
+            event_type='entry', event_time=future_entry
+        )
+        future_day = timezone.localdate(future_entry)
+
+        processor = WorkTimeProcessor()
+        day = self.FROM_DATE
+        while day <= self.TO_DATE:
+            for employee in self.employees:
+                if processor._get_employee_events_for_date(employee, day):
+                    self.assertTrue(processor.process_skud_events_for_employee(employee, day))
+            day += timedelta(days=1)
+        self.assertTrue(processor.process_skud_events_for_employee(first, future_day))
+        expected = self._snapshot()
+
+        # Повторный пересчёт заменяет автоматические сессии и обновляет сводки
+        self._reset()
+        for _ in range(2):
+            ColumnarWorkTimeEngine().rebuild(self.FROM_DATE, self.TO_DATE)
+            ColumnarWorkTimeEngine().rebuild(future_day, future_day)
+            self.assertEqual(self._snapshot(), expected)
+            self.assertEqual(WorkSession.objects.get(employee=first, date=future_day).duration_seconds, 0)
+
+    def test_schedule_metrics(self):
+        first = self.employees[0]
+        first.work_start_time = time(8, 30)
+        first.work_end_time = time(18, 30)
+        first.save()
+
+        processor = WorkTimeProcessor()
+        processor.process_day_batch(self.FROM_DATE, employees=Employee.objects.filter(id=first.id))
+        processor.process_day_batch(self.FROM_DATE + timedelta(days=1), employees=Employee.objects.filter(id=first.id))
+
+        # 09:00-12:00 и 13:05-18:00 при графике 08:30-18:30 и норме 8 часов
+        summary = WorkDaySummary.objects.get(employee=first, date=self.FROM_DATE)
+        self.assertEqual((summary.late_minutes, summary.early_leave_minutes), (30, 30))
+        self.assertEqual(summary.shortfall_seconds, 8 * 3600 - summary.total_seconds_in_office)
+
+        # Незакрытая сессия: ранний уход не считается, недобор - вся норма дня
+        summary = WorkDaySummary.objects.get(employee=first, date=self.FROM_DATE + timedelta(days=1))
+        self.assertEqual((summary.late_minutes, summary.early_leave_minutes), (30, 0))
+        self.assertEqual(summary.shortfall_seconds, 8 * 3600)
+
+    def test_skip_existing_and_pairs(self):
+        first = self.employees[0]
+        ColumnarWorkTimeEngine().rebuild(
+            self.FROM_DATE, self.TO_DATE, pairs={(first.id, self.FROM_DATE)}
+        )
+        self.assertEqual(
+            list(WorkDaySummary.objects.values_list('employee_id', 'date')),
+            [(first.id, self.FROM_DATE)]
+        )
+
+        result = ColumnarWorkTimeEngine().rebuild(self.FROM_DATE, self.TO_DATE, skip_existing=True)
+        self.assertEqual(result['summaries_updated'], 0)
+        self.assertEqual(result['summaries_created'], WorkDaySummary.objects.count() - 1)
+
+    def test_open_session_starting_in_future(self):
+        # Часы устройства спешат: вход позже текущего времени
+        first = self.employees[0]
+        event_time = timezone.now() + timedelta(minutes=30)
+        SKUDEvent.objects.create(
+            device=self.device, employee=first, card_number=first.employee_id,
+            event_type='entry', event_time=event_time
+        )
+        day = timezone.localdate(event_time)
+
+        result = WorkTimeProcessor().process_day_batch(day, employees=Employee.objects.filter(id=first.id))
+        self.assertEqual(result['errors'], 0)
+        session = WorkSession.objects.get(employee=first, date=day)
+        self.assertEqual((session.status, session.duration_seconds), ('open', 0))
+
+    def test_batch_falls_back_to_single_employees(self):
+        first, second, third = self.employees
+        fill_schedule_metrics = WorkTimeProcessor._fill_schedule_metrics
+
+        def failing_for_second(processor, summary, employee):
+            if employee.id == second.id:
+                raise ValueError('ошибка сводки')
+            fill_schedule_metrics(processor, summary, employee)
+
+        with mock.patch.object(WorkTimeProcessor, '_fill_schedule_metrics', failing_for_second):
+            result = WorkTimeProcessor().process_day_batch(self.FROM_DATE)
+
+        self.assertEqual((result['processed'], result['errors'], set(result['failed_employees'])), (2, 1, {second.id}))
+        self.assertEqual(
+            set(WorkDaySummary.objects.filter(date=self.FROM_DATE).values_list('employee_id', flat=True)),
+            {first.id, third.id}
+        )
+
+    def test_partition_errors_are_counted_per_employee(self):
+        from .management.commands.worktime_rebuild import rebuild_partition
+
+        first, second, third = self.employees
+        rebuild = ColumnarWorkTimeEngine.rebuild
+
+        def failing_for_second(engine, from_date, to_date, employees=None, **kwargs):
+            if second.id in set(employees.values_list('id', flat=True)):
+                raise ValueError('ошибка пересчёта')
+            return rebuild(engine, from_date, to_date, employees=employees, **kwargs)
+
+        with mock.patch.object(ColumnarWorkTimeEngine, 'rebuild', failing_for_second):
+            stats = rebuild_partition(
+                [employee.id for employee in self.employees], self.FROM_DATE, self.TO_DATE,
+                force_rebuild=True, dry_run=False, columnar=True
+            )
+
+        self.assertEqual((stats['errors'], stats['processed_employees']), (1, 2))
+        self.assertEqual(stats['created_summaries'], WorkDaySummary.objects.count())
+        self.assertFalse(WorkDaySummary.objects.filter(employee=second).exists())
+
+
+class EmployeeMonthSummaryTest(OrgStructureTestCase):
+    """Сводки за месяц совпадают с суммами дневных сводок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.employee = cls.create_employee('M1')
+
+    def _summary(self, day, hours, status='present', late_minutes=0):
+        return WorkDaySummary.objects.create(
+            employee=self.employee, date=day, status=status,
+            total_seconds_in_office=hours * 3600, expected_seconds=8 * 3600,
+            sessions_count=1 if hours else 0, late_minutes=late_minutes
+        )
+
+    def test_rollup_follows_day_summaries(self):
+        self._summary(date(2024, 1, 31), 8)
+        self._summary(date(2024, 2, 1), 9, late_minutes=30)
+        summary = self._summary(date(2024, 2, 2), 0, status='absent')
+
+        rollup = EmployeeMonthSummary.objects.get(employee=self.employee, month=date(2024, 2, 1))
+        self.assertEqual(
+            (rollup.total_seconds_in_office, rollup.expected_seconds, rollup.overtime_seconds,
+             rollup.underwork_seconds, rollup.days_count, rollup.present_days, rollup.absent_days,
+             rollup.days_with_sessions, rollup.late_days),
+            (9 * 3600, 16 * 3600, 3600, 0, 2, 1, 1, 1, 1)
+        )
+
+        # Пересчёт дня обновляет сводку за месяц
+        summary.status = 'excused'
+        summary.expected_seconds = 0
+        summary.save()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.absent_days, rollup.excused_days, rollup.expected_seconds), (0, 1, 8 * 3600))
+
+    def test_period_totals_combine_months_and_partial_days(self):
+        self._summary(date(2024, 1, 30), 7)
+        self._summary(date(2024, 1, 31), 8)
+        self._summary(date(2024, 2, 1), 9)
+        self._summary(date(2024, 3, 1), 6)
+
+        totals = get_period_totals([self.employee.id], date(2024, 1, 31), date(2024, 3, 1))
+        self.assertEqual(totals[self.employee.id]['total_seconds_in_office'], (8 + 9 + 6) * 3600)
+        self.assertEqual(totals[self.employee.id]['days_count'], 3)
+
+        totals = get_period_totals([self.employee.id], date(2024, 1, 1), date(2024, 1, 31))
+        self.assertEqual(totals[self.employee.id]['total_seconds_in_office'], 15 * 3600)
+
+    def test_monthly_attendance_annotations_match_period_totals(self):
+        self._summary(date(2024, 1, 31), 8)
+        self._summary(date(2024, 2, 1), 9)
+        self._summary(date(2024, 2, 2), 0, status='absent')
+        self._summary(date(2024, 3, 1), 6)
+
+        employees = Employee.objects.filter(id=self.employee.id)
+        for date_from, date_to in ((date(2024, 1, 31), date(2024, 3, 1)), (date(2024, 2, 2), date(2024, 2, 20))):
+            totals = get_period_totals(employees, date_from, date_to)[self.employee.id]
+            row = attendance_queryset(employees, 'monthly', date_from, date_to).get()
+            self.assertEqual(
+                [getattr(row, f'period_{field}') for field in MONTHLY_FIELDS],
+                [totals[field] for field in MONTHLY_FIELDS]
+            )
+
+        self.assertEqual(attendance_queryset(employees, 'monthly', date(2024, 1, 31), date(2024, 3, 1)).get().status, 'average')
+        self.assertFalse(attendance_queryset(
+            employees, 'monthly', date(2024, 2, 1), date(2024, 2, 29), status_filter='excellent'
+        ).exists())
+
+    def test_batch_processing_refreshes_rollup(self):
+        day = date(2024, 3, 4)
+        WorkTimeProcessor().process_day_batch(day, employees=Employee.objects.filter(id=self.employee.id))
+        rollup = EmployeeMonthSummary.objects.get(employee=self.employee, month=date(2024, 3, 1))
+        self.assertEqual((rollup.days_count, rollup.absent_days), (1, 1))
+
+
+class DashboardPayloadQueryCountTest(OrgStructureTestCase):
+    """Число запросов при сборке дашборда не зависит от числа сотрудников"""
+
+    # Фиксированная прошедшая дата: события дня не оказываются в будущем
+    DAY = date(2024, 3, 4)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.device = SKUDDevice.objects.create(
+            name='Турникет', ip_address='10.0.0.2', device_type='door',
+            serial_number='SN-2', location='Вход'
+        )
+
+    def _add_employees(self, count):
+        processor = WorkTimeProcessor()
+        start = Employee.objects.count()
+        for n in range(start, start + count):
+            employee = self.create_employee(f'D{n}', last_name=f'Фамилия{n}', gender='F')
+            for clock, event_type in (('09:00', 'entry'), ('12:00', 'exit'), ('13:00', 'entry')):
+                SKUDEvent.objects.create(
+                    device=self.device, employee=employee, card_number=employee.employee_id,
+                    event_type=event_type,
+                    event_time=timezone.make_aware(
+                        datetime.combine(self.DAY, datetime.strptime(clock, '%H:%M').time())
+                    )
+                )
+            processor.process_skud_events_for_employee(employee, self.DAY)
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            payload = build_dashboard_payload(Employee.objects.filter(is_active=True), self.DAY)
+        return len(context.captured_queries), payload
+
+    def test_query_count_is_constant(self):
+        self._add_employees(2)
+        small_count, payload = self._count_queries()
+        self.assertEqual(len(payload['today_attendance']), 2)
+
+        self._add_employees(5)
+        large_count, payload = self._count_queries()
+        self.assertEqual(large_count, small_count)
+
+        attendance = payload['today_attendance'][0]
+        self.assertEqual(len(attendance['day_events']), 3)
+        self.assertEqual(attendance['last_event']['type'], 'entry')
+        self.assertEqual(attendance['work_status'], 'На работе')
+
+    def _count_analytics_queries(self):
+        today = self.DAY
+        counts = []
+        for build in (
+            lambda: top_employees_chart(today - timedelta(days=6), 5),
+            lambda: departments_chart(today - timedelta(days=6), today, 7, 5, 'hours'),
+            lambda: problematic_employees_chart(today - timedelta(days=6), today, 'all', 10, 'all'),
+        ):
+            with CaptureQueriesContext(connection) as context:
+                data = build()
+            counts.append(len(context.captured_queries))
+        return counts, data
+
+    def test_analytics_query_count_is_constant(self):
+        self._add_employees(2)
+        small_counts, _ = self._count_analytics_queries()
+
+        self._add_employees(5)
+        large_counts, data = self._count_analytics_queries()
+        self.assertEqual(large_counts, small_counts)
+        self.assertEqual(len(data['table_data']), 7)
+
+        departments = departments_chart(self.DAY, self.DAY, 1, 5, 'hours')
+        self.assertEqual(departments['table_data'][0]['total_employees'], 7)
+        self.assertEqual(
+            departments['table_data'][0]['present_today'],
+            WorkSession.objects.filter(date=self.DAY).values('employee').distinct().count()
+        )
+
+
+class DashboardSnapshotServiceTest(OrgStructureTestCase):
+    """Снимки дашборда по областям доступа"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.employees = [
+            cls.create_employee(f'S{n}', last_name=f'Фамилия{n}')
+            for n in range(2)
+        ]
+        cls.user = User.objects.create_user('manager', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        accessible = mock.patch.object(
+            PermissionChecker, 'get_accessible_employees',
+            return_value=Employee.objects.filter(id=self.employees[0].id)
+        )
+        accessible.start()
+        self.addCleanup(accessible.stop)
+
+    def _evict_scope_ids(self, scope):
+        cache.delete(DashboardSnapshotService._scope_ids_key(scope))
+
+    def test_evicted_scope_is_recomputed_for_user(self):
+        service = DashboardSnapshotService()
+        scope = service.get_scope(self.user)
+        self._evict_scope_ids(scope)
+
+        self.assertIsNone(service.get_scope_employees(scope))
+        self.assertEqual(
+            list(service.get_scope_employees(scope, self.user).values_list('id', flat=True)), [self.employees[0].id]
+        )
+
+        self._evict_scope_ids(scope)
+        payload = service.get(self.user)
+        self.assertEqual(payload['total_employees'], 1)
+
+    def test_refresh_skips_evicted_scopes(self):
+        service = DashboardSnapshotService()
+        scope = service.get_scope(self.user)
+        service._touch_scope(scope)
+        self._evict_scope_ids(scope)
+
+        with mock.patch('employees.dashboard_snapshot.is_shared_cache', return_value=True):
+            self.assertEqual(service.refresh_stale(), 0)
+        self.assertIsNone(cache.get(DashboardSnapshotService._snapshot_key(scope)))
+
+    def test_refresh_requires_shared_cache(self):
+        service = DashboardSnapshotService()
+        service._touch_scope(ALL_SCOPE)
+
+        self.assertFalse(is_shared_cache())
+        self.assertEqual(service.refresh_stale(), 0)
+        with mock.patch('employees.dashboard_snapshot.is_shared_cache', return_value=True):
+            self.assertEqual(service.refresh_stale(), 1)
+
+class UpcomingBirthdaysTest(OrgStructureTestCase):
+    """Ближайшие дни рождения по ключу birth_month_day"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for n, birth_date in enumerate(['1990-12-30', '1985-01-02', '1992-02-29', '1988-02-28', '1995-03-01']):
+            cls.create_employee(f'B{n}', last_name=f'Фамилия{n}', birth_date=birth_date)
+
+    def _ids(self, items):
+        return [item['employee'].employee_id for item in items]
+
+    def test_birth_month_day_is_stored(self):
+        employee = Employee.objects.get(employee_id='B2')
+        self.assertEqual(employee.birth_month_day, 229)
+
+        employee.birth_date = date(1992, 7, 15)
+        employee.save(update_fields=['birth_date'])
+        employee.refresh_from_db()
+        self.assertEqual(employee.birth_month_day, 715)
+
+    def test_year_wrap(self):
+        upcoming = upcoming_birthdays(Employee.objects.all(), date(2025, 12, 29), limit=3)
+        self.assertEqual(self._ids(upcoming), ['B0', 'B1', 'B3'])
+        self.assertEqual(upcoming[1]['birthday_date'], date(2026, 1, 2))
+        self.assertEqual(upcoming[1]['days_until'], 4)
+
+    def test_leap_day_in_common_year(self):
+        today = date(2025, 2, 28)
+        self.assertEqual(
+            sorted(todays_birthdays(Employee.objects.all(), today).values_list('employee_id', flat=True)),
+            ['B2', 'B3']
+        )
+        upcoming = upcoming_birthdays(Employee.objects.all(), today, limit=2, include_today=False)
+        self.assertEqual(self._ids(upcoming), ['B4', 'B0'])
+
+        upcoming = upcoming_birthdays(Employee.objects.all(), date(2025, 2, 27), days=1)
+        self.assertEqual(self._ids(upcoming), ['B3', 'B2'])
+        self.assertEqual({item['days_until'] for item in upcoming}, {1})
+
+    def test_leap_day_in_leap_year(self):
+        upcoming = upcoming_birthdays(Employee.objects.all(), date(2028, 2, 28), days=1, include_today=False)
+        self.assertEqual(self._ids(upcoming), ['B2'])
+        self.assertEqual(upcoming[0]['birthday_date'], date(2028, 2, 29))
+
+
+class LiveEventsBrokerTest(SimpleTestCase):
+    """Рассылка событий подписчикам по их области доступа"""
+
+    def _event(self, employee, event_type):
+        device = SKUDDevice(name='Турникет', ip_address='10.0.0.3', device_type='door', serial_number='SN-3')
+        return SKUDEvent(
+            device=device, employee=employee, card_number='100', event_type=event_type,
+            event_time=timezone.now()
+        )
+
+    async def test_fan_out_by_scope(self):
+        first = Employee(last_name='Первый', first_name='Имя')
+        second = Employee(last_name='Второй', first_name='Имя')
+        broker = LocalEventBroker(queue_size=10)
+        everyone = broker.subscribe()
+        scoped = broker.subscribe({str(first.id)})
+
+        broker.publish(build_messages([
+            self._event(first, 'entry'), self._event(second, 'entry'), self._event(first, 'exit'),
+            self._event(None, 'entry'),
+        ]))
+
+        received = []
+        while (message := await everyone.get(0.1)) is not None:
+            received.append(message['type'])
+        self.assertEqual(received, ['skud_event'] * 4 + ['presence'] * 2)
+
+        received = []
+        while (message := await scoped.get(0.1)) is not None:
+            received.append((message['type'], message['data'].get('event_type'), message['data'].get('is_present')))
+        self.assertEqual(received, [
+            ('skud_event', 'entry', None), ('skud_event', 'exit', None), ('presence', None, False),
+        ])
+
+        scoped.close()
+        everyone.close()
+        self.assertEqual(broker.subscribers_count(), 0)
+
+    async def test_overflow_requests_resync(self):
+        broker = LocalEventBroker(queue_size=1)
+        subscription = broker.subscribe()
+        broker.publish(build_messages([self._event(None, 'entry'), self._event(None, 'exit')]))
+
+        self.assertEqual((await subscription.get(0.1))['type'], 'skud_event')
+        self.assertEqual((await subscription.get(0.1))['type'], 'resync')
+        self.assertIsNone(await subscription.get(0.1))
+
+
+class LiveEventsStreamTest(SimpleTestCase):
+    """Поток событий открывается только под ASGI"""
+
+    def test_availability_follows_server_interface(self):
+        self.assertFalse(live_events_available(RequestFactory().get('/api/live-events/')))
+        self.assertTrue(live_events_available(AsyncRequestFactory().get('/api/live-events/')))
+
+    async def test_wsgi_request_is_rejected(self):
+        response = await live_events_stream(RequestFactory().get('/api/live-events/'))
+        self.assertEqual(response.status_code, 503)
+
+
+class TabularExportTest(SimpleTestCase):
+    def test_rows_and_column_widths(self):
+        import openpyxl
+
+        writer = StreamingXlsxWriter()
+        sheet = writer.add_sheet('Отчёт: 01/2026', ['ФИО', 'Часы'], title='Заголовок')
+        sheet.write_row(['Иванов Иван Иванович', 8.5])
+        sheet.write_row(['Петров', None], highlight=True)
+
+        workbook = openpyxl.load_workbook(writer.close())
+        worksheet = workbook.active
+        self.assertEqual(worksheet.title, 'Отчёт_ 01_2026')
+        self.assertEqual(
+            list(worksheet.iter_rows(values_only=True)),
+            [('Заголовок', None), (None, None), ('ФИО', 'Часы'),
+             ('Иванов Иван Иванович', 8.5), ('Петров', None)]
+        )
+        self.assertAlmostEqual(worksheet.column_dimensions['A'].width, len('Иванов Иван Иванович') + 2, delta=1)
+
+    def test_csv_streams_in_chunks_and_gzip(self):
+        import gzip
+
+        rows = ([f'Сотрудник {index}', index] for index in range(5))
+        chunks = list(iter_csv(['ФИО', 'Номер'], rows, chunk_rows=3))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode('utf-8-sig').splitlines()[:2], ['ФИО,Номер', 'Сотрудник 0,0'])
+
+        response = streaming_csv_response('report.csv', ['ФИО'], iter([['Иванов']]), compress=True)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), '\ufeffФИО\r\nИванов\r\n'.encode('utf-8'))
+
+
+class ReportJobTest(OrgStructureTestCase):
+    """Задания на отчёты переиспользуют файл, пока данные отчёта не менялись"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.employee = cls.create_employee('R1')
+        cls.summary = WorkDaySummary.objects.create(
+            employee=cls.employee, date=date(2024, 3, 1), status='present',
+            total_seconds_in_office=8 * 3600, expected_seconds=8 * 3600, sessions_count=1
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, REPORT_JOB_SETTINGS={'EXECUTOR': 'celery'}))
+
+    def test_job_builds_file_and_is_reused_until_data_changes(self):
+        params = {'year': 2024, 'month': 3}
+        job = submit_job(None, 'monthly_csv', params)
+        self.assertEqual(job.status, 'pending')
+
+        self.assertEqual(run_pending_jobs()['processed'], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.filename), ('done', 100, 'worktime_report_2024_03.csv'))
+        with job.file.open('rb') as report_file:
+            self.assertIn('Фамилия Имя', report_file.read().decode('utf-8-sig'))
+
+        reused = submit_job(None, 'monthly_csv', params)
+        self.assertEqual((reused.status, reused.file.name), ('done', job.file.name))
+
+        self.summary.total_seconds_in_office = 9 * 3600
+        self.summary.save()
+        self.assertEqual(submit_job(None, 'monthly_csv', params).status, 'pending')
+        self.assertEqual(ReportJob.objects.filter(status='done').count(), 2)
+
+    def test_department_report_requires_access_to_whole_department(self):
+        department = self.department
+        other_division = Division.objects.create(department=department, name='Другое подразделение')
+        self.create_employee('R2', last_name='Другой', division=other_division)
+        user = User.objects.create_user('division_manager', password='secret')
+        params = {'department_id': str(department.id), 'start_date': '2024-03-01', 'end_date': '2024-03-31'}
+
+        for accessible, allowed in (
+            (Employee.objects.filter(division=self.employee.division), False),
+            (Employee.objects.filter(department=department), True),
+        ):
+            with mock.patch.object(PermissionChecker, 'get_accessible_employees', return_value=accessible):
+                self.assertEqual(ReportJobViewSet()._can_order_report(user, params), allowed)
+
+
+class SKUDIngestionTest(OrgStructureTestCase):
+    """Прием событий СКУД: сессии и сводки дня обновляются без пересчёта всего дня"""
+
+    DAY = date(2024, 3, 4)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.device = SKUDDevice.objects.create(
+            name='Турникет', ip_address='10.0.2.1', device_type='door', serial_number='SN-I1', location='Вход'
+        )
+        cls.employees = [
+            cls.create_employee(f'I{n}', last_name=f'Фамилия{n}')
+            for n in range(2)
+        ]
+
+    def _event(self, employee, clock, event_type='entry', **extra):
+        timestamp = timezone.make_aware(datetime.combine(self.DAY, datetime.strptime(clock, '%H:%M').time()))
+        return {
+            'card_number': employee.employee_id, 'event_type': event_type,
+            'timestamp': timestamp.isoformat(), **extra
+        }
+
+    def _ingest(self, *events_data):
+        return SKUDDeviceCommunicator().process_device_events_batch(self.device.ip_address, list(events_data))
+
+    def _dirty_days(self):
+        return list(WorkDayDirtyMark.objects.values_list('employee_id', 'date'))
+
+    def test_new_events_extend_the_day_without_rebuild(self):
+        employee = self.employees[0]
+        self._ingest(self._event(employee, '09:00'))
+        # День ещё не обработан - пересчитывается пакетно
+        self.assertEqual(self._dirty_days(), [(employee.id, self.DAY)])
+        drain_dirty_days()
+        first_session = WorkSession.objects.get(employee=employee, date=self.DAY)
+
+        self._ingest(self._event(employee, '12:00', 'exit'), self._event(employee, '13:00'))
+        self.assertEqual(self._dirty_days(), [])
+        sessions = list(WorkSession.objects.filter(employee=employee, date=self.DAY).order_by('start_time'))
+        self.assertEqual(
+            [(s.id == first_session.id, s.status, s.end_time is None) for s in sessions],
+            [(True, 'auto', False), (False, 'open', True)]
+        )
+        self.assertEqual(sessions[0].duration_seconds, 3 * 3600)
+        summary = WorkDaySummary.objects.get(employee=employee, date=self.DAY)
+        self.assertEqual((summary.sessions_count, summary.has_missing_exit), (2, True))
+
+        # Событие с опозданием - день пересчитывается полностью
+        self._ingest(self._event(employee, '08:00', 'exit'))
+        self.assertEqual(self._dirty_days(), [(employee.id, self.DAY)])
+
+    def test_batch_returns_result_per_event(self):
+        employee = self.employees[0]
+        entry = self._event(employee, '09:00', sequence=1)
+        unknown = {'card_number': 'UNKNOWN', 'event_type': 'entry', 'timestamp': entry['timestamp']}
+
+        results = self._ingest(entry, unknown, dict(entry))
+
+        self.assertEqual(
+            [(r['status'], r['employee_found'], r['duplicate']) for r in results],
+            [('success', True, False), ('success', False, False), ('success', True, True)]
+        )
+        self.assertEqual(results[2]['event_id'], results[0]['event_id'])
+        self.assertEqual(SKUDEvent.objects.filter(device=self.device).count(), 2)
+
+    def test_retried_events_are_not_stored_twice(self):
+        first, second = self.employees
+        events_data = [self._event(first, '09:00'), self._event(second, '09:05', sequence=7)]
+        stored = self._ingest(*events_data)
+
+        retried = self._ingest(*events_data)
+        self.assertEqual([r['duplicate'] for r in retried], [True, True])
+        self.assertEqual([r['event_id'] for r in retried], [r['event_id'] for r in stored])
+
+        single = SKUDDeviceCommunicator().process_device_event(self.device.ip_address, events_data[0])
+        self.assertEqual((single.is_duplicate, str(single.id)), (True, stored[0]['event_id']))
+        self.assertEqual(SKUDEvent.objects.filter(device=self.device).count(), 2)
+
+    def _post_batch(self, body, content_type='application/json'):
+        return self.client.post(
+            reverse('skud_events_batch'), body, content_type=content_type, REMOTE_ADDR=self.device.ip_address
+        )
+
+    def test_endpoint_rejects_non_object_items(self):
+        employee = self.employees[0]
+        response = self._post_batch(json.dumps([self._event(employee, '09:00'), '<script>', 5]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['status'], r.get('message')) for r in response.json()['results']],
+            [('success', None), ('error', 'Событие должно быть JSON объектом'),
+             ('error', 'Событие должно быть JSON объектом')]
+        )
+
+        response = self._post_batch(
+            json.dumps(self._event(employee, '10:00')) + '\n{"card_number": \n', 'application/x-ndjson'
+        )
+        self.assertEqual(
+            response.json()['results'][1], {'index': 1, 'status': 'error', 'message': 'Неверный формат JSON'}
+        )
+
+    def test_endpoint_isolates_failing_events(self):
+        first, second = self.employees
+        process_batch = SKUDDeviceCommunicator.process_device_events_batch
+
+        def failing_for_second(communicator, device_ip, events_data):
+            if any(event_data['card_number'] == second.employee_id for event_data in events_data):
+                raise RuntimeError('ошибка записи')
+            return process_batch(communicator, device_ip, events_data)
+
+        with mock.patch.object(SKUDDeviceCommunicator, 'process_device_events_batch', failing_for_second):
+            response = self._post_batch(json.dumps([self._event(first, '09:00'), self._event(second, '09:05')]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.json()['status'], [r['status'] for r in response.json()['results']]),
+            ('partial', ['success', 'error'])
+        )
+        self.assertEqual(SKUDEvent.objects.filter(device=self.device).count(), 1)
+
+    def test_queue_retries_and_parks_failing_events(self):
+        first, second = self.employees
+        process_batch = SKUDDeviceCommunicator.process_device_events_batch
+
+        def failing_for_unknown_card(communicator, device_ip, events_data):
+            if any(event_data['card_number'] == 'BROKEN' for event_data in events_data):
+                raise ValueError('некорректное событие')
+            return process_batch(communicator, device_ip, events_data)
+
+        queue = DatabaseIngestQueue(max_attempts=2)
+        queue.enqueue_many(self.device.ip_address, [
+            self._event(first, '09:00'), {'card_number': 'BROKEN', 'event_type': 'entry'},
+            self._event(second, '09:05'),
+        ])
+
+        with mock.patch.object(SKUDDeviceCommunicator, 'process_device_events_batch', failing_for_unknown_card):
+            # Ошибка одного события не мешает остальным событиям пакета
+            self.assertEqual(queue.drain(), {'processed': 2, 'failed': 1})
+            self.assertEqual(
+                set(SKUDEvent.objects.filter(device=self.device).values_list('employee_id', flat=True)),
+                {first.id, second.id}
+            )
+            item = SKUDIngestItem.objects.get()
+            self.assertEqual((item.attempts, item.is_failed, queue.size()), (1, False, 1))
+
+            # Повтор не раньше чем через retry_delay: в том же проходе событие не выбирается
+            self.assertEqual(queue.drain_all(), {'processed': 0, 'failed': 0, 'batches': 0})
+            retry_at = timezone.now() + timedelta(seconds=queue.retry_delay + 1)
+            with mock.patch('employees.ingest_queue.timezone.now', return_value=retry_at):
+                self.assertEqual(queue.drain(), {'processed': 0, 'failed': 1})
+            self.assertEqual(queue.drain(), {'processed': 0, 'failed': 0})
+
+        item.refresh_from_db()
+        self.assertEqual((item.attempts, item.is_failed, queue.size()), (2, True, 0))
+        self.assertIn('некорректное событие', item.last_error)
+
+
+class SKUDListenerTest(OrgStructureTestCase):
+    """Прием событий по TCP/UDP: разбор кадров, ответы и пакетная запись"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.device = SKUDDevice.objects.create(
+            name='Турникет', ip_address='127.0.0.1', device_type='door', serial_number='SN-L1', location='Вход'
+        )
+        cls.employee = cls.create_employee('L1')
+
+    def setUp(self):
+        # Соединение тестовой транзакции не должно закрываться
+        patcher = mock.patch('employees.skud_listener.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        device_registry.invalidate()
+
+    def _event(self, **extra):
+        return {'card_number': self.employee.employee_id, 'event_type': 'entry', **extra}
+
+    def test_parse_frame(self):
+        self.assertEqual(parse_frame(b'  \n'), [])
+        self.assertEqual(parse_frame(b'{"card_number": "1", "event_type": "in"}\n'), [
+            ({'card_number': '1', 'event_type': 'in'}, None)
+        ])
+        self.assertEqual(parse_frame(b'[{"card_number": "1", "event_type": "in"}, "text", {"card_number": "2"}]'), [
+            ({'card_number': '1', 'event_type': 'in'}, None),
+            (None, 'Событие должно быть JSON объектом'),
+            (None, 'Отсутствует обязательное поле: event_type'),
+        ])
+        self.assertEqual(parse_frame(b'{"card_number": '), [(None, 'Неверный формат JSON')])
+
+    async def test_udp_datagram_with_ndjson(self):
+        listener = SKUDFrameListener(batch_size=10)
+        listener._flush_event = asyncio.Event()
+        datagram = (json.dumps(self._event()) + '\n' + json.dumps(self._event(sequence=2)) + '\nnot json\n').encode()
+
+        SKUDDatagramProtocol(listener).datagram_received(datagram, ('10.0.3.1', 5000))
+
+        self.assertEqual(
+            [event_data.get('sequence') for event_data, _ in listener._buffer['10.0.3.1']], [None, 2]
+        )
+        self.assertEqual((listener.stats['received'], listener.stats['failed']), (2, 1))
+
+    async def test_tcp_acks_follow_frame_order(self):
+        listener = SKUDFrameListener(flush_interval=0.01)
+        listener._flush_event = asyncio.Event()
+        flush_task = asyncio.create_task(listener._flush_loop())
+        server = await asyncio.start_server(listener.handle_tcp, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(json.dumps(self._event(sequence=1)).encode() + b'\n{"card_number": "1"}\n')
+        await writer.drain()
+        acks = [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in range(2)]
+        writer.close()
+
+        server.close()
+        flush_task.cancel()
+
+        self.assertEqual((acks[0]['status'], acks[0]['employee_found']), ('success', True))
+        self.assertEqual(acks[1], {'status': 'error', 'message': 'Отсутствует обязательное поле: event_type'})
+        self.assertEqual(await SKUDEvent.objects.filter(device=self.device).acount(), 1)
+
+    async def test_flush_reports_unknown_device(self):
+        listener = SKUDFrameListener()
+        listener._flush_event = asyncio.Event()
+        future = listener.add_event('10.0.3.2', self._event())
+
+        await listener.flush()
+
+        self.assertEqual(future.result(), {'status': 'error', 'message': 'Устройство не зарегистрировано в системе'})
+        self.assertEqual(listener.stats['failed'], 1)
+
+    def test_queue_mode_rejects_unknown_device(self):
+        with override_settings(SKUD_INGEST_SETTINGS={'MODE': 'queue', 'BACKEND': 'database'}):
+            with self.assertRaises(ValueError):
+                persist_events('10.0.3.2', [self._event()])
+            self.assertEqual(
+                persist_events(self.device.ip_address, [self._event()]), [{'status': 'success', 'queued': True}]
+            )
+        self.assertEqual(SKUDIngestItem.objects.filter(device_ip=self.device.ip_address).count(), 1)
+
+    def test_failing_event_does_not_fail_the_batch(self):
+        process_batch = SKUDDeviceCommunicator.process_device_events_batch
+
+        def failing_for_broken_card(communicator, device_ip, events_data):
+            if any(event_data['card_number'] == 'BROKEN' for event_data in events_data):
+                raise ValueError('некорректное событие')
+            return process_batch(communicator, device_ip, events_data)
+
+        with mock.patch.object(SKUDDeviceCommunicator, 'process_device_events_batch', failing_for_broken_card):
+            results = persist_events(self.device.ip_address, [
+                self._event(sequence=1), {'card_number': 'BROKEN', 'event_type': 'entry'}, self._event(sequence=2),
+            ])
+
+        self.assertEqual([result['status'] for result in results], ['success', 'error', 'success'])
+        self.assertEqual(SKUDEvent.objects.filter(device=self.device).count(), 2)
+
+
+class CardResolverTest(OrgStructureTestCase):
+    """Определение сотрудника по номеру карты"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.employees = [
+            cls.create_employee(f'K{n}', last_name=f'Фамилия{n}', is_active=n < 2)
+            for n in range(3)
+        ]
+
+    def setUp(self):
+        card_resolver.invalidate()
+
+    def test_cards_take_priority_over_employee_ids(self):
+        first, second, inactive = self.employees
+        SKUDCard.objects.create(card_number=first.employee_id, employee=second)
+        SKUDCard.objects.create(card_number='CARD-1', employee=first)
+        card_resolver.invalidate()
+
+        self.assertEqual(card_resolver.resolve(first.employee_id), second)
+        self.assertEqual(
+            card_resolver.resolve_many(['CARD-1', second.employee_id, inactive.employee_id, '']),
+            {'CARD-1': first, second.employee_id: second}
+        )
+        # Неактивные сотрудники по карте не определяются
+        self.assertIsNone(card_resolver.resolve(inactive.employee_id))
+
+    def test_unknown_card_is_cached_for_negative_ttl(self):
+        first = self.employees[0]
+        self.assertIsNone(card_resolver.resolve('GUEST'))
+
+        # Сигнал сбрасывает индекс только после фиксации транзакции - в тесте её нет
+        SKUDCard.objects.create(card_number='GUEST', employee=first)
+        with CaptureQueriesContext(connection) as context:
+            self.assertIsNone(card_resolver.resolve('GUEST'))
+        self.assertEqual(len(context.captured_queries), 0)
+
+        expired = time_module.monotonic() + CardResolver.NEGATIVE_TTL + 1
+        with mock.patch('employees.card_resolver.time.monotonic', return_value=expired):
+            self.assertEqual(card_resolver.resolve('GUEST'), first)
+
+    def test_schedule_change_invalidates_cached_employee(self):
+        first = self.employees[0]
+        self.assertIsNone(card_resolver.resolve(first.employee_id).work_start_time)
+
+        first.work_start_time = time(8, 30)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save(update_fields=['work_start_time'])
+
+        self.assertEqual(card_resolver.resolve(first.employee_id).work_start_time, time(8, 30))
+
+    def test_card_change_invalidates_index(self):
+        first = self.employees[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            card = SKUDCard.objects.create(card_number='CARD-2', employee=first)
+        self.assertEqual(card_resolver.resolve('CARD-2'), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.delete()
+        self.assertIsNone(card_resolver.resolve('CARD-2'))
+
+
+class DeviceRegistryTest(TestCase):
+    """Устройство, добавленное после загрузки реестра, находится через БД"""
+
+    def test_miss_falls_back_to_database(self):
+        SKUDDevice.objects.create(
+            name='Турникет', ip_address='10.0.1.1', device_type='door', serial_number='SN-R1', location='Вход'
+        )
+        device_registry.invalidate()
+        self.assertIsNotNone(device_registry.get_by_ip('10.0.1.1'))
+
+        # Сигнал сбрасывает реестр только после фиксации транзакции - в тесте её нет
+        added = SKUDDevice.objects.create(
+            name='Турникет 2', ip_address='10.0.1.2', device_type='door', serial_number='SN-R2', location='Вход'
+        )
+        self.assertEqual(device_registry.get_by_ip('10.0.1.2'), added)
+        with self.assertNumQueries(0):
+            self.assertEqual(device_registry.get_by_ip('10.0.1.2'), added)
+
+        self.assertIsNone(device_registry.get_by_ip('10.0.1.3'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(device_registry.get_by_ip('10.0.1.3'))
+
+
+class TimestampParserTest(SimpleTestCase):
+    """Запасные форматы сохраняют часовой пояс (UTC с суффиксом Z)"""
+
+    class WithoutIsoParser(TimestampParser):
+        # Как на Python 3.10, где fromisoformat не принимает суффикс Z
+        def _try_format(self, value, fmt):
+            if fmt == ISO_FORMAT and value.endswith('Z'):
+                return None
+            return super()._try_format(value, fmt)
+
+    def test_utc_suffix_in_fallback_formats(self):
+        parser = self.WithoutIsoParser()
+        expected = datetime.fromisoformat('2024-03-04T06:00:00+00:00')
+        self.assertEqual(parser.parse_datetime('2024-03-04T06:00:00Z', '10.0.0.9'), expected)
+        self.assertEqual(parser.parse_datetime('2024-03-04T06:00:00.250Z', '10.0.0.9'),
+                         expected.replace(microsecond=250000))
+        # Запомненный формат устройства тоже учитывает пояс
+        self.assertEqual(parser.parse_datetime('2024-03-04T06:00:00Z', '10.0.0.9'), expected)
+
+        naive = parser.parse_datetime('2024-03-04T06:00:00', '10.0.0.9')
+        self.assertEqual(naive, timezone.make_aware(datetime(2024, 3, 4, 6, 0)))
+
+    def test_missing_and_unparsed_time_are_counted(self):
+        parser = TimestampParser()
+        for value in (None, '', 'не время'):
+            self.assertIsNotNone(parser.parse_event_time(value, '10.0.0.9'))
+        self.assertEqual(parser.get_fallback_stats(), {'10.0.0.9': 3})
+
+
+class AbsenceCalendarTest(OrgStructureTestCase):
+    """Календарь отсутствий загружает только нужные окна и следит за версией в БД"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.employees = [
+            cls.create_employee(f'A{n}', last_name=f'Фамилия{n}')
+            for n in range(2)
+        ]
+        Vacation.objects.create(
+            employee=cls.employees[0], start_date=date(2024, 3, 1), end_date=date(2024, 3, 10),
+            days_count=10, status='approved'
+        )
+        Vacation.objects.create(
+            employee=cls.employees[0], start_date=date(2023, 1, 1), end_date=date(2023, 1, 10),
+            days_count=10, status='approved'
+        )
+
+    def test_window_is_cached_until_database_version_changes(self):
+        first, second = self.employees
+        calendar = AbsenceCalendar()
+
+        # Версия (по запросу на модель) и окно запрошенных сотрудников (по запросу на модель)
+        with self.assertNumQueries(4):
+            self.assertEqual(calendar.get_excused_ids([first.id, second.id], date(2024, 3, 5)), {first.id})
+        with self.assertNumQueries(0):
+            self.assertTrue(calendar.is_excused(first.id, date(2024, 3, 10)))
+            self.assertFalse(calendar.is_excused(first.id, date(2024, 3, 11)))
+
+        # Отпуск добавлен "в другом процессе": сигнал сброса сюда не доходит
+        BusinessTrip.objects.create(
+            employee=second, start_date=date(2024, 3, 4), end_date=date(2024, 3, 6),
+            status='approved', destination='Ташкент', purpose='Встреча'
+        )
+        self.assertFalse(calendar.is_excused(second.id, date(2024, 3, 5)))
+        calendar.sync(force=True)
+        self.assertTrue(calendar.is_excused(second.id, date(2024, 3, 5)))
+
+    def test_intervals_for_period(self):
+        first, second = self.employees
+        intervals = AbsenceCalendar().get_intervals([first.id, second.id], date(2024, 2, 1), date(2024, 2, 29))
+        self.assertEqual(intervals, {})
+        intervals = AbsenceCalendar().get_intervals([first.id], date(2024, 3, 10), date(2024, 4, 1))
+        self.assertEqual(intervals, {first.id: [(date(2024, 3, 1), date(2024, 3, 10))]})
+
+
+class DirtyDaysTest(OrgStructureTestCase):
+    """Пересчёт отмеченных дней"""
+
+    DAY = date(2024, 3, 4)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.device = SKUDDevice.objects.create(
+            name='Турникет', ip_address='10.0.0.4', device_type='door', serial_number='SN-4', location='Вход'
+        )
+        cls.employees = [
+            cls.create_employee(f'W{n}', last_name=f'Фамилия{n}')
+            for n in range(2)
+        ]
+
+    def _at(self, clock):
+        return timezone.make_aware(datetime.combine(self.DAY, datetime.strptime(clock, '%H:%M').time()))
+
+    def _entry(self, employee, clock):
+        SKUDEvent.objects.create(
+            device=self.device, employee=employee, card_number=employee.employee_id,
+            event_type='entry', event_time=self._at(clock)
+        )
+
+    def _close_open_session(self, employee):
+        session = WorkSession.objects.get(employee=employee, date=self.DAY, status='open')
+        session.end_time = self._at('18:00')
+        session.status = 'closed_manual'
+        session.manual_reason = 'Забыл отметиться на выходе'
+        session.save()
+
+    def test_manual_correction_survives_recompute(self):
+        employee = self.employees[0]
+        self._entry(employee, '09:00')
+        WorkTimeProcessor().process_day_batch(self.DAY, employees=Employee.objects.filter(id=employee.id))
+        self._close_open_session(employee)
+        self.assertTrue(WorkDayDirtyMark.objects.filter(employee=employee, date=self.DAY, reason='manual').exists())
+
+        self.assertEqual(drain_dirty_days(), {'processed': 1, 'failed': 0})
+
+        for recompute in (
+            lambda: None,
+            lambda: WorkTimeProcessor().process_skud_events_for_employee(employee, self.DAY),
+            lambda: ColumnarWorkTimeEngine().rebuild(self.DAY, self.DAY, employees=Employee.objects.filter(id=employee.id)),
+        ):
+            recompute()
+            self.assertEqual(
+                list(WorkSession.objects.filter(employee=employee, date=self.DAY).values_list('status', flat=True)),
+                ['closed_manual']
+            )
+            summary = WorkDaySummary.objects.get(employee=employee, date=self.DAY)
+            self.assertEqual(
+                (summary.status, summary.has_missing_exit, summary.has_manual_corrections,
+                 summary.total_seconds_in_office, summary.sessions_count),
+                ('partial', False, True, 9 * 3600, 1)
+            )
+
+    def test_failing_employee_is_parked_without_blocking_others(self):
+        first, second = self.employees
+        for employee in self.employees:
+            self._entry(employee, '09:00')
+        mark_days_dirty([(first.id, self.DAY), (second.id, self.DAY)], 'manual')
+        fill_schedule_metrics = WorkTimeProcessor._fill_schedule_metrics
+
+        def failing_for_second(processor, summary, employee):
+            if employee.id == second.id:
+                raise ValueError('ошибка сводки')
+            fill_schedule_metrics(processor, summary, employee)
+
+        with mock.patch.object(WorkTimeProcessor, '_fill_schedule_metrics', failing_for_second):
+            self.assertEqual(drain_dirty_days(), {'processed': 1, 'failed': 1})
+            self.assertTrue(WorkDaySummary.objects.filter(employee=first, date=self.DAY).exists())
+
+            for _ in range(MAX_ATTEMPTS - 1):
+                self.assertEqual(drain_dirty_days(), {'processed': 0, 'failed': 1})
+            self.assertEqual(drain_dirty_days(), {'processed': 0, 'failed': 0})
+
+        mark = WorkDayDirtyMark.objects.get()
+        self.assertEqual((mark.employee_id, mark.attempts, mark.is_failed), (second.id, MAX_ATTEMPTS, True))
+        self.assertIn('ошибка сводки', mark.last_error)
+        self.assertEqual(pending_dirty_days(), 0)
+
+        # Новое изменение дня возвращает отметку в очередь
+        mark_days_dirty([(second.id, self.DAY)], 'event')
+        self.assertEqual(drain_dirty_days(), {'processed': 1, 'failed': 0})
+        self.assertFalse(WorkDayDirtyMark.objects.exists())
@@ -0,0 +1,150 @@
+"""
+Разбор времени событий СКУД
+
+Большинство устройств присылает время в ISO-8601, поэтому сначала пробуется
+datetime.fromisoformat, а strptime по списку форматов - только если он не
+подошел. Формат, который сработал для устройства, запоминается и пробуется
+первым для следующих событий этого устройства.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, time
+from typing import Dict, Optional
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Метка для формата ISO-8601 (разбирается через fromisoformat)
+ISO_FORMAT = 'iso'
+
+
+class TimestampParser:
+    """Разбор времени событий с запоминанием формата по устройству"""
+
+    # Запасные форматы даты и времени (если не подошел fromisoformat, например
+    # суффикс Z на Python 3.10). %z разбирает и Z, и смещение вида +05:00
+    DATETIME_FORMATS = [
+        '%Y-%m-%d %H:%M:%S',
+        '%Y-%m-%dT%H:%M:%S',
+        '%Y-%m-%dT%H:%M:%S.%f',
+        '%Y-%m-%dT%H:%M:%S%z',
+        '%Y-%m-%dT%H:%M:%S.%f%z',
+    ]
+
+    # Форматы времени суток (синхронизация с внешней СКУД)
+    TIME_FORMATS = ['%H:%M:%S', '%H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+
+    # Каждое какое по счету событие с неразобранным временем писать в лог (по устройству)
+    FALLBACK_LOG_EVERY = 100
+
+    def __init__(self):
+        self.logger = logger
+        self._device_formats: Dict[str, str] = {}
+        self._fallbacks = Counter()
+
+    def parse_datetime(self, value: str, source: Optional[str] = None) -> Optional[datetime]:
+        """
+        Разбор даты и времени
+
+        Args:
+            value: Строка с датой и временем
+            source: Источник (IP устройства) для запоминания формата
+
+        Returns:
+            datetime с часовым поясом или None, если разобрать не удалось
+        """
+        if not value or not isinstance(value, str):
+            return None
+
+        value = value.strip()
+
+        known_format = self._device_formats.get(source)
+        if known_format:
+            dt = self._try_format(value, known_format)
+            if dt is not None:
+                return self._make_aware(dt)
+
+        dt = self._try_format(value, ISO_FORMAT)
+        if dt is not None:
+            fmt = ISO_FORMAT
+        else:
+            fmt = None
+            for candidate in self.DATETIME_FORMATS:
+                dt = self._try_format(value, candidate)
+                if dt is not None:
+                    fmt = candidate
+                    break
+
+        if fmt is None:
+            return None
+
+        if source is not None and known_format != fmt:
+            self._device_formats[source] = fmt
+        return self._make_aware(dt)
+
+    def parse_event_time(self, value: str, source: Optional[str] = None) -> datetime:
+        """
+        Время события СКУД
+
+        Если время не передано или не разобрано, используется текущее время,
+        а событие учитывается в статистике (get_fallback_stats).
+        """
+        if value:
+            dt = self.parse_datetime(value, source)
+            if dt is not None:
+                return dt
+
+        self._report_fallback(value, source)
+        return timezone.localtime()
+
+    def parse_time(self, value: str) -> Optional[time]:
+        """Разбор времени суток, None если разобрать не удалось"""
+        if not value or not isinstance(value, str):
+            return None
+
+        value = value.strip()
+        try:
+            return time.fromisoformat(value)
+        except ValueError:
+            pass
+
+        for fmt in self.TIME_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).time()
+            except ValueError:
+                continue
+        return None
+
+    def get_fallback_stats(self) -> Dict[str, int]:
+        """Количество событий без времени или с неразобранным временем по источникам (в этом процессе)"""
+        return dict(self._fallbacks)
+
+    def _try_format(self, value: str, fmt: str) -> Optional[datetime]:
+        try:
+            if fmt == ISO_FORMAT:
+                return datetime.fromisoformat(value)
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            return None
+
+    def _make_aware(self, dt: datetime) -> datetime:
+        if dt.tzinfo is None:
+            return timezone.make_aware(dt)
+        return dt
+
+    def _report_fallback(self, value: str, source: Optional[str]) -> None:
+        key = source or 'unknown'
+        self._fallbacks[key] += 1
+        count = self._fallbacks[key]
+
+        if count == 1 or count % self.FALLBACK_LOG_EVERY == 0:
+            problem = f"Не удалось разобрать время события '{value}'" if value else "Не передано время события"
+            self.logger.warning(
+                f"{problem} от {key}, использовано текущее время (всего таких событий: {count})"
+            )
+
+
+# Глобальный экземпляр парсера
+timestamp_parser = TimestampParser()
@@ -11,6 +11,7 @@ urlpatterns = [
     path('api/skud/status/', skud_api.SKUDStatusEndpoint.as_view(), name='skud_status'),
     path('api/skud/device/<uuid:device_id>/', skud_api.SKUDDeviceInfoEndpoint.as_view(), name='skud_device_info'),
     path('api/skud/events/', skud_api.SKUDEventsEndpoint.as_view(), name='skud_events'),
+    path('api/skud/events/batch/', skud_api.SKUDEventBatchEndpoint.as_view(), name='skud_events_batch'),
     path('api/skud/health/', skud_api.SKUDHealthCheckEndpoint.as_view(), name='skud_health'),
     path('api/skud/test/', skud_api.skud_test_endpoint, name='skud_test'),
     
@@ -33,6 +34,7 @@ urlpatterns = [
     # AJAX endpoints
     path('test-device/<uuid:device_id>/', frontend_views.test_device, name='test_device'),
     path('api/status/', frontend_views.api_status, name='api_status'),
+    path('api/live-events/', frontend_views.live_events_stream, name='live_events_stream'),
     path('check-devices-health/', frontend_views.check_devices_health, name='check_devices_health'),
     path('api/analytics/', frontend_views.analytics_data, name='analytics_data'),
     path('api/departments/', frontend_views.get_departments, name='get_departments'),
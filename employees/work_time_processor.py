@@ -3,6 +3,7 @@
 """
 
 import logging
+import math
 from datetime import datetime, timedelta, time
 from decimal import Decimal
 from typing import List, Dict, Optional, Tuple
@@ -10,10 +11,13 @@ from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 
+from .absence_calendar import absence_calendar
+from .dashboard_snapshot import dashboard_snapshots
 from .models import (
     Employee, SKUDEvent, WorkSession, WorkDaySummary, 
     WorkTimeAuditLog, Vacation, BusinessTrip
 )
+from .month_rollup import refresh_month_summaries
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +30,24 @@ class WorkTimeProcessor:
     MAX_SESSION_DURATION_SECONDS = 24 * 60 * 60  # 24 часа
     BREAK_MERGE_THRESHOLD_SECONDS = 15 * 60  # 15 минут
     
+    # Статусы сессий, которые создаются автоматически и пересоздаются при обработке
+    AUTO_SESSION_STATUSES = ('auto', 'open')
+    
+    # Начало рабочего дня, если у сотрудника не задано work_start_time
+    DEFAULT_WORK_START = time(9, 0)
+    
+    # Поля сводки, которые заполняются при обработке
+    SUMMARY_FIELDS = [
+        'first_entry', 'last_exit', 'total_seconds_in_office', 'expected_seconds',
+        'overtime_seconds', 'underwork_seconds', 'sessions_count', 'status',
+        'has_missing_exit', 'has_manual_corrections', 'last_event_time',
+        'late_minutes', 'early_leave_minutes', 'shortfall_seconds', 'updated_at',
+    ]
+    
     def __init__(self):
         self.logger = logger
+        work_time_settings = getattr(settings, 'WORK_TIME_SETTINGS', {})
+        self.link_source_events = work_time_settings.get('SESSION_EVENT_LINKAGE', 'range') == 'm2m'
     
     def process_skud_events_for_employee(self, employee: Employee, date: datetime.date) -> bool:
         """
@@ -44,17 +64,24 @@ class WorkTimeProcessor:
             with transaction.atomic():
                 # Получаем все события сотрудника за день
                 events = self._get_employee_events_for_date(employee, date)
+                manual_sessions = self._get_manual_sessions(employee, date)
                 
                 if not events:
-                    # Создаём пустую сводку если нет событий
-                    self._create_empty_summary(employee, date)
+                    if manual_sessions:
+                        self._cleanup_auto_sessions(employee, date)
+                        self._create_or_update_summary(employee, date, manual_sessions)
+                    else:
+                        # Создаём пустую сводку если нет событий
+                        self._create_empty_summary(employee, date)
                     return True
                 
                 # Обрабатываем события в сессии
-                sessions = self._create_sessions_from_events(events)
+                sessions = self._create_sessions_from_events(events, date, manual_sessions)
                 
-                # Создаём или обновляем сводку дня
-                summary = self._create_or_update_summary(employee, date, sessions)
+                # Создаём или обновляем сводку дня (с учётом ручных сессий)
+                summary = self._create_or_update_summary(
+                    employee, date, manual_sessions + sessions, events[-1].event_time
+                )
                 
                 # Логируем результат
                 self._log_processing_result(employee, date, len(events), len(sessions))
@@ -65,69 +92,203 @@ class WorkTimeProcessor:
             self.logger.error(f"Ошибка обработки событий для {employee.full_name} на {date}: {e}")
             return False
     
-    def _get_employee_events_for_date(self, employee: Employee, date: datetime.date) -> List[SKUDEvent]:
-        """Получение событий сотрудника за день, отсортированных по времени"""
+    def process_new_events(self, employee: Employee, date: datetime.date, events: List[SKUDEvent],
+                           rebuild_late: bool = True) -> bool:
+        """
+        Инкрементальная обработка новых событий сотрудника за день
+        
+        Новые события применяются только к хвосту дня: открытая сессия
+        закрывается или заменяется, либо создаётся новая. Остальные сессии
+        дня не перезаписываются. Если событие пришло с опозданием (не позже
+        последнего обработанного), день ещё не обработан или в нём есть
+        ручные сессии, день пересчитывается полностью.
+        
+        Args:
+            employee: Сотрудник
+            date: Дата событий
+            events: Новые события сотрудника за эту дату
+            rebuild_late: Пересчитывать такой день сразу; если False,
+                возвращается False, и день отмечается для пересчёта вызывающим кодом
+            
+        Returns:
+            bool: Успех обработки
+        """
+        if not events:
+            return True
+        
+        events = sorted(events, key=lambda event: (event.event_time, event.id))
+        
+        try:
+            with transaction.atomic():
+                summary = WorkDaySummary.objects.select_for_update().filter(
+                    employee=employee, date=date
+                ).first()
+                
+                if (summary is None or summary.last_event_time is None
+                        or events[0].event_time <= summary.last_event_time
+                        or summary.has_manual_corrections):
+                    if not rebuild_late:
+                        return False
+                    return self.process_skud_events_for_employee(employee, date)
+                
+                open_session = WorkSession.objects.filter(
+                    employee=employee, date=date, status='open'
+                ).order_by('-start_time').first()
+                
+                for event in events:
+                    open_session = self._apply_event_to_tail(employee, date, open_session, event)
+                
+                sessions = list(WorkSession.objects.filter(employee=employee, date=date))
+                is_excused = absence_calendar.is_excused(employee.id, date)
+                expected_seconds = 0 if is_excused else employee.get_base_daily_seconds()
+                
+                self._fill_summary(summary, employee, sessions, expected_seconds, is_excused, events[-1].event_time)
+                summary.save()
+                
+                return True
+                
+        except Exception as e:
+            self.logger.error(f"Ошибка инкрементальной обработки событий для {employee.full_name} на {date}: {e}")
+            return False
+    
+    def _apply_event_to_tail(self, employee: Employee, date: datetime.date,
+                             open_session: Optional[WorkSession], event: SKUDEvent) -> Optional[WorkSession]:
+        """
+        Применение события к концу дня по тем же правилам, что и _pair_events
+        
+        Returns:
+            Открытая сессия после применения события (или None)
+        """
+        if self._determine_event_type(event) == 'entry':
+            if open_session is not None:
+                # Предыдущий вход без выхода отбрасывается
+                open_session.start_time = event.event_time
+                open_session.start_event = event
+                open_session.event_count = 1
+                open_session.save()
+                if self.link_source_events:
+                    open_session.source_events.set([event])
+                return open_session
+            
+            session = self._build_session(employee, date, [event], False)
+            session.save()
+            if self.link_source_events:
+                session.source_events.add(event)
+            self.logger.warning(f"Создана открытая сессия для {employee.full_name}")
+            return session
+        
+        if open_session is None:
+            # Выход без входа не образует сессию
+            return None
+        
+        if self._is_valid_duration(open_session.start_time, event.event_time):
+            open_session.end_time = event.event_time
+            open_session.end_event = event
+            open_session.event_count += 1
+            open_session.status = 'auto'
+            open_session.save()
+            if self.link_source_events:
+                open_session.source_events.add(event)
+        else:
+            open_session.delete()
+        return None
+    
+    def _get_day_bounds(self, date: datetime.date) -> Tuple[datetime, datetime]:
+        """Границы дня в текущем часовом поясе"""
         start_datetime = timezone.make_aware(datetime.combine(date, time.min))
         end_datetime = timezone.make_aware(datetime.combine(date, time.max))
+        return start_datetime, end_datetime
+    
+    def _get_employee_events_for_date(self, employee: Employee, date: datetime.date) -> List[SKUDEvent]:
+        """Получение событий сотрудника за день, отсортированных по времени"""
+        start_datetime, end_datetime = self._get_day_bounds(date)
         
         return list(SKUDEvent.objects.filter(
             employee=employee,
             event_time__gte=start_datetime,
             event_time__lte=end_datetime
-        ).order_by('event_time'))
+        ).order_by('event_time', 'id'))
     
-    def _create_sessions_from_events(self, events: List[SKUDEvent]) -> List[WorkSession]:
-        """Создание рабочих сессий из событий СКУД"""
-        sessions = []
-        current_session_events = []
+    def _create_sessions_from_events(self, events: List[SKUDEvent], date: datetime.date = None,
+                                     manual_sessions: Optional[List[WorkSession]] = None) -> List[WorkSession]:
+        """
+        Создание рабочих сессий из событий СКУД
+        
+        Сессии, которые пересекаются с ручными (manual_sessions), не создаются:
+        ручная корректировка заменяет автоматические сессии своего интервала.
+        """
+        if date is None:
+            date = timezone.localtime(events[0].event_time).date()
         
         # Удаляем существующие автоматические сессии для этих событий
-        self._cleanup_existing_auto_sessions(events)
+        self._cleanup_existing_auto_sessions(events, date)
+        
+        sessions = []
+        for session_events, is_closed in self._pair_events(events):
+            session = self._build_session(events[0].employee, date, session_events, is_closed)
+            if self._is_replaced_by_manual(session, manual_sessions or []):
+                continue
+            session.save()
+            
+            # Связываем с событиями
+            if self.link_source_events:
+                session.source_events.set(session_events)
+            
+            if not is_closed:
+                self.logger.warning(f"Создана открытая сессия для {session.employee.full_name}")
+            sessions.append(session)
+        
+        return sessions
+    
+    def _pair_events(self, events: List[SKUDEvent]) -> List[Tuple[List[SKUDEvent], bool]]:
+        """
+        Разбиение отсортированных событий на сессии (без обращения к БД)
         
-        for i, event in enumerate(events):
+        Returns:
+            Список пар (события сессии, закрыта ли сессия)
+        """
+        pairs = []
+        current_session_events = []
+        
+        for event in events:
             # Определяем тип события
             event_type = self._determine_event_type(event)
             
             if event_type == 'entry':
-                # Если есть открытая сессия, закрываем её
-                if current_session_events:
-                    session = self._close_session(current_session_events, events[i-1])
-                    if session:
-                        sessions.append(session)
-                
-                # Начинаем новую сессию
+                # Предыдущий вход без выхода отбрасывается, начинаем новую сессию
                 current_session_events = [event]
                 
             elif event_type == 'exit' and current_session_events:
                 # Завершаем текущую сессию
                 current_session_events.append(event)
-                session = self._close_session(current_session_events, event)
-                if session:
-                    sessions.append(session)
+                if self._is_valid_session_duration(current_session_events[0], event):
+                    pairs.append((current_session_events, True))
                 current_session_events = []
         
         # Если осталась открытая сессия
         if current_session_events:
-            session = self._create_open_session(current_session_events)
-            if session:
-                sessions.append(session)
+            pairs.append((current_session_events, False))
         
-        return sessions
+        return pairs
     
     def _determine_event_type(self, event: SKUDEvent) -> str:
         """Определение типа события (вход/выход)"""
-        if hasattr(event, 'event_type') and event.event_type:
-            event_type = event.event_type.lower()
+        return self._determine_direction(getattr(event, 'event_type', None), event.raw_data)
+    
+    def _determine_direction(self, event_type: Optional[str], raw_data: Optional[str]) -> str:
+        """Определение направления по типу события и исходным данным"""
+        if event_type:
+            event_type = event_type.lower()
             if event_type in ['entry', 'in', 'вход']:
                 return 'entry'
             elif event_type in ['exit', 'out', 'выход']:
                 return 'exit'
         
         # Если event_type не определён, пробуем определить из raw_data
-        if event.raw_data:
+        if raw_data:
             try:
                 import json
-                data = json.loads(event.raw_data)
+                data = json.loads(raw_data)
                 direction = data.get('direction', '').lower()
                 if direction in ['in', 'entry', 'вход']:
                     return 'entry'
@@ -139,75 +300,72 @@ class WorkTimeProcessor:
         # По умолчанию считаем входом
         return 'entry'
     
-    def _cleanup_existing_auto_sessions(self, events: List[SKUDEvent]):
+    def _cleanup_existing_auto_sessions(self, events: List[SKUDEvent], date: datetime.date):
         """Удаление существующих автоматических сессий для данных событий"""
         if not events:
             return
         
-        # Получаем дату первого события
-        date = events[0].event_time.date()
-        
-        # Удаляем автоматические сессии на эту дату
+        self._cleanup_auto_sessions(events[0].employee, date)
+    
+    def _cleanup_auto_sessions(self, employee: Employee, date: datetime.date):
+        """Удаление автоматических и открытых сессий сотрудника на дату"""
         WorkSession.objects.filter(
-            employee=events[0].employee,
+            employee=employee,
             date=date,
-            status='auto'
+            status__in=self.AUTO_SESSION_STATUSES
         ).delete()
     
-    def _close_session(self, events: List[SKUDEvent], exit_event: SKUDEvent) -> Optional[WorkSession]:
-        """Закрытие сессии с событиями входа и выхода"""
-        if len(events) < 2:
-            return None
-        
-        entry_event = events[0]
+    def _get_manual_sessions(self, employee: Employee, date: datetime.date) -> List[WorkSession]:
+        """Ручные и закрытые вручную сессии сотрудника на дату"""
+        return list(WorkSession.objects.filter(employee=employee, date=date).exclude(
+            status__in=self.AUTO_SESSION_STATUSES
+        ))
+    
+    def _is_replaced_by_manual(self, session: WorkSession, manual_sessions: List[WorkSession]) -> bool:
+        """Пересекается ли сессия по времени с одной из ручных сессий"""
+        session_end = session.end_time or session.start_time
+        return any(
+            session.start_time <= (manual.end_time or manual.start_time) and session_end >= manual.start_time
+            for manual in manual_sessions
+        )
+    
+    def _is_valid_session_duration(self, entry_event: SKUDEvent, exit_event: SKUDEvent) -> bool:
+        """Проверка длительности закрытой сессии"""
+        return self._is_valid_duration(entry_event.event_time, exit_event.event_time)
+    
+    def _is_valid_duration(self, start_time: datetime, end_time: datetime) -> bool:
+        """Проверка длительности сессии по времени входа и выхода"""
+        duration = (end_time - start_time).total_seconds()
         
         # Проверяем минимальную длительность сессии
-        duration = (exit_event.event_time - entry_event.event_time).total_seconds()
         if duration < self.MIN_SESSION_DURATION_SECONDS:
             self.logger.warning(f"Слишком короткая сессия: {duration} секунд")
-            return None
+            return False
         
         # Проверяем максимальную длительность сессии
         if duration > self.MAX_SESSION_DURATION_SECONDS:
             self.logger.warning(f"Слишком длинная сессия: {duration} секунд")
         
-        # Создаём сессию
-        session = WorkSession.objects.create(
-            employee=entry_event.employee,
-            date=entry_event.event_time.date(),
-            start_time=entry_event.event_time,
-            end_time=exit_event.event_time,
-            status='auto'
-        )
-        
-        # Связываем с событиями
-        session.source_events.set(events)
-        
-        return session
+        return True
     
-    def _create_open_session(self, events: List[SKUDEvent]) -> Optional[WorkSession]:
-        """Создание открытой сессии (без выхода)"""
-        if not events:
-            return None
-        
-        entry_event = events[0]
-        
-        # Создаём открытую сессию
-        session = WorkSession.objects.create(
-            employee=entry_event.employee,
-            date=entry_event.event_time.date(),
-            start_time=entry_event.event_time,
-            status='open'
+    def _build_session(self, employee: Employee, date: datetime.date,
+                       events: List[SKUDEvent], is_closed: bool) -> WorkSession:
+        """Создание (без сохранения) сессии по событиям входа и выхода"""
+        session = WorkSession(
+            employee=employee,
+            date=date,
+            start_time=events[0].event_time,
+            end_time=events[-1].event_time if is_closed else None,
+            status='auto' if is_closed else 'open',
+            start_event=events[0],
+            end_event=events[-1] if is_closed else None,
+            event_count=len(events)
         )
-        
-        # Связываем с событиями
-        session.source_events.set(events)
-        
-        self.logger.warning(f"Создана открытая сессия для {entry_event.employee.full_name}")
-        
+        session.calculate_duration()
         return session
     
-    def _create_or_update_summary(self, employee: Employee, date: datetime.date, sessions: List[WorkSession]) -> WorkDaySummary:
+    def _create_or_update_summary(self, employee: Employee, date: datetime.date, sessions: List[WorkSession],
+                                  last_event_time: Optional[datetime] = None) -> WorkDaySummary:
         """Создание или обновление сводки рабочего дня"""
         summary, created = WorkDaySummary.objects.get_or_create(
             employee=employee,
@@ -215,33 +373,67 @@ class WorkTimeProcessor:
             defaults={}
         )
         
-        # Рассчитываем агрегированные данные
-        total_seconds = sum(s.duration_seconds or 0 for s in sessions)
-        expected_seconds = employee.get_expected_daily_seconds(date)
+        is_excused = absence_calendar.is_excused(employee.id, date)
+        expected_seconds = 0 if is_excused else employee.get_base_daily_seconds()
         
-        # Определяем статус дня
-        status = self._determine_day_status(employee, date, sessions, total_seconds, expected_seconds)
+        self._fill_summary(summary, employee, sessions, expected_seconds, is_excused, last_event_time)
+        summary.save()
+        
+        return summary
+    
+    def _fill_summary(self, summary: WorkDaySummary, employee: Employee, sessions: List[WorkSession],
+                      expected_seconds: int, is_excused: bool, last_event_time: Optional[datetime] = None):
+        """Заполнение агрегированных данных сводки по сессиям (без обращения к БД)"""
+        total_seconds = sum(s.duration_seconds or 0 for s in sessions)
         
-        # Обновляем сводку
-        summary.first_entry = min(s.start_time for s in sessions) if sessions else None
-        summary.last_exit = max(s.end_time for s in sessions if s.end_time) if sessions else None
+        summary.first_entry = min((s.start_time for s in sessions), default=None)
+        summary.last_exit = max((s.end_time for s in sessions if s.end_time), default=None)
         summary.total_seconds_in_office = total_seconds
         summary.expected_seconds = expected_seconds
         summary.sessions_count = len(sessions)
-        summary.status = status
+        summary.status = self._determine_day_status(sessions, total_seconds, expected_seconds, is_excused)
         summary.has_missing_exit = any(s.is_open for s in sessions)
-        summary.has_manual_corrections = any(s.status != 'auto' for s in sessions)
+        summary.has_manual_corrections = any(s.status not in self.AUTO_SESSION_STATUSES for s in sessions)
+        summary.last_event_time = last_event_time
+        summary.calculate_balance()
+        self._fill_schedule_metrics(summary, employee)
+    
+    def _fill_schedule_metrics(self, summary: WorkDaySummary, employee: Employee):
+        """
+        Опоздание, ранний уход и недобор времени по графику сотрудника
         
-        summary.save()
+        Считаются только для дней присутствия (есть сессии, нет отпуска или
+        командировки). Ранний уход - только если задано work_end_time и все
+        сессии закрыты; при незакрытой сессии недобором считается вся норма дня.
+        """
+        summary.late_minutes = 0
+        summary.early_leave_minutes = 0
+        summary.shortfall_seconds = 0
         
-        return summary
+        if summary.status == 'excused' or not summary.sessions_count:
+            return
+        
+        work_start = employee.work_start_time or self.DEFAULT_WORK_START
+        start_datetime = timezone.make_aware(datetime.combine(summary.date, work_start))
+        if summary.first_entry and summary.first_entry > start_datetime:
+            summary.late_minutes = math.ceil((summary.first_entry - start_datetime).total_seconds() / 60)
+        
+        # Ночные графики (окончание раньше начала) не учитываются
+        if (employee.work_end_time and employee.work_end_time > work_start
+                and summary.last_exit and not summary.has_missing_exit):
+            end_datetime = timezone.make_aware(datetime.combine(summary.date, employee.work_end_time))
+            if summary.last_exit < end_datetime:
+                summary.early_leave_minutes = math.ceil((end_datetime - summary.last_exit).total_seconds() / 60)
+        
+        worked_seconds = 0 if summary.has_missing_exit else summary.total_seconds_in_office
+        summary.shortfall_seconds = max(summary.expected_seconds - worked_seconds, 0)
     
-    def _determine_day_status(self, employee: Employee, date: datetime.date, 
-                            sessions: List[WorkSession], total_seconds: int, expected_seconds: int) -> str:
+    def _determine_day_status(self, sessions: List[WorkSession], total_seconds: int,
+                            expected_seconds: int, is_excused: bool) -> str:
         """Определение статуса рабочего дня"""
         
         # Проверяем отпуска и командировки
-        if employee.has_vacation_on_date(date) or employee.has_business_trip_on_date(date):
+        if is_excused:
             return 'excused'
         
         # Если нет сессий
@@ -253,7 +445,7 @@ class WorkTimeProcessor:
             return 'problem'
         
         # Если есть ручные корректировки
-        if any(s.status != 'auto' for s in sessions):
+        if any(s.status not in self.AUTO_SESSION_STATUSES for s in sessions):
             return 'partial'
         
         # Если время работы значительно меньше ожидаемого
@@ -263,24 +455,27 @@ class WorkTimeProcessor:
         # По умолчанию - присутствовал
         return 'present'
     
-    def _create_empty_summary(self, employee: Employee, date: datetime.date):
-        """Создание пустой сводки для дня без событий"""
-        expected_seconds = employee.get_expected_daily_seconds(date)
-        status = 'excused' if expected_seconds == 0 else 'absent'
-        
-        WorkDaySummary.objects.get_or_create(
+    def _build_empty_summary(self, employee: Employee, date: datetime.date, expected_seconds: int) -> WorkDaySummary:
+        """Создание (без сохранения) пустой сводки для дня без событий"""
+        return WorkDaySummary(
             employee=employee,
             date=date,
-            defaults={
-                'total_seconds_in_office': 0,
-                'expected_seconds': expected_seconds,
-                'sessions_count': 0,
-                'status': status,
-                'has_missing_exit': False,
-                'has_manual_corrections': False,
-            }
+            total_seconds_in_office=0,
+            expected_seconds=expected_seconds,
+            sessions_count=0,
+            status='excused' if expected_seconds == 0 else 'absent',
+            has_missing_exit=False,
+            has_manual_corrections=False,
         )
     
+    def _create_empty_summary(self, employee: Employee, date: datetime.date):
+        """Создание пустой сводки для дня без событий"""
+        if WorkDaySummary.objects.filter(employee=employee, date=date).exists():
+            return
+        
+        expected_seconds = employee.get_expected_daily_seconds(date)
+        self._build_empty_summary(employee, date, expected_seconds).save()
+    
     def _log_processing_result(self, employee: Employee, date: datetime.date, 
                              events_count: int, sessions_count: int):
         """Логирование результата обработки"""
@@ -289,6 +484,184 @@ class WorkTimeProcessor:
             f"на {date}: создано {sessions_count} сессий"
         )
     
+    def process_day_batch(self, date: datetime.date, employees=None, refresh_empty: bool = False) -> Dict[str, int]:
+        """
+        Обработка дня для всех активных сотрудников фиксированным числом запросов
+        
+        События дня, отпуска и командировки загружаются одним запросом каждые,
+        сессии и связи с событиями создаются через bulk_create, сводки -
+        через bulk_create/bulk_update. Результат совпадает с
+        process_skud_events_for_employee для каждого сотрудника.
+        
+        Если пакет целиком не удалось записать (например, одна сводка нарушает
+        ограничение БД), день обрабатывается по одному сотруднику, и ошибку
+        получают только сотрудники, которых не удалось обработать.
+        
+        Args:
+            date: Дата для обработки
+            employees: QuerySet сотрудников (по умолчанию - все активные)
+            refresh_empty: Пересчитывать и существующие сводки дней без событий
+                (автоматические сессии таких дней удаляются)
+            
+        Returns:
+            Dict: {'processed', 'errors', 'events', 'sessions',
+                   'failed_employees': id сотрудника -> текст ошибки}
+        """
+        if employees is None:
+            employees = Employee.objects.filter(is_active=True)
+        
+        employees_by_id = {
+            employee.id: employee
+            for employee in employees.only(
+                'id', 'last_name', 'first_name', 'middle_name', 'daily_hours', 'work_fraction',
+                'work_start_time', 'work_end_time'
+            )
+        }
+        results = {'processed': 0, 'errors': 0, 'events': 0, 'sessions': 0, 'failed_employees': {}}
+        if not employees_by_id:
+            return results
+        
+        try:
+            results.update(self._process_day_batch(date, employees_by_id, refresh_empty))
+            return results
+        except Exception as e:
+            self.logger.error(f"Ошибка пакетной обработки {date}, переход к обработке по сотрудникам: {e}")
+        
+        for employee_id, employee in employees_by_id.items():
+            try:
+                result = self._process_day_batch(date, {employee_id: employee}, refresh_empty)
+            except Exception as e:
+                self.logger.error(f"Ошибка обработки {date} для {employee.full_name}: {e}")
+                results['errors'] += 1
+                results['failed_employees'][employee_id] = str(e)
+                continue
+            for key in ('processed', 'events', 'sessions'):
+                results[key] += result[key]
+        
+        return results
+    
+    def _process_day_batch(self, date: datetime.date, employees_by_id: Dict, refresh_empty: bool) -> Dict[str, int]:
+        """Пакетная обработка дня для сотрудников (ошибка откатывает весь пакет)"""
+        employee_ids = list(employees_by_id)
+        start_datetime, end_datetime = self._get_day_bounds(date)
+        
+        # События дня всех сотрудников одним запросом
+        events_by_employee = {}
+        events_count = 0
+        for event in SKUDEvent.objects.filter(
+            employee_id__in=employee_ids,
+            event_time__gte=start_datetime,
+            event_time__lte=end_datetime
+        ).only('id', 'employee_id', 'event_type', 'event_time', 'raw_data').order_by('employee_id', 'event_time', 'id'):
+            events_by_employee.setdefault(event.employee_id, []).append(event)
+            events_count += 1
+        
+        excused_ids = self._get_excused_employee_ids(employee_ids, date)
+        
+        # Ручные сессии не пересоздаются, а заменяют автоматические в своём интервале
+        manual_by_employee = {}
+        for session in WorkSession.objects.filter(employee_id__in=employee_ids, date=date).exclude(
+            status__in=self.AUTO_SESSION_STATUSES
+        ):
+            manual_by_employee.setdefault(session.employee_id, []).append(session)
+        
+        with transaction.atomic():
+            # Пересоздаём автоматические сессии только для сотрудников с событиями
+            WorkSession.objects.filter(
+                employee_id__in=employee_ids if refresh_empty else list(events_by_employee),
+                date=date,
+                status__in=self.AUTO_SESSION_STATUSES
+            ).delete()
+            
+            sessions_by_employee = {}
+            new_sessions = []
+            session_links = []
+            SessionEvents = WorkSession.source_events.through
+            
+            for employee_id, events in events_by_employee.items():
+                employee = employees_by_id[employee_id]
+                manual_sessions = manual_by_employee.get(employee_id, [])
+                sessions = sessions_by_employee.setdefault(employee_id, list(manual_sessions))
+                for session_events, is_closed in self._pair_events(events):
+                    session = self._build_session(employee, date, session_events, is_closed)
+                    if self._is_replaced_by_manual(session, manual_sessions):
+                        continue
+                    sessions.append(session)
+                    new_sessions.append(session)
+                    if self.link_source_events:
+                        session_links.extend(
+                            SessionEvents(worksession_id=session.id, skudevent_id=event.id)
+                            for event in session_events
+                        )
+            
+            WorkSession.objects.bulk_create(new_sessions)
+            if session_links:
+                SessionEvents.objects.bulk_create(session_links)
+            
+            # Сводки: существующие обновляем, отсутствующие создаём
+            existing_summaries = {
+                summary.employee_id: summary
+                for summary in WorkDaySummary.objects.filter(employee_id__in=employee_ids, date=date)
+            }
+            
+            new_summaries = []
+            changed_summaries = []
+            now = timezone.now()
+            
+            for employee_id, employee in employees_by_id.items():
+                is_excused = employee_id in excused_ids
+                expected_seconds = 0 if is_excused else employee.get_base_daily_seconds()
+                summary = existing_summaries.get(employee_id)
+                events = events_by_employee.get(employee_id)
+                
+                if events is None and employee_id not in manual_by_employee:
+                    # День без событий: существующую сводку не трогаем
+                    if summary is None:
+                        new_summaries.append(self._build_empty_summary(employee, date, expected_seconds))
+                    elif refresh_empty:
+                        summary.updated_at = now
+                        changed_summaries.append(summary)
+                        self._fill_summary(summary, employee, [], expected_seconds, is_excused)
+                    continue
+                
+                if summary is None:
+                    summary = WorkDaySummary(employee=employee, date=date)
+                    new_summaries.append(summary)
+                elif events is None and not refresh_empty:
+                    continue
+                else:
+                    summary.updated_at = now
+                    changed_summaries.append(summary)
+                
+                self._fill_summary(
+                    summary, employee,
+                    sessions_by_employee[employee_id] if events else manual_by_employee[employee_id],
+                    expected_seconds, is_excused, events[-1].event_time if events else None
+                )
+            
+            WorkDaySummary.objects.bulk_create(new_summaries)
+            WorkDaySummary.objects.bulk_update(changed_summaries, self.SUMMARY_FIELDS)
+            # bulk_create/bulk_update не вызывают сигналы - сводки за месяц пересчитываем явно
+            refresh_month_summaries(
+                (summary.employee_id, summary.date) for summary in new_summaries + changed_summaries
+            )
+            transaction.on_commit(dashboard_snapshots.invalidate)
+        
+        self.logger.info(
+            f"Пакетная обработка {date}: {len(employees_by_id)} сотрудников, "
+            f"{events_count} событий, создано {len(new_sessions)} сессий"
+        )
+        
+        return {
+            'processed': len(employees_by_id),
+            'events': events_count,
+            'sessions': len(new_sessions),
+        }
+    
+    def _get_excused_employee_ids(self, employee_ids: List, date: datetime.date) -> set:
+        """Сотрудники в отпуске или командировке на дату (по календарю отсутствий)"""
+        return absence_calendar.get_excused_ids(employee_ids, date)
+    
     def reprocess_employee_day(self, employee: Employee, date: datetime.date) -> bool:
         """Пересчёт рабочего времени для конкретного сотрудника на конкретную дату"""
         return self.process_skud_events_for_employee(employee, date)
@@ -307,6 +680,11 @@ class WorkTimeProcessor:
     
     def reprocess_all_employees_day(self, date: datetime.date) -> Dict[str, int]:
         """Пересчёт рабочего времени для всех сотрудников на конкретную дату"""
+        try:
+            return self.process_day_batch(date)
+        except Exception as e:
+            self.logger.error(f"Ошибка пакетной обработки {date}, переход к обработке по сотрудникам: {e}")
+        
         results = {'processed': 0, 'errors': 0}
         
         employees = Employee.objects.filter(is_active=True)